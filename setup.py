@@ -25,6 +25,13 @@ except PackageNotFoundError:
     with_cython = False
 
 
+cython_directives = {"language_level": 3, "embedsignature": True}
+if with_cython and Version(get_version("cython")) >= Version("3.1"):
+    # don't re-enable the GIL when imported on free-threaded Python builds,
+    # so that e.g. loads(..., workers=N) can parse in parallel threads
+    cython_directives["freethreading_compatible"] = True
+
+
 class cython_build_ext(_build_ext):
     """Compile *.pyx source files to *.c using cythonize if Cython is
     installed, else use the pre-generated *.c sources.
@@ -42,11 +49,7 @@ class cython_build_ext(_build_ext):
                 force=linetrace or self.force,
                 annotate=os.environ.get("CYTHON_ANNOTATE") == "1",
                 quiet=not self.verbose,
-                compiler_directives={
-                    "linetrace": linetrace,
-                    "language_level": 3,
-                    "embedsignature": True,
-                },
+                compiler_directives={"linetrace": linetrace, **cython_directives},
                 include_path=["src"],
             )
         else:
@@ -78,13 +81,13 @@ class cython_sdist(_sdist):
             self.distribution.ext_modules,
             force=True,
             quiet=not self.verbose,
-            compiler_directives={"language_level": 3, "embedsignature": True},
+            compiler_directives=cython_directives,
             include_path=["src"],
         )
         _sdist.run(self)
 
 
-cython_modules = ["parser", "util", "writer", "_test"]
+cython_modules = ["parser", "util", "writer", "cache", "transcode", "_test"]
 extensions = [
     Extension(
         "openstep_plist." + mod,
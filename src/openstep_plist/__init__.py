@@ -1,5 +1,15 @@
-from .parser import load, loads, ParseError
-from .writer import dump, dumps
+from .parser import (
+    load,
+    loads,
+    load_path,
+    iterparse,
+    IncrementalParser,
+    ParseError,
+    scan,
+    validate,
+)
+from .writer import dump, dumps, dumps_bytes, reformat
+from .transcode import to_json
 
 try:
     from ._version import version as __version__
@@ -7,4 +17,18 @@ except ImportError:
     __version__ = "0.0.0+unknown"
 
 
-__all__ = ["load", "loads", "dump", "dumps", "ParseError"]
+__all__ = [
+    "load",
+    "loads",
+    "load_path",
+    "iterparse",
+    "IncrementalParser",
+    "scan",
+    "validate",
+    "dump",
+    "dumps",
+    "dumps_bytes",
+    "reformat",
+    "to_json",
+    "ParseError",
+]
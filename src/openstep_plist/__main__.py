@@ -2,31 +2,305 @@
 from __future__ import absolute_import, unicode_literals
 import argparse
 import openstep_plist
+from openstep_plist.transcode import to_json
 import json
 import binascii
+import glob
+import mmap
+import os
 import pydoc
+import shutil
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from functools import partial
-from io import StringIO, open
+from io import BytesIO, StringIO, open
 
 
 class BytesEncoder(json.JSONEncoder):
     def default(self, obj):
+        if isinstance(obj, bytes):
+            return "<%s>" % binascii.hexlify(obj).decode()
+
         from glyphsLib.types import BinaryData
 
-        if isinstance(obj, (bytes, BinaryData)):
+        if isinstance(obj, BinaryData):
             return "<%s>" % binascii.hexlify(obj).decode()
         return json.JSONEncoder.default(self, obj)
 
 
+@contextmanager
+def map_file(path):
+    # the file is memory-mapped read-only, and parsed straight from the mapping
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files can't be mapped
+            yield f.read()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                yield m
+
+
+def transcode_json(path, fp, **kwargs):
+    # the JSON is written to fp in chunks
+    with map_file(path) as data:
+        return to_json(data, fp, **kwargs)
+
+
+def peak_rss():
+    """Return the peak resident set size of the current process in bytes, or
+    None where the resource module isn't available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def expand_paths(patterns, unmatched=None):
+    """Expand the glob patterns (with ** matching any number of directories)
+    into the list of the matching paths, sorted, without duplicates. The other
+    paths are kept as they are, existing or not.
+    The patterns that match no file are appended to the 'unmatched' list, if
+    one is given.
+    """
+    paths = {}
+    for pattern in patterns:
+        if glob.escape(pattern) != pattern:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches and unmatched is not None:
+                unmatched.append(pattern)
+            paths.update(dict.fromkeys(matches))
+        else:
+            paths[pattern] = None
+    return list(paths)
+
+
+def write_file_atomically(path, data):
+    # a failure never leaves a half-written file behind
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(tmp, "wb") as fp:
+            fp.write(data)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def json_output_path(path, out_dir, base_dir):
+    # the input directories below base_dir are recreated in out_dir, so that
+    # the files with the same name in different directories don't collide
+    relpath = os.path.relpath(os.path.abspath(path), base_dir)
+    return os.path.join(out_dir, os.path.splitext(relpath)[0] + ".json")
+
+
+def count_objects(scan_result):
+    return scan_result.dicts + scan_result.arrays + scan_result.strings
+
+
+FileResult = namedtuple(
+    "FileResult", ["path", "size", "objects", "seconds", "peak_rss", "changed", "error"]
+)
+
+
+def process_file(
+    path,
+    mode,
+    stats=False,
+    indent=2,
+    escape_newlines=True,
+    data_format="plist",
+    sort_keys=True,
+    out_dir=None,
+    base_dir=None,
+):
+    """Process one of the batch's files, in the given mode:
+    - "check": only check that the file is a well-formed plist;
+    - "in-place": rewrite the file in the formatting of openstep_plist.dump,
+      unless it's already formatted that way, without changing how it reads
+      (see openstep_plist.reformat with use_numbers=False);
+    - "json": write the file converted to JSON in 'out_dir', at its path
+      relative to 'base_dir', with the .json extension.
+    With stats=True, the objects of the file are counted (outside of the
+    timed processing, except in the "check" mode, which counts them anyway).
+    Returns a FileResult, whose 'error' is the message of the ParseError or
+    OSError that made the processing fail, if any.
+    """
+    size = objects = 0
+    changed = False
+    output = None
+    start = time.perf_counter()
+    try:
+        with map_file(path) as data:
+            size = len(data)
+            if mode == "check":
+                objects = count_objects(openstep_plist.scan(data))
+            elif mode == "json":
+                out_path = json_output_path(path, out_dir, base_dir)
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                with open(out_path, "w", encoding="utf-8") as fp:
+                    to_json(
+                        data,
+                        fp,
+                        use_numbers=True,
+                        indent=indent,
+                        data_format=data_format,
+                        sort_keys=sort_keys,
+                    )
+                changed = True
+            else:
+                buf = BytesIO()
+                openstep_plist.reformat(
+                    data,
+                    buf,
+                    use_numbers=False,
+                    indent=indent,
+                    escape_newlines=escape_newlines,
+                )
+                output = buf.getvalue()
+                with memoryview(data) as view:
+                    changed = view != output
+            if stats and mode != "check":
+                scan_start = time.perf_counter()
+                objects = count_objects(openstep_plist.scan(data))
+                start += time.perf_counter() - scan_start
+        # written after the mapping is closed, which Windows requires
+        if changed and output is not None:
+            write_file_atomically(path, output)
+    except (OSError, openstep_plist.ParseError) as e:
+        return FileResult(
+            path, size, 0, time.perf_counter() - start, peak_rss(), False, str(e)
+        )
+    return FileResult(
+        path, size, objects, time.perf_counter() - start, peak_rss(), changed, None
+    )
+
+
+def process_files(paths, worker, jobs=1):
+    """Yield the results of worker(path) for the paths, in order, computed by
+    a pool of 'jobs' processes (all the CPUs if 0). The paths are handed out
+    in chunks, so that the cost of sending each one to a process is amortized
+    over many files.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(paths))
+    if jobs <= 1:
+        for path in paths:
+            yield worker(path)
+        return
+    chunksize = max(1, min(64, len(paths) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(worker, paths, chunksize=chunksize)
+
+
+def format_stats(name, size, objects, seconds, rss):
+    seconds = max(seconds, 1e-9)
+    line = "%s: %.2f MB in %.1f ms, %.1f MB/s, %.0f objects/s" % (
+        name,
+        size / 1e6,
+        seconds * 1000,
+        size / 1e6 / seconds,
+        objects / seconds,
+    )
+    if rss is not None:
+        line += ", peak RSS %.1f MB" % (rss / 1e6)
+    return line
+
+
+def run_batch(args, mode):
+    unmatched = []
+    paths = expand_paths(args.infiles, unmatched)
+    if unmatched:
+        # most likely a mistyped path, which must not go unnoticed
+        for pattern in unmatched:
+            print("No files match %s" % pattern, file=sys.stderr)
+        return 1
+    base_dir = None
+    if mode == "json":
+        base_dir = os.path.commonpath(
+            [os.path.dirname(os.path.abspath(path)) for path in paths]
+        )
+    worker = partial(
+        process_file,
+        mode=mode,
+        stats=args.stats,
+        indent=args.indent,
+        escape_newlines=args.escape_newlines,
+        data_format=args.data_format,
+        sort_keys=args.sort_keys,
+        out_dir=args.json_out,
+        base_dir=base_dir,
+    )
+    status = 0
+    count = size = objects = 0
+    rss = peak_rss()
+    start = time.perf_counter()
+    for result in process_files(paths, worker, jobs=args.jobs):
+        if result.error is not None:
+            print("%s: %s" % (result.path, result.error), file=sys.stderr)
+            status = 1
+            continue
+        count += 1
+        size += result.size
+        objects += result.objects
+        if result.peak_rss is not None:
+            rss = max(rss, result.peak_rss)
+        if args.stats:
+            print(
+                format_stats(
+                    result.path,
+                    result.size,
+                    result.objects,
+                    result.seconds,
+                    result.peak_rss,
+                ),
+                file=sys.stderr,
+            )
+    if args.stats:
+        # the throughput over the wall-clock time, with all the processes
+        print(
+            format_stats(
+                "total (%d files)" % count,
+                size,
+                objects,
+                time.perf_counter() - start,
+                rss,
+            ),
+            file=sys.stderr,
+        )
+    return status
+
+
 def main(args=None):
     if args is None:
-        import sys
-
         args = sys.argv[1:]
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("infile", help="input file")
-    parser.add_argument("outfile", help="output file", default="-", nargs="?")
+    parser = argparse.ArgumentParser(
+        description=(
+            "Reformat an OpenStep plist file, or convert it to JSON. With "
+            "--check, --in-place or --json-out, process a batch of input "
+            "files instead."
+        )
+    )
+    parser.add_argument(
+        "infiles",
+        metavar="INFILE",
+        nargs="+",
+        help=(
+            "input file, followed by the output file (default: stdout); or, "
+            "with --check, --in-place or --json-out, input files or glob "
+            "patterns"
+        ),
+    )
     parser.add_argument(
         "-g", "--glyphs", help="use glyphsLib parser/writer", action="store_true"
     )
@@ -37,25 +311,121 @@ def main(args=None):
         "-j", "--json", help="use json to serialize", action="store_true", default=False
     )
     parser.add_argument("-i", "--indent", help="indentation level", type=int, default=2)
+    parser.add_argument(
+        "--data-format",
+        help="how -j writes the <hex> data as JSON strings (default: plist)",
+        choices=["plist", "hex", "base64"],
+        default="plist",
+    )
+    parser.add_argument(
+        "--no-sort-keys",
+        dest="sort_keys",
+        help=(
+            "with -j or --json-out, write the keys in document order rather "
+            "than sorted"
+        ),
+        action="store_false",
+    )
     parser.add_argument(
         "--no-escape-newlines", dest="escape_newlines", action="store_false"
     )
+    parser.add_argument(
+        "--in-place",
+        help=(
+            "rewrite the input files that aren't formatted like the output, "
+            "keeping their numbers and strings as they were written"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--check",
+        help="only check that the input files are well-formed",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--json-out",
+        metavar="DIR",
+        help=(
+            "convert the input files to JSON, written in DIR with the .json "
+            "extension, in the same subdirectories as the inputs"
+        ),
+    )
+    parser.add_argument(
+        "-J",
+        "--jobs",
+        help=(
+            "with --check, --in-place or --json-out, the number of processes "
+            "(default: 1; 0: one per CPU)"
+        ),
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--stats",
+        help=(
+            "with --check, --in-place or --json-out, print the throughput "
+            "(MB/s, objects/s) and peak RSS for each file, and in total, to "
+            "stderr"
+        ),
+        action="store_true",
+    )
     args = parser.parse_args(args)
 
-    if not args.glyphs:
-        parse = partial(openstep_plist.load, use_numbers=True)
-    else:
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or more")
+    modes = [
+        mode
+        for mode, flag in [
+            ("check", args.check),
+            ("in-place", args.in_place),
+            ("json", args.json_out is not None),
+        ]
+        if flag
+    ]
+    if len(modes) > 1:
+        parser.error("only one of --check, --in-place and --json-out can be used")
+    # the meaning of the positional arguments only depends on these flags
+    if modes:
+        if args.glyphs or args.json:
+            parser.error(
+                "--glyphs and --json can't be used with --check, --in-place "
+                "or --json-out"
+            )
+        return run_batch(args, modes[0])
+    if args.stats or args.jobs != 1:
+        parser.error("--stats and --jobs need --check, --in-place or --json-out")
+    if len(args.infiles) > 2:
+        parser.error("several input files need --check, --in-place or --json-out")
 
-        def parse(fp, dict_type=dict):
-            from glyphsLib.parser import Parser
+    infile = args.infiles[0]
+    outfile = args.infiles[1] if len(args.infiles) > 1 else "-"
 
-            s = fp.read()
-            p = Parser(current_type=dict_type)
-            return p.parse(s)
+    if args.json and not args.glyphs:
+        # convert the plist text to JSON directly, without building the tree
+        transcode = partial(
+            transcode_json,
+            infile,
+            use_numbers=True,
+            indent=args.indent,
+            data_format=args.data_format,
+            sort_keys=args.sort_keys,
+        )
+        if outfile == "-":
+            if args.pager:
+                pydoc.pager(transcode(None))
+            else:
+                transcode(sys.stdout)
+        else:
+            with open(outfile, "w", encoding="utf-8") as fp:
+                transcode(fp)
+        return 0
 
     if args.json:
         dump = partial(
-            json.dump, cls=BytesEncoder, sort_keys=True, indent=" " * args.indent
+            json.dump,
+            cls=BytesEncoder,
+            sort_keys=args.sort_keys,
+            indent=" " * args.indent,
         )
     else:
         if args.glyphs:
@@ -67,10 +437,15 @@ def main(args=None):
                 escape_newlines=args.escape_newlines,
             )
 
-    with open(args.infile, "r", encoding="utf-8") as fp:
-        data = parse(fp)
+    if args.glyphs:
+        from glyphsLib.parser import Parser
+
+        with open(infile, "r", encoding="utf-8") as fp:
+            data = Parser(current_type=dict).parse(fp.read())
+    else:
+        data = openstep_plist.load_path(infile, use_numbers=True)
 
-    if args.outfile == "-":
+    if outfile == "-":
         if args.pager:
             buf = StringIO()
             dump(data, buf)
@@ -78,9 +453,10 @@ def main(args=None):
         else:
             dump(data, sys.stdout)
     else:
-        with open(args.outfile, "w", encoding="utf-8") as fp:
+        with open(outfile, "w", encoding="utf-8") as fp:
             dump(data, fp)
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -2,7 +2,8 @@
 #distutils: define_macros=CYTHON_TRACE_NOGIL=1
 
 from .parser cimport (
-    ParseInfo,
+    ParseInfoUCS4,
+    TYPED_ARRAYS_NONE,
     line_number_strings as _line_number_strings,
     advance_to_non_space as _advance_to_non_space,
     get_slashed_char as _get_slashed_char,
@@ -23,7 +24,7 @@ from cpython.unicode cimport (
 cdef class ParseContext:
 
     cdef unicode s
-    cdef ParseInfo pi
+    cdef ParseInfoUCS4 pi
     cdef Py_UCS4 *buf
     cdef object dict_type
 
@@ -40,12 +41,16 @@ cdef class ParseContext:
         if not self.buf:
             raise MemoryError()
         self.dict_type = dict_type
-        self.pi = ParseInfo(
+        self.pi = ParseInfoUCS4(
             begin=self.buf,
             curr=self.buf + offset,
             end=self.buf + length,
             dict_type=<void*>dict_type,
+            strings=NULL,
+            hooks=NULL,
             use_numbers=use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
         )
 
     def __dealloc__(self):
@@ -77,6 +82,6 @@ def parse_unquoted_plist_string(s):
     return _parse_unquoted_plist_string(&ctx.pi)
 
 
-def parse_plist_string(s, required=True):
+def parse_plist_string(s, bint required=True):
     cdef ParseContext ctx = ParseContext(s)
     return _parse_plist_string(&ctx.pi, required=required)
@@ -0,0 +1,800 @@
+#cython: language_level=3
+#distutils: define_macros=CYTHON_TRACE_NOGIL=1
+"""A binary cache format for parsed plists.
+
+Re-parsing the same unchanged sources on every run is wasteful: dumps()
+serializes a parsed tree into a compact binary form that loads() reads back
+many times faster than the text can be parsed, optionally on demand from a
+memory mapping, and load_cached() only parses a source file again when it
+has changed since its cache was written.
+
+The format is made of 8-byte words in the native byte order: the header,
+then the values, then the string table. Every value is referenced by a
+'slot', whose low 4 bits are its type tag and the rest either the value
+itself (for the small integers and the booleans), the index of a string in
+the string table, or the offset in bytes of the value's data:
+
+- an array is its number of items followed by the slots of the items;
+- a dict is its number of items, followed by the string indices of the keys,
+  then by the slots of the values;
+- the floats and the 64-bit integers take one word;
+- the <hex> data, and the integers that don't fit in 64 bits (as decimal
+  digits), are their length in bytes followed by the bytes;
+- the array.array objects (typed arrays) are their typecode and number of
+  items, followed by the items.
+
+So the i-th item of a container can be found without reading the others,
+and each string is only stored, and decoded, once. The data of a container
+always follows it in the file, which also rules out any cycles.
+
+The string table is the number of strings plus one offsets to the start of
+each string within the UTF-8 data that follows it (the last offset being the
+end of the data).
+"""
+
+from collections.abc import Mapping, Sequence
+import array
+import codecs
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBUF_SIMPLE
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.dict cimport PyDict_SetItem
+from cpython.list cimport PyList_GET_ITEM, PyList_New, PyList_SET_ITEM
+from cpython.long cimport PyLong_FromLongLong
+from cpython.ref cimport PyObject, Py_INCREF
+from cpython.unicode cimport PyUnicode_DATA, PyUnicode_DecodeUTF8
+from cpython cimport array
+from libc.stdint cimport int64_t, uint8_t, uint32_t, uint64_t
+from libc.string cimport memcmp, memcpy
+from libcpp.vector cimport vector
+cimport cython
+
+from . import parser
+
+
+cdef extern from "Python.h":
+    bint PyUnicode_IS_ASCII(object o)
+
+
+cdef enum SlotTag:
+    TAG_STRING = 0
+    TAG_INT = 1
+    TAG_INT64 = 2
+    TAG_BIG_INT = 3
+    TAG_FLOAT = 4
+    TAG_DATA = 5
+    TAG_ARRAY = 6
+    TAG_DICT = 7
+    TAG_BOOL = 8
+    TAG_TYPED_ARRAY = 9
+
+
+cdef enum:
+    TAG_BITS = 4
+    TAG_MASK = (1 << TAG_BITS) - 1
+    FORMAT_VERSION = 1
+    HEADER_SIZE = 80
+    STRING_TABLE_MIN_SIZE = 1024  # must be a power of 2
+    # the options that the source was parsed with
+    OPTION_USE_NUMBERS = 1 << 0
+    OPTION_TYPED_ARRAYS = 1 << 1
+    OPTION_LATIN1 = 1 << 2
+
+# the integers in this range are stored in the slot itself
+cdef int64_t MIN_INLINE_INT = -(1 << 59)
+cdef int64_t MAX_INLINE_INT = (1 << 59) - 1
+
+cdef const char *MAGIC = b"OSPCACHE"
+
+# magic, version, options, source size, source mtime (ns), source hash,
+# root slot, number of strings, offset of the string table, file size
+HEADER = struct.Struct("=8sIIQq16sQQQQ")
+SOURCE_MTIME_OFFSET = 24
+
+
+cdef inline uint64_t read_word(const uint8_t *p) noexcept nogil:
+    # the buffer may not be aligned
+    cdef uint64_t value
+    memcpy(&value, p, 8)
+    return value
+
+
+@cython.final
+cdef class CacheWriter:
+    cdef vector[uint64_t] words
+    cdef list strings
+    # the hash of each string in the table, and its index plus one (or 0)
+    cdef vector[Py_hash_t] string_hashes
+    cdef vector[uint64_t] string_slots
+
+    def __cinit__(self):
+        self.words.resize(HEADER_SIZE // 8, 0)
+        self.strings = []
+        self.string_hashes.resize(STRING_TABLE_MIN_SIZE, 0)
+        self.string_slots.resize(STRING_TABLE_MIN_SIZE, 0)
+
+    cdef uint64_t allocate(self, size_t count):
+        # return the offset in bytes of 'count' new zeroed words
+        cdef size_t pos = self.words.size()
+        self.words.resize(pos + count, 0)
+        return pos * 8
+
+    cdef uint64_t write_bytes(self, const void *data, size_t length):
+        cdef uint64_t offset = self.allocate(1 + (length + 7) // 8)
+        self.words[offset // 8] = length
+        memcpy(&self.words[offset // 8 + 1], data, length)
+        return offset
+
+    cdef uint64_t string_index(self, unicode s) except? TAG_MASK:
+        # look up the open addressing table of the strings by their hash,
+        # which str objects compute only once
+        cdef Py_hash_t h = hash(s)
+        cdef size_t mask = self.string_hashes.size() - 1
+        cdef size_t i = <size_t>h & mask
+        cdef uint64_t index
+        while self.string_slots[i] != 0:
+            index = self.string_slots[i] - 1
+            if self.string_hashes[i] == h and (
+                <PyObject *>s == PyList_GET_ITEM(self.strings, index)
+                or s == <unicode>PyList_GET_ITEM(self.strings, index)
+            ):
+                return index
+            i = (i + 1) & mask
+        index = len(self.strings)
+        self.strings.append(s)
+        self.string_hashes[i] = h
+        self.string_slots[i] = index + 1
+        if (index + 1) * 3 > self.string_hashes.size() * 2:
+            self.grow_string_table()
+        return index
+
+    cdef void grow_string_table(self) noexcept:
+        cdef vector[Py_hash_t] hashes
+        cdef vector[uint64_t] slots
+        hashes.swap(self.string_hashes)
+        slots.swap(self.string_slots)
+        self.string_hashes.resize(hashes.size() * 2, 0)
+        self.string_slots.resize(hashes.size() * 2, 0)
+        cdef size_t mask = self.string_hashes.size() - 1
+        cdef size_t i, j
+        for i in range(hashes.size()):
+            if slots[i]:
+                j = <size_t>hashes[i] & mask
+                while self.string_slots[j] != 0:
+                    j = (j + 1) & mask
+                self.string_hashes[j] = hashes[i]
+                self.string_slots[j] = slots[i]
+
+    cdef uint64_t write_int(self, obj) except? TAG_MASK:
+        cdef int64_t value
+        cdef uint64_t offset
+        try:
+            value = obj
+        except OverflowError:
+            digits = str(int(obj)).encode("ascii")
+            offset = self.write_bytes(<const char *>digits, len(digits))
+            return offset << TAG_BITS | TAG_BIG_INT
+        if MIN_INLINE_INT <= value <= MAX_INLINE_INT:
+            return <uint64_t>value << TAG_BITS | TAG_INT
+        offset = self.allocate(1)
+        self.words[offset // 8] = <uint64_t>value
+        return offset << TAG_BITS | TAG_INT64
+
+    cdef uint64_t write_buffer(self, obj, SlotTag tag) except? TAG_MASK:
+        cdef Py_buffer view
+        cdef uint64_t offset
+        PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE)
+        try:
+            offset = self.write_bytes(view.buf, view.len)
+        finally:
+            PyBuffer_Release(&view)
+        return offset << TAG_BITS | tag
+
+    cdef uint64_t write_typed_array(self, array.array obj) except? TAG_MASK:
+        cdef size_t length = len(obj) * obj.itemsize
+        cdef uint64_t offset = self.allocate(2 + (length + 7) // 8)
+        self.words[offset // 8] = ord(obj.typecode)
+        self.words[offset // 8 + 1] = len(obj)
+        memcpy(&self.words[offset // 8 + 2], obj.data.as_voidptr, length)
+        return offset << TAG_BITS | TAG_TYPED_ARRAY
+
+    cdef uint64_t write_array(self, items) except? TAG_MASK:
+        if not isinstance(items, (list, tuple)):
+            items = list(items)
+        cdef size_t n = len(items)
+        cdef uint64_t offset = self.allocate(1 + n)
+        cdef size_t base = offset // 8, i = 0
+        self.words[base] = n
+        for item in items:
+            # the words may be reallocated by write_value
+            slot = self.write_value(item)
+            self.words[base + 1 + i] = slot
+            i += 1
+        return offset << TAG_BITS | TAG_ARRAY
+
+    cdef uint64_t write_dict(self, obj) except? TAG_MASK:
+        items = obj.items() if isinstance(obj, dict) else list(obj.items())
+        cdef size_t n = len(items)
+        cdef uint64_t offset = self.allocate(1 + 2 * n)
+        cdef size_t base = offset // 8, i = 0
+        self.words[base] = n
+        for key, value in items:
+            if not isinstance(key, unicode):
+                raise TypeError(
+                    f"dict keys must be str, not {type(key).__name__}"
+                )
+            self.words[base + 1 + i] = self.string_index(key)
+            slot = self.write_value(value)
+            self.words[base + 1 + n + i] = slot
+            i += 1
+        return offset << TAG_BITS | TAG_DICT
+
+    cdef uint64_t write_value(self, obj) except? TAG_MASK:
+        cdef double value
+        cdef uint64_t offset
+        if isinstance(obj, unicode):
+            return self.string_index(obj) << TAG_BITS | TAG_STRING
+        elif isinstance(obj, bool):
+            return (<uint64_t>(obj is True)) << TAG_BITS | TAG_BOOL
+        elif isinstance(obj, int):
+            return self.write_int(obj)
+        elif isinstance(obj, float):
+            value = obj
+            offset = self.allocate(1)
+            memcpy(&self.words[offset // 8], &value, 8)
+            return offset << TAG_BITS | TAG_FLOAT
+        elif isinstance(obj, (list, tuple)):
+            return self.write_array(obj)
+        elif isinstance(obj, dict):
+            return self.write_dict(obj)
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            return self.write_buffer(obj, TAG_DATA)
+        elif isinstance(obj, array.array):
+            return self.write_typed_array(obj)
+        elif is_numpy_array(obj):
+            if obj.ndim == 1 and obj.dtype.itemsize == 8 and obj.dtype.kind in "if":
+                return self.write_typed_array(
+                    array.array("q" if obj.dtype.kind == "i" else "d", obj.tobytes())
+                )
+            return self.write_array(obj.tolist())
+        elif isinstance(obj, Mapping):
+            return self.write_dict(obj)
+        elif isinstance(obj, Sequence):
+            return self.write_array(obj)
+        raise TypeError(
+            f"Object of type {type(obj).__name__} is not supported by the cache"
+        )
+
+    cdef bytes finish(
+        self,
+        uint64_t root,
+        uint32_t options,
+        uint64_t source_size,
+        int64_t source_mtime,
+        bytes source_hash,
+    ):
+        # the ASCII strings are copied as is, the others encoded first
+        cdef list strings = [
+            s if PyUnicode_IS_ASCII(s) else s.encode("utf-8", "surrogatepass")
+            for s in self.strings
+        ]
+        cdef size_t n = len(strings), i, length = 0
+        for i in range(n):
+            length += len(strings[i])
+        cdef uint64_t table = self.allocate(1 + n + (length + 7) // 8)
+        cdef size_t base = table // 8
+        cdef uint8_t *data = <uint8_t *>&self.words[base + 1 + n]
+        length = 0
+        for i in range(n):
+            self.words[base + i] = length
+            s = strings[i]
+            if isinstance(s, unicode):
+                memcpy(data + length, PyUnicode_DATA(s), len(s))
+            else:
+                memcpy(data + length, <const char *><bytes>s, len(s))
+            length += len(s)
+        self.words[base + n] = length
+
+        cdef size_t size = self.words.size() * 8
+        cdef bytes header = HEADER.pack(
+            MAGIC[:8],
+            FORMAT_VERSION,
+            options,
+            source_size,
+            source_mtime,
+            source_hash,
+            root,
+            n,
+            table,
+            size,
+        )
+        memcpy(self.words.data(), <const char *>header, HEADER_SIZE)
+        return PyBytes_FromStringAndSize(<const char *>self.words.data(), size)
+
+
+cdef bint is_numpy_array(obj):
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
+cdef bytes dump_tree(
+    obj,
+    uint32_t options=0,
+    uint64_t source_size=0,
+    int64_t source_mtime=0,
+    bytes source_hash=bytes(16),
+):
+    cdef CacheWriter writer = CacheWriter()
+    root = writer.write_value(obj)
+    return writer.finish(root, options, source_size, source_mtime, source_hash)
+
+
+def dumps(obj):
+    """Serialize a parsed plist to the binary cache format, and return it as
+    bytes.
+
+    Besides what loads() returns (str, int, float, bytes, dict and list), the
+    values can be bools, tuples and any other Mapping or Sequence, which are
+    loaded back as dicts and lists, and the typed arrays of
+    loads(..., typed_arrays=True), including numpy arrays of 64-bit numbers.
+    The dict keys must be strings.
+    """
+    return dump_tree(obj)
+
+
+def dump(obj, fp):
+    """Like dumps(), but write the cache to a binary file object."""
+    fp.write(dump_tree(obj))
+
+
+cdef object invalid_cache(message):
+    return ValueError(f"Invalid cache: {message}")
+
+
+@cython.final
+cdef class CacheReader:
+    """Reads the values from a binary cache, held in any object supporting
+    the buffer protocol (bytes, mmap...), which it keeps a reference to.
+    """
+
+    cdef object data
+    cdef Py_buffer view
+    cdef bint has_view
+    cdef const uint8_t *buf
+    cdef uint64_t values_end
+    cdef uint64_t num_strings
+    cdef const uint8_t *string_data
+    cdef uint64_t string_data_size
+    cdef list strings
+    cdef object dict_type
+    cdef bint numpy_arrays
+    cdef readonly uint64_t root
+
+    def __cinit__(self, data, dict_type=dict, bint numpy_arrays=False):
+        self.data = data
+        PyObject_GetBuffer(data, &self.view, PyBUF_SIMPLE)
+        self.has_view = True
+        self.buf = <const uint8_t *>self.view.buf
+        self.dict_type = dict_type
+        self.numpy_arrays = numpy_arrays
+
+        cdef uint64_t size = self.view.len
+        if size < HEADER_SIZE or memcmp(self.buf, MAGIC, 8) != 0:
+            raise invalid_cache("not a cache file")
+        (
+            _, version, _, _, _, _, root, num_strings, table, file_size
+        ) = HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise invalid_cache(f"unsupported version {version}")
+        if file_size != size:
+            raise invalid_cache("truncated file")
+        if (
+            table < HEADER_SIZE
+            or table > size
+            or num_strings >= (size - table) // 8
+        ):
+            raise invalid_cache("string table out of bounds")
+        self.root = root
+        self.values_end = table
+        self.num_strings = num_strings
+        self.string_data = self.buf + self.values_end + (self.num_strings + 1) * 8
+        self.string_data_size = (
+            size - self.values_end - (self.num_strings + 1) * 8
+        )
+        if read_word(self.string_data - 8) > self.string_data_size:
+            raise invalid_cache("string table out of bounds")
+        self.strings = [None] * num_strings
+
+    def __dealloc__(self):
+        if self.has_view:
+            PyBuffer_Release(&self.view)
+
+    cdef inline uint64_t word(self, uint64_t offset) noexcept:
+        return read_word(self.buf + offset)
+
+    cdef unicode string(self, uint64_t index):
+        if index >= self.num_strings:
+            raise invalid_cache("string index out of range")
+        result = self.strings[index]
+        if result is not None:
+            return result
+        cdef const uint8_t *table = self.string_data - (self.num_strings + 1) * 8
+        cdef uint64_t start = read_word(table + index * 8)
+        cdef uint64_t end = read_word(table + index * 8 + 8)
+        if start > end or end > self.string_data_size:
+            raise invalid_cache("string out of bounds")
+        result = PyUnicode_DecodeUTF8(
+            <const char *>self.string_data + start, end - start, "surrogatepass"
+        )
+        self.strings[index] = result
+        return result
+
+    cdef uint64_t check_offset(
+        self, uint64_t offset, uint64_t parent, uint64_t words
+    ) except? 0:
+        # Check that the value at the given offset follows its parent and
+        # has at least that many words, and return the first of them
+        if (
+            offset <= parent
+            or offset < HEADER_SIZE
+            or offset % 8
+            or offset > self.values_end
+            or words > (self.values_end - offset) // 8
+        ):
+            raise invalid_cache("value out of bounds")
+        return self.word(offset)
+
+    cdef uint64_t container_size(
+        self, uint64_t offset, uint64_t parent, uint64_t words_per_item
+    ) except? 0:
+        cdef uint64_t n = self.check_offset(offset, parent, 1)
+        if n > ((self.values_end - offset) // 8 - 1) // words_per_item:
+            raise invalid_cache("container out of bounds")
+        return n
+
+    cdef bytes read_bytes(self, uint64_t offset, uint64_t parent):
+        cdef uint64_t length = self.check_offset(offset, parent, 1)
+        if length > self.values_end - offset - 8:
+            raise invalid_cache("data out of bounds")
+        return PyBytes_FromStringAndSize(
+            <const char *>self.buf + offset + 8, length
+        )
+
+    cdef object read_typed_array(self, uint64_t offset, uint64_t parent):
+        cdef uint64_t typecode = self.check_offset(offset, parent, 2)
+        cdef uint64_t n = self.word(offset + 8)
+        if typecode > 0x7F:
+            raise invalid_cache("invalid typed array")
+        cdef array.array result = array.array(chr(typecode))
+        if n > (self.values_end - offset - 16) // result.itemsize:
+            raise invalid_cache("typed array out of bounds")
+        array.resize(result, n)
+        memcpy(result.data.as_voidptr, self.buf + offset + 16, n * result.itemsize)
+        if self.numpy_arrays:
+            import numpy
+
+            return numpy.frombuffer(result, dtype=result.typecode)
+        return result
+
+    cdef object read_value(self, uint64_t slot, uint64_t parent, bint lazy):
+        """Return the value that the slot refers to, whose container starts at
+        'parent'. With 'lazy', the dicts and arrays are returned as CacheDict
+        and CacheList objects instead of being read in full.
+        """
+        cdef uint64_t tag = slot & TAG_MASK
+        cdef uint64_t offset = slot >> TAG_BITS
+        cdef uint64_t n, i
+        cdef double value
+        if tag == TAG_STRING:
+            return self.string(offset)
+        elif tag == TAG_INT:
+            # sign-extend the 60-bit integer
+            return PyLong_FromLongLong((<int64_t>slot) >> TAG_BITS)
+        elif tag == TAG_INT64:
+            return PyLong_FromLongLong(<int64_t>self.check_offset(offset, parent, 1))
+        elif tag == TAG_BIG_INT:
+            return int(self.read_bytes(offset, parent))
+        elif tag == TAG_FLOAT:
+            self.check_offset(offset, parent, 1)
+            memcpy(&value, self.buf + offset, 8)
+            return value
+        elif tag == TAG_DATA:
+            return self.read_bytes(offset, parent)
+        elif tag == TAG_BOOL:
+            return offset != 0
+        elif tag == TAG_TYPED_ARRAY:
+            return self.read_typed_array(offset, parent)
+        elif tag == TAG_ARRAY:
+            n = self.container_size(offset, parent, 1)
+            if lazy:
+                return CacheList(self, offset, n)
+            return self.read_list(offset, n)
+        elif tag == TAG_DICT:
+            n = self.container_size(offset, parent, 2)
+            if lazy:
+                return CacheDict(self, offset, n)
+            return self.read_dict(offset, n)
+        raise invalid_cache(f"unknown value type {tag}")
+
+    cdef list read_list(self, uint64_t offset, uint64_t n):
+        cdef list result = PyList_New(n)
+        cdef uint64_t i
+        for i in range(n):
+            value = self.read_value(self.word(offset + 8 + i * 8), offset, False)
+            Py_INCREF(value)
+            PyList_SET_ITEM(result, i, value)
+        return result
+
+    cdef object read_dict(self, uint64_t offset, uint64_t n):
+        cdef uint64_t i
+        cdef bint is_dict = self.dict_type is dict
+        result = {} if is_dict else self.dict_type()
+        for i in range(n):
+            key = self.string(self.word(offset + 8 + i * 8))
+            value = self.read_value(self.word(offset + 8 + (n + i) * 8), offset, False)
+            if is_dict:
+                PyDict_SetItem(result, key, value)
+            else:
+                result[key] = value
+        return result
+
+
+class CacheDict(Mapping):
+    """A read-only mapping returned by loads(..., lazy=True) for a dictionary.
+
+    The keys are read upfront, but each value is only read from the cache the
+    first time it is accessed, then kept.
+    """
+
+    __slots__ = ("_reader", "_offset", "_indices", "_values")
+
+    def __init__(self, CacheReader reader, uint64_t offset, uint64_t n):
+        cdef uint64_t i
+        self._reader = reader
+        self._offset = offset
+        self._indices = {
+            reader.string(reader.word(offset + 8 + i * 8)): i for i in range(n)
+        }
+        self._values = {}
+
+    def __getitem__(self, key):
+        cdef dict values = self._values
+        try:
+            return values[key]
+        except KeyError:
+            pass
+        cdef uint64_t i = self._indices[key]
+        cdef uint64_t offset = self._offset
+        cdef CacheReader reader = self._reader
+        value = reader.read_value(
+            reader.word(offset + 8 + (len(self._indices) + i) * 8), offset, True
+        )
+        values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._indices)
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __contains__(self, key):
+        return key in self._indices
+
+    def __repr__(self):
+        return f"<{type(self).__name__} with {len(self)} keys>"
+
+
+class CacheList(Sequence):
+    """A read-only sequence returned by loads(..., lazy=True) for an array.
+
+    Each element is only read from the cache the first time it is accessed,
+    then kept.
+    """
+
+    __slots__ = ("_reader", "_offset", "_values")
+
+    def __init__(self, CacheReader reader, uint64_t offset, uint64_t n):
+        self._reader = reader
+        self._offset = offset
+        self._values = [None] * n
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._values)))]
+        cdef list values = self._values
+        cdef Py_ssize_t n = len(values)
+        cdef Py_ssize_t i = index
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError("list index out of range")
+        value = values[i]
+        cdef CacheReader reader
+        if value is None:
+            reader = self._reader
+            value = reader.read_value(
+                reader.word(self._offset + 8 + i * 8), self._offset, True
+            )
+            values[i] = value
+        return value
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, CacheList):
+            other = list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} with {len(self)} items>"
+
+
+cdef object load_buffer(data, dict_type, bint numpy_arrays, bint lazy):
+    cdef CacheReader reader = CacheReader(data, dict_type, numpy_arrays)
+    return reader.read_value(reader.root, 0, lazy)
+
+
+def loads(data, dict_type=dict, bint lazy=False):
+    """Load a plist from the binary cache format, held in bytes or any other
+    object supporting the buffer protocol.
+
+    With lazy=True, the dicts and arrays are returned as read-only CacheDict
+    and CacheList objects, whose values are only read the first time they
+    are accessed: the returned object keeps a reference to the data, which
+    can be a memory mapping of a cache file.
+
+    Raises ValueError if the data isn't a valid cache.
+    """
+    return load_buffer(data, dict_type, False, lazy)
+
+
+def load(fp, dict_type=dict, bint lazy=False):
+    """Like loads(), but read the cache from a binary file object."""
+    return load_buffer(fp.read(), dict_type, False, lazy)
+
+
+cdef bytes hash_file(path):
+    cdef object h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        while True:
+            chunk = fp.read(1 << 20)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.digest()
+
+
+cdef uint32_t get_options(bint use_numbers, encoding, typed_arrays):
+    cdef uint32_t options = 0
+    if use_numbers:
+        options |= OPTION_USE_NUMBERS
+    if typed_arrays:
+        options |= OPTION_TYPED_ARRAYS
+    if codecs.lookup(encoding).name != "utf-8":
+        options |= OPTION_LATIN1
+    return options
+
+
+cdef object load_valid_cache(
+    source, cache_path, st, uint32_t options, dict_type, bint numpy_arrays, bint lazy
+):
+    # Load the cache if it exists and was made from the current version of
+    # the source with the same options, else return None
+    try:
+        fp = open(cache_path, "rb")
+    except FileNotFoundError:
+        return None
+    with fp:
+        header = fp.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            return None
+        (
+            magic, version, cached_options, size, mtime, digest, _, _, _, _
+        ) = HEADER.unpack(header)
+        if (
+            magic != MAGIC[:8]
+            or version != FORMAT_VERSION
+            or cached_options != options
+            or size != st.st_size
+        ):
+            return None
+        if mtime != st.st_mtime_ns:
+            # the source was touched: check if its content changed
+            if hash_file(source) != digest:
+                return None
+            try:
+                with open(cache_path, "r+b") as f:
+                    f.seek(SOURCE_MTIME_OFFSET)
+                    f.write(struct.pack("=q", st.st_mtime_ns))
+            except OSError:
+                pass
+        try:
+            m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+    # the mapping gets closed when the values that hold on to it (only the
+    # lazy ones) are garbage collected
+    try:
+        return load_buffer(m, dict_type, numpy_arrays, lazy)
+    except ValueError:
+        return None
+
+
+cdef object write_cache(bytes data, cache_path):
+    # write to a temporary file that replaces the cache at once, so that
+    # concurrent readers never see a partial one
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load_cached(
+    path,
+    cache_path=None,
+    dict_type=dict,
+    use_numbers=False,
+    encoding="utf-8",
+    typed_arrays=False,
+    lazy=False,
+):
+    """Parse the OpenStep plist file at the given path like load_path, going
+    through a binary cache file that is only rebuilt when the source changes.
+
+    The cache is written to 'cache_path', by default the path of the source
+    with a ".cache" suffix. It records the size, modification time and hash
+    of the source, as well as the parsing options: it's used as is if the
+    size and time still match, and only if the hash does when the time has
+    changed. Otherwise the source is parsed, and the cache replaced (failing
+    to write it isn't an error).
+
+    With lazy=True, the result is loaded from a memory mapping of the cache
+    as read-only CacheDict and CacheList objects, which only read each value
+    the first time it is accessed.
+    """
+    source = os.fspath(path)
+    if cache_path is None:
+        cache_path = source + ".cache"
+    cdef uint32_t options = get_options(use_numbers, encoding, typed_arrays)
+    cdef bint numpy_arrays = typed_arrays == "numpy"
+    st = os.stat(source)
+    result = load_valid_cache(
+        source, cache_path, st, options, dict_type, numpy_arrays, lazy
+    )
+    if result is not None:
+        return result
+
+    digest = hash_file(source)
+    result = parser.load_path(
+        source,
+        dict_type=dict_type,
+        use_numbers=use_numbers,
+        encoding=encoding,
+        typed_arrays=typed_arrays,
+    )
+    data = dump_tree(result, options, st.st_size, st.st_mtime_ns, digest)
+    write_cache(data, cache_path)
+    if lazy:
+        return load_buffer(data, dict_type, numpy_arrays, True)
+    return result
@@ -1,15 +1,89 @@
 #cython: language_level=3
 
-from libc.stdint cimport uint32_t
+from libc.stdint cimport int64_t, uint8_t, uint16_t, uint32_t
 from libcpp.vector cimport vector
 
 
-ctypedef struct ParseInfo:
+# The parser functions are specialized (via Cython fused types) on the kind of
+# buffer they read from: Latin-1 or UTF-8 encoded bytes, or the 1-, 2- or
+# 4-byte native storage of a str object (PEP 393), whose 1-byte kind is the
+# same as Latin-1. The structs share the same layout, only the type of the
+# character pointers differ. Since all the plist structural characters are
+# ASCII, UTF-8 input can be scanned one byte at a time like Latin-1, and only
+# needs decoding when the quoted strings are built.
+# The 'line_offset' is the number of lines that precede 'begin' in the whole
+# document (non-zero when parsing incrementally), for the error messages.
+# The 'strings' is the StringTable used to intern the keys and unquoted
+# strings, or NULL. The 'hooks' is the ParseHooks whose callbacks build the
+# dicts, arrays and data, or NULL.
+# The 'typed_arrays' tells whether arrays of numbers are returned as lists, or
+# as array.array or numpy.ndarray objects.
+
+cdef enum TypedArrays:
+    TYPED_ARRAYS_NONE = 0
+    TYPED_ARRAYS_ARRAY = 1
+    TYPED_ARRAYS_NUMPY = 2
+
+
+ctypedef struct ParseInfoUCS1:
+    const uint8_t *begin
+    const uint8_t *curr
+    const uint8_t *end
+    void *dict_type
+    void *strings
+    void *hooks
+    bint use_numbers
+    TypedArrays typed_arrays
+    uint32_t line_offset
+
+
+ctypedef struct ParseInfoUTF8:
+    const uint8_t *begin
+    const uint8_t *curr
+    const uint8_t *end
+    void *dict_type
+    void *strings
+    void *hooks
+    bint use_numbers
+    TypedArrays typed_arrays
+    uint32_t line_offset
+
+
+ctypedef struct ParseInfoUCS2:
+    const uint16_t *begin
+    const uint16_t *curr
+    const uint16_t *end
+    void *dict_type
+    void *strings
+    void *hooks
+    bint use_numbers
+    TypedArrays typed_arrays
+    uint32_t line_offset
+
+
+ctypedef struct ParseInfoUCS4:
     const Py_UCS4 *begin
     const Py_UCS4 *curr
     const Py_UCS4 *end
     void *dict_type
+    void *strings
+    void *hooks
     bint use_numbers
+    TypedArrays typed_arrays
+    uint32_t line_offset
+
+
+ctypedef fused ParseInfo:
+    ParseInfoUCS1
+    ParseInfoUTF8
+    ParseInfoUCS2
+    ParseInfoUCS4
+
+
+ctypedef fused char_type:
+    uint8_t
+    uint16_t
+    Py_UCS4
 
 
 cdef class ParseError(Exception):
@@ -19,13 +93,23 @@ cdef class ParseError(Exception):
 cdef uint32_t line_number_strings(ParseInfo *pi)
 
 
-cdef bint advance_to_non_space(ParseInfo *pi)
+cdef bint advance_to_non_space(ParseInfo *pi) noexcept nogil
+
 
+cdef bint is_utf8_line_separator(
+    const uint8_t *p, const uint8_t *end
+) noexcept nogil
 
-cdef Py_UCS4 get_slashed_char(ParseInfo *pi)
 
+cdef Py_UCS4 current_char(ParseInfo *pi)
 
-cdef unicode parse_quoted_plist_string(ParseInfo *pi, Py_UCS4 quote)
+
+cdef Py_UCS4 get_slashed_char(ParseInfo *pi) noexcept nogil
+
+
+cdef unicode parse_quoted_plist_string(
+    ParseInfo *pi, Py_UCS4 quote, bint intern=*
+)
 
 
 cdef enum UnquotedType:
@@ -34,7 +118,20 @@ cdef enum UnquotedType:
     UNQUOTED_FLOAT = 2
 
 
-cdef UnquotedType get_unquoted_string_type(const Py_UCS4 *buf, Py_ssize_t length)
+cdef UnquotedType get_unquoted_string_type(const char_type *buf, Py_ssize_t length)
+
+
+cdef bint int64_from_chars(
+    const char_type *buf, Py_ssize_t length, int64_t *value
+) noexcept
+
+
+cdef double float_from_chars(const char_type *buf, Py_ssize_t length) except? -1.0
+
+
+cdef object number_from_chars(
+    const char_type *buf, Py_ssize_t length, UnquotedType kind
+)
 
 
 cdef object parse_unquoted_plist_string(ParseInfo *pi, bint ensure_string=*)
@@ -43,7 +140,10 @@ cdef object parse_unquoted_plist_string(ParseInfo *pi, bint ensure_string=*)
 cdef unicode parse_plist_string(ParseInfo *pi, bint required=*)
 
 
-cdef list parse_plist_array(ParseInfo *pi)
+cdef object parse_typed_array(ParseInfo *pi)
+
+
+cdef object parse_plist_array(ParseInfo *pi)
 
 
 cdef object parse_plist_dict_content(ParseInfo *pi)
@@ -52,13 +152,22 @@ cdef object parse_plist_dict_content(ParseInfo *pi)
 cdef object parse_plist_dict(ParseInfo *pi)
 
 
-cdef unsigned char from_hex_digit(unsigned char ch)
+cdef unsigned char from_hex_digit(Py_UCS4 ch) noexcept nogil
 
 
-cdef int get_data_bytes(ParseInfo *pi, vector[unsigned char]& result) except -1
+cdef bytes get_data_bytes(ParseInfo *pi)
 
 
 cdef bytes parse_plist_data(ParseInfo *pi)
 
 
 cdef object parse_plist_object(ParseInfo *pi, bint required=*)
+
+
+cdef object parse_plist_document(ParseInfo *pi)
+
+
+cdef int skip_plist_object(ParseInfo *pi) except -1
+
+
+cdef bint is_utf8_encoding(encoding) except -1
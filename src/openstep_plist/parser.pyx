@@ -1,19 +1,35 @@
 #cython: language_level=3
 #distutils: define_macros=CYTHON_TRACE_NOGIL=1
 
-from cpython.bytes cimport PyBytes_FromStringAndSize
-from cpython.mem cimport PyMem_Free
+from cpython.buffer cimport (
+    PyObject_CheckBuffer, PyObject_GetBuffer, PyBuffer_Release, PyBUF_SIMPLE,
+)
+from cpython.bytes cimport (
+    PyBytes_AS_STRING, PyBytes_FromStringAndSize, _PyBytes_Resize,
+)
+from cpython.dict cimport PyDict_New, PyDict_SetItem
+from cpython.float cimport PyFloat_FromDouble
+from cpython.long cimport PyLong_FromLongLong
 from cpython.unicode cimport (
-    PyUnicode_4BYTE_KIND, PyUnicode_FromKindAndData, PyUnicode_AsUCS4Copy,
-    PyUnicode_GET_LENGTH,
+    PyUnicode_1BYTE_KIND, PyUnicode_2BYTE_KIND, PyUnicode_4BYTE_KIND,
+    PyUnicode_GET_LENGTH, PyUnicode_DecodeUTF8, PyUnicode_KIND, PyUnicode_DATA,
 )
-from libc.stdint cimport uint8_t, uint16_t, uint32_t
-from libcpp.algorithm cimport copy
-from libcpp.iterator cimport back_inserter
+from cpython.ref cimport PyObject, Py_INCREF, Py_DECREF, Py_XDECREF
+from cpython.mem cimport PyMem_Calloc, PyMem_Free
+from libc.stdint cimport int64_t, uint8_t, uint16_t, uint32_t, uint64_t, INT64_MAX
+from libc.string cimport memchr, memcmp, memcpy, memset
 from libcpp.vector cimport vector
 from cpython.version cimport PY_MAJOR_VERSION
+from cpython cimport array
 cimport cython
 
+cdef extern from "Python.h":
+    unicode PyUnicode_New(Py_ssize_t size, Py_UCS4 maxchar)
+    double PyOS_string_to_double(
+        const char *s, char **endptr, PyObject *overflow_exception
+    ) except? -1.0
+
+
 from .util cimport (
     tounicode,
     tostr,
@@ -23,13 +39,25 @@ from .util cimport (
     is_high_surrogate,
     is_low_surrogate,
     unicode_scalar_from_surrogates,
+    decode_utf8_char,
 )
+from bisect import bisect_right
+from collections import namedtuple
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+import array
+import codecs
+import mmap
+import os
+import re
+import sys
+import warnings
 
 
 cdef uint32_t line_number_strings(ParseInfo *pi):
     # warning: doesn't have a good idea of Unicode line separators
-    cdef const Py_UCS4 *p = pi.begin
-    cdef uint32_t count = 1
+    p = pi.begin
+    cdef uint32_t count = 1 + pi.line_offset
     while p < pi.curr:
         if p[0] == c'\r':
             count += 1
@@ -41,7 +69,7 @@ cdef uint32_t line_number_strings(ParseInfo *pi):
     return count
 
 
-cdef bint advance_to_non_space(ParseInfo *pi):
+cdef bint advance_to_non_space(ParseInfo *pi) noexcept nogil:
     """Returns true if the advance found something that's not whitespace
     before the end of the buffer, false otherwise.
     """
@@ -66,6 +94,9 @@ cdef bint advance_to_non_space(ParseInfo *pi):
                     ch3 = pi.curr[0]
                     if ch3 == c'\n' or ch3 == c'\r' or ch3 == 0x2028 or ch3 == 0x2029:
                         break
+                    if ParseInfo is ParseInfoUTF8:
+                        if is_utf8_line_separator(pi.curr, pi.end):
+                            break
                     pi.curr += 1
             elif pi.curr[0] == c'*':
                 # handle C-style comments /* ... */
@@ -80,12 +111,40 @@ cdef bint advance_to_non_space(ParseInfo *pi):
                 pi.curr -= 1
                 return True
         else:
+            if ParseInfo is ParseInfoUTF8:
+                if is_utf8_line_separator(pi.curr - 1, pi.end):
+                    pi.curr += 2
+                    continue
             pi.curr -= 1
             return True
 
     return False
 
 
+cdef inline bint is_utf8_line_separator(
+    const uint8_t *p, const uint8_t *end
+) noexcept nogil:
+    # U+2028 LINE SEPARATOR and U+2029 PARAGRAPH SEPARATOR in UTF-8
+    return (
+        end - p >= 3
+        and p[0] == 0xE2
+        and p[1] == 0x80
+        and (p[2] == 0xA8 or p[2] == 0xA9)
+    )
+
+
+cdef Py_UCS4 current_char(ParseInfo *pi):
+    # Only used for error messages: the UTF-8 parser reads one byte at a time,
+    # but we want to report the whole (possibly multi-byte) character.
+    cdef Py_UCS4 ch = 0
+    if pi.curr >= pi.end:
+        return 0
+    if ParseInfo is ParseInfoUTF8:
+        if decode_utf8_char(pi.curr, pi.end, &ch):
+            return ch
+    return pi.curr[0]
+
+
 # Table mapping from NextStep Encoding to Unicode characters, used
 # for decoding octal escaped character codes within quoted plist strings.
 # Since the first 128 characters (0x0 - 0x7f) are identical to ASCII
@@ -110,13 +169,16 @@ cdef unsigned short* NEXT_STEP_DECODING_TABLE = [
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef Py_UCS4 get_slashed_char(ParseInfo *pi):
+cdef Py_UCS4 get_slashed_char(ParseInfo *pi) noexcept nogil:
     cdef Py_UCS4 result
     cdef uint8_t num
     cdef unsigned int codepoint, num_digits
     cdef unsigned long unum
-    cdef unsigned long ch = pi.curr[0]
+    cdef unsigned long ch
 
+    if pi.curr >= pi.end:
+        return 0
+    ch = pi.curr[0]
     pi.curr += 1
     if (
         ch == c'0' or
@@ -130,9 +192,10 @@ cdef Py_UCS4 get_slashed_char(ParseInfo *pi):
     ):
         num = ch - c'0'
         # three digits maximum to avoid reading \000 followed by 5 as \5 !
+        if pi.curr >= pi.end:
+            return 0
         ch = pi.curr[0]
         if ch >= c'0' and ch <= c'7':
-            # we use in this test the fact that the buffer is zero-terminated
             pi.curr += 1
             num = (num << 3) + ch - c'0'
             if pi.curr < pi.end:
@@ -181,20 +244,242 @@ cdef Py_UCS4 get_slashed_char(ParseInfo *pi):
     return ch
 
 
-cdef unicode parse_quoted_plist_string(ParseInfo *pi, Py_UCS4 quote):
-    cdef vector[Py_UCS4] string
-    cdef const Py_UCS4 *start_mark = pi.curr
-    cdef const Py_UCS4 *mark = pi.curr
-    cdef const Py_UCS4 *tmp
+cdef int append_string_run(
+    ParseInfo *pi, vector[Py_UCS4]& string, Py_ssize_t length,
+    uint32_t *maxchar,
+) except -1:
+    # Append to the string the 'length' characters that precede pi.curr;
+    # UTF-8 input must be decoded, and the decoded characters or'ed into
+    # maxchar, whereas the other kinds are simply widened.
+    cdef Py_UCS4 ch
+    cdef Py_ssize_t n
+    p = pi.curr - length
+    if ParseInfo is ParseInfoUTF8:
+        while p < pi.curr:
+            n = decode_utf8_char(p, pi.curr, &ch)
+            if n == 0:
+                raise ParseError(
+                    "Invalid UTF-8 byte sequence in string at line %d"
+                    % line_number_strings(pi)
+                )
+            string.push_back(ch)
+            maxchar[0] |= <uint32_t>ch
+            p += n
+    else:
+        string.insert(string.end(), p, pi.curr)
+    return 0
+
+
+cdef unicode decode_utf8_string(
+    ParseInfoUTF8 *pi, const uint8_t *s, Py_ssize_t length
+):
+    try:
+        return PyUnicode_DecodeUTF8(<char*>s, length, NULL)
+    except UnicodeDecodeError:
+        raise ParseError(
+            "Invalid UTF-8 byte sequence in string at line %d"
+            % line_number_strings(pi)
+        ) from None
+
+
+# Only short strings are interned: they are the ones most likely to repeat
+cdef enum:
+    MAX_INTERNED_LENGTH = 40
+    # the cache sizes are powers of 2, between these depending on the input
+    MIN_STRING_CACHE_SIZE = 64
+    MAX_STRING_CACHE_SIZE = 4096
+    # a longer scratch buffer is released once used
+    MAX_SCRATCH_LENGTH = 65536
+
+
+@cython.final
+cdef class StringTable:
+    """Interns the strings created by the parser: 'table' maps each string to
+    the one instance that is returned for all the equal strings.
+
+    Looking up the table requires creating the string first: the 'cache' of
+    the most recent ASCII strings is looked up by their characters instead,
+    so that a repeated string doesn't even need to be allocated. It's only
+    allocated for the first of these strings, with a size that depends on
+    the length of the input, so that parsing a small document stays cheap.
+
+    The 'scratch' buffer is where the quoted strings with escape sequences
+    are decoded, reused from one string to the next.
+    """
+
+    cdef dict table
+    cdef PyObject **cache
+    cdef size_t cache_mask
+    cdef vector[Py_UCS4] scratch
+
+    def __cinit__(self, dict table=None):
+        self.table = {} if table is None else table
+
+    def __dealloc__(self):
+        cdef size_t i
+        if self.cache != NULL:
+            for i in range(self.cache_mask + 1):
+                Py_XDECREF(self.cache[i])
+            PyMem_Free(self.cache)
+
+    cdef int init_cache(self, Py_ssize_t input_length) except -1:
+        # about one slot per 16 characters of input
+        cdef size_t size = MIN_STRING_CACHE_SIZE
+        while (
+            size < MAX_STRING_CACHE_SIZE
+            and <Py_ssize_t>size * 16 < input_length
+        ):
+            size *= 2
+        self.cache = <PyObject **>PyMem_Calloc(size, sizeof(PyObject *))
+        if self.cache == NULL:
+            raise MemoryError()
+        self.cache_mask = size - 1
+        return 0
+
+
+@cython.final
+cdef class ParseHooks:
+    """The callbacks that build the parsed dicts, arrays and data, each
+    called once with all the items: the list of (key, value) pairs, the list
+    of values, or the bytes. Any of them can be None.
+    """
+
+    cdef object object_pairs_hook
+    cdef object array_hook
+    cdef object data_hook
+
+    def __cinit__(self, object_pairs_hook, array_hook, data_hook):
+        self.object_pairs_hook = object_pairs_hook
+        self.array_hook = array_hook
+        self.data_hook = data_hook
+
+
+cdef unicode new_string(
+    const char_type *p, Py_ssize_t length, uint32_t maxchar
+):
+    # Return the 'length' characters at p as a new string of the narrowest
+    # kind that holds 'maxchar'. This can be the bitwise or of the characters
+    # rather than their maximum: it requires the same kind.
+    cdef unicode s
+    cdef void *data
+    cdef Py_ssize_t i
+    if maxchar > 0x10FFFF:
+        maxchar = 0x10FFFF
+    s = PyUnicode_New(length, maxchar)
+    data = PyUnicode_DATA(s)
+    kind = PyUnicode_KIND(s)
+    if kind == PyUnicode_1BYTE_KIND:
+        if char_type is uint8_t:
+            memcpy(data, p, length)
+        else:
+            for i in range(length):
+                (<uint8_t *>data)[i] = <uint8_t>p[i]
+    elif kind == PyUnicode_2BYTE_KIND:
+        if char_type is uint16_t:
+            memcpy(data, p, length * sizeof(uint16_t))
+        else:
+            for i in range(length):
+                (<uint16_t *>data)[i] = <uint16_t>p[i]
+    else:
+        if char_type is Py_UCS4:
+            memcpy(data, p, length * sizeof(Py_UCS4))
+        else:
+            for i in range(length):
+                (<Py_UCS4 *>data)[i] = p[i]
+    return s
+
+
+cdef unicode new_string_run(
+    ParseInfo *pi, Py_ssize_t length, uint32_t maxchar
+):
+    # Return the 'length' characters that precede pi.curr, which contain no
+    # escape sequences, as a new string. The 'maxchar' is the bitwise or of
+    # the characters, which were tracked while scanning them: for UTF-8 input
+    # it's the or of the bytes, that only tells whether they are all ASCII.
+    p = pi.curr - length
+    if ParseInfo is ParseInfoUTF8:
+        if maxchar >= 0x80:
+            return decode_utf8_string(pi, p, length)
+    return new_string(p, length, maxchar)
+
+
+cdef unicode intern_string_run(
+    ParseInfo *pi, Py_ssize_t length, uint32_t maxchar
+):
+    # Like new_string_run, but return the interned string if pi.strings is set
+    cdef StringTable strings
+    cdef uint32_t ch, h = 2166136261
+    cdef Py_ssize_t i
+    cdef PyObject *cached
+    cdef const uint8_t *data
+    if pi.strings == NULL or length > MAX_INTERNED_LENGTH:
+        return new_string_run(pi, length, maxchar)
+    strings = <StringTable>pi.strings
+    p = pi.curr - length
+    if maxchar >= 0x80:
+        s = new_string_run(pi, length, maxchar)
+        return strings.table.setdefault(s, s)
+    # FNV-1a hash of the characters
+    for i in range(length):
+        ch = p[i]
+        h = (h ^ ch) * 16777619
+    if strings.cache == NULL:
+        strings.init_cache(pi.end - pi.begin)
+    # ASCII strings are compact with 1 byte per character
+    i = h & strings.cache_mask
+    cached = strings.cache[i]
+    if cached != NULL and PyUnicode_GET_LENGTH(<unicode>cached) == length:
+        data = <const uint8_t *>PyUnicode_DATA(<unicode>cached)
+        if ParseInfo is ParseInfoUTF8 or ParseInfo is ParseInfoUCS1:
+            if memcmp(data, p, length) == 0:
+                return <unicode>cached
+        else:
+            for i in range(length):
+                if data[i] != p[i]:
+                    break
+            else:
+                return <unicode>cached
+            i = h & strings.cache_mask
+    s = new_string_run(pi, length, maxchar)
+    s = strings.table.setdefault(s, s)
+    Py_INCREF(s)
+    Py_XDECREF(cached)
+    strings.cache[i] = <PyObject *>s
+    return s
+
+
+cdef unicode parse_quoted_plist_string(
+    ParseInfo *pi, Py_UCS4 quote, bint intern=False
+):
+    # The characters are or'ed into 'maxchar' as they are scanned. Up to the
+    # first escape sequence, the string is the quoted text as is; after it,
+    # the text is decoded into a scratch buffer.
+    cdef vector[Py_UCS4] local_string
+    cdef vector[Py_UCS4] *string = NULL
     cdef Py_UCS4 ch, ch2
+    cdef uint32_t maxchar = 0
+    cdef Py_ssize_t length
+    start_mark = pi.curr
+    mark = pi.curr
     while pi.curr < pi.end:
         ch = pi.curr[0]
         if ch == quote:
             break
         elif ch == c'\\':
-            string.reserve(string.size() + (pi.curr - mark))
-            copy(mark, pi.curr, back_inserter(string))
+            if string == NULL:
+                if pi.strings != NULL:
+                    string = &(<StringTable>pi.strings).scratch
+                else:
+                    string = &local_string
+                string.clear()
+            append_string_run(pi, string[0], pi.curr - mark, &maxchar)
             pi.curr += 1
+            if ParseInfo is ParseInfoUTF8:
+                if pi.curr < pi.end and pi.curr[0] >= 0x80:
+                    # a backslash followed by a non-ASCII character stands for
+                    # the character itself, which is decoded with the next run
+                    mark = pi.curr
+                    continue
             ch = get_slashed_char(pi)
             # If we are NOT on a "narrow" python 2 build, then we need to parse
             # two successive \UXXXX escape sequences as one surrogate pair
@@ -215,25 +500,35 @@ cdef unicode parse_quoted_plist_string(ParseInfo *pi, Py_UCS4 quote):
                     # lone high surrogate (not followed by a low) pass through?
                     pi.curr = tmp
             string.push_back(ch)
+            maxchar |= <uint32_t>ch
             mark = pi.curr
         else:
+            maxchar |= <uint32_t>ch
             pi.curr += 1
     if pi.end <= pi.curr:
         raise ParseError(
             "Unterminated quoted string starting on line %d"
             % line_number_strings(pi)
         )
+    if string == NULL:
+        # no escapes, the string is the quoted text as is
+        length = pi.curr - start_mark
+        if intern:
+            s = intern_string_run(pi, length, maxchar)
+        else:
+            s = new_string_run(pi, length, maxchar)
+        pi.curr += 1
+        return s
     if mark != pi.curr:
-        string.reserve(string.size() + (pi.curr - mark))
-        copy(mark, pi.curr, back_inserter(string))
+        append_string_run(pi, string[0], pi.curr - mark, &maxchar)
     # Advance past the quote character before returning
     pi.curr += 1
 
-    return PyUnicode_FromKindAndData(
-        PyUnicode_4BYTE_KIND,
-        string.const_data(),
-        string.size()
-    )
+    s = new_string(string.const_data(), string.size(), maxchar)
+    if string.capacity() > MAX_SCRATCH_LENGTH:
+        string.clear()
+        string.shrink_to_fit()
+    return s
 
 
 def string_to_number(unicode s not None, bint required=True):
@@ -241,22 +536,27 @@ def string_to_number(unicode s not None, bint required=True):
     Raises ValueError if the string is not a number.
     """
     cdef:
-        Py_UCS4 c
-        Py_UCS4* buf
         Py_ssize_t length = PyUnicode_GET_LENGTH(s)
+        int kind
+        const void *data
+        UnquotedType t
 
     if length:
-        buf = PyUnicode_AsUCS4Copy(s)
-        if not buf:
-            raise MemoryError()
-        try:
-            kind = get_unquoted_string_type(buf, length)
-            if kind == UNQUOTED_FLOAT:
-                return float(s)
-            elif kind == UNQUOTED_INTEGER:
-                return int(s)
-        finally:
-            PyMem_Free(buf)
+        kind = PyUnicode_KIND(s)
+        data = PyUnicode_DATA(s)
+        if kind == PyUnicode_1BYTE_KIND:
+            t = get_unquoted_string_type(<const uint8_t *>data, length)
+        elif kind == PyUnicode_2BYTE_KIND:
+            t = get_unquoted_string_type(<const uint16_t *>data, length)
+        else:
+            t = get_unquoted_string_type(<const Py_UCS4 *>data, length)
+        if t != UNQUOTED_STRING:
+            if kind == PyUnicode_1BYTE_KIND:
+                return number_from_chars(<const uint8_t *>data, length, t)
+            elif kind == PyUnicode_2BYTE_KIND:
+                return number_from_chars(<const uint16_t *>data, length, t)
+            else:
+                return number_from_chars(<const Py_UCS4 *>data, length, t)
 
     if required:
         raise ValueError(f"Could not convert string to float or int: {s!r}")
@@ -265,9 +565,9 @@ def string_to_number(unicode s not None, bint required=True):
 
 
 cdef UnquotedType get_unquoted_string_type(
-    const Py_UCS4 *buf, Py_ssize_t length
+    const char_type *buf, Py_ssize_t length
 ):
-    """Check if Py_UCS4 array starts with a digit, or '-' followed
+    """Check if character array starts with a digit, or '-' followed
     by a digit, and if it contains a decimal point '.'.
     Return 0 if string cannot contain a number, 1 if it contains an
     integer, and 2 if it contains a float.
@@ -278,7 +578,7 @@ cdef UnquotedType get_unquoted_string_type(
         bint maybe_number = True
         bint is_float = False
         int i = 0
-        # deref here is safe since Py_UCS4* are NULL-terminated
+        # deref here is safe since callers ensure length > 0
         Py_UCS4 ch = buf[i]
 
     if ch == c'-':
@@ -309,14 +609,106 @@ cdef UnquotedType get_unquoted_string_type(
     return UNQUOTED_STRING
 
 
+# The powers of ten that are exactly representable as doubles
+cdef double *EXACT_POWERS_OF_TEN = [
+    1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+    1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22,
+]
+
+
+cdef bint int64_from_chars(
+    const char_type *buf, Py_ssize_t length, int64_t *value
+) noexcept:
+    """Convert the characters of an integer, as classified by
+    get_unquoted_string_type, to a 64-bit integer.
+    Return False if the integer doesn't fit.
+    """
+    cdef:
+        bint negative = buf[0] == c'-'
+        Py_ssize_t i = 1 if negative else 0
+        uint64_t mantissa = 0
+
+    # up to 19 digits always fit in an unsigned 64-bit integer
+    if length - i > 19:
+        return False
+    for i in range(i, length):
+        mantissa = mantissa * 10 + (<uint32_t>buf[i] - c'0')
+    if negative:
+        if mantissa > <uint64_t>INT64_MAX + 1:
+            return False
+        value[0] = <int64_t>(0 - mantissa)
+    else:
+        if mantissa > <uint64_t>INT64_MAX:
+            return False
+        value[0] = <int64_t>mantissa
+    return True
+
+
+cdef double float_from_chars(const char_type *buf, Py_ssize_t length) except? -1.0:
+    """Convert the characters of a float, as classified by
+    get_unquoted_string_type, to a double, like float() would.
+    """
+    cdef:
+        bint negative = buf[0] == c'-'
+        Py_ssize_t i = 1 if negative else 0
+        int frac_digits = 0
+        uint64_t mantissa = 0
+        double value
+        bytes ascii
+        char *p
+
+    # floats with up to 15 digits have an exact double mantissa, which divided
+    # by an exact power of ten gives the correctly rounded result
+    if length - i - 1 <= 15:
+        for i in range(i, length):
+            if buf[i] == c'.':
+                frac_digits = length - i - 1
+            else:
+                mantissa = mantissa * 10 + (<uint32_t>buf[i] - c'0')
+        value = <double>mantissa / EXACT_POWERS_OF_TEN[frac_digits]
+        return -value if negative else value
+
+    # the characters are all ASCII, but not necessarily one byte each
+    ascii = PyBytes_FromStringAndSize(NULL, length)
+    p = PyBytes_AS_STRING(ascii)
+    for i in range(length):
+        p[i] = <char>buf[i]
+    return PyOS_string_to_double(p, NULL, NULL)
+
+
+cdef object number_from_chars(
+    const char_type *buf, Py_ssize_t length, UnquotedType kind
+):
+    """Convert the characters of an integer or float, as classified by
+    get_unquoted_string_type, to an int or float object, like int() and
+    float() would.
+    """
+    cdef:
+        int64_t value
+        Py_ssize_t i
+        bytes ascii
+        char *p
+
+    if kind == UNQUOTED_FLOAT:
+        return PyFloat_FromDouble(float_from_chars(buf, length))
+    if int64_from_chars(buf, length, &value):
+        return PyLong_FromLongLong(value)
+
+    ascii = PyBytes_FromStringAndSize(NULL, length)
+    p = PyBytes_AS_STRING(ascii)
+    for i in range(length):
+        p[i] = <char>buf[i]
+    return int(ascii)
+
+
 cdef object parse_unquoted_plist_string(ParseInfo *pi, bint ensure_string=False):
     cdef:
-        const Py_UCS4 *mark = pi.curr
         Py_UCS4 ch
         Py_ssize_t length, i
         unicode s
         UnquotedType kind
 
+    mark = pi.curr
     while pi.curr < pi.end:
         ch = pi.curr[0]
         if is_valid_unquoted_string_char(ch):
@@ -325,16 +717,13 @@ cdef object parse_unquoted_plist_string(ParseInfo *pi, bint ensure_string=False)
             break
     if pi.curr != mark:
         length = pi.curr - mark
-        s = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, <const void *>mark, length)
-
         if not ensure_string and pi.use_numbers:
             kind = get_unquoted_string_type(mark, length)
-            if kind == UNQUOTED_FLOAT:
-                return float(s)
-            elif kind == UNQUOTED_INTEGER:
-                return int(s)
+            if kind != UNQUOTED_STRING:
+                return number_from_chars(mark, length, kind)
 
-        return s
+        # the unquoted string characters are all ASCII
+        return intern_string_run(pi, length, 0x7F)
 
     raise ParseError("Unexpected EOF")
 
@@ -344,22 +733,125 @@ cdef unicode parse_plist_string(ParseInfo *pi, bint required=True):
     if not advance_to_non_space(pi):
         if required:
             raise ParseError("Unexpected EOF while parsing string")
+        return None
     ch = pi.curr[0]
     if ch == c'\'' or ch == c'"':
         pi.curr += 1
-        return parse_quoted_plist_string(pi, ch)
+        return parse_quoted_plist_string(pi, ch, intern=True)
     elif is_valid_unquoted_string_char(ch):
         return parse_unquoted_plist_string(pi, ensure_string=True)
     else:
         if required:
             raise ParseError(
                 "Invalid string character at line %d: %r"
-                % (line_number_strings(pi), ch)
+                % (line_number_strings(pi), current_char(pi))
             )
     return None
 
 
-cdef list parse_plist_array(ParseInfo *pi):
+# The integers that can be converted to doubles and back without loss
+cdef int64_t MAX_EXACT_DOUBLE_INT = 1LL << 53
+
+cdef array.array INT64_ARRAY = array.array("q")
+cdef array.array DOUBLE_ARRAY = array.array("d")
+
+
+cdef bint ints_to_doubles(
+    vector[int64_t]& ints, vector[double]& floats
+) noexcept:
+    cdef int64_t i
+    for i in ints:
+        if i > MAX_EXACT_DOUBLE_INT or i < -MAX_EXACT_DOUBLE_INT:
+            return False
+        floats.push_back(<double>i)
+    ints.clear()
+    return True
+
+
+cdef object new_typed_array(
+    ParseInfo *pi, vector[int64_t]& ints, vector[double]& floats, bint is_float
+):
+    cdef array.array result
+    if is_float:
+        result = array.clone(DOUBLE_ARRAY, floats.size(), False)
+        memcpy(result.data.as_doubles, floats.data(), floats.size() * sizeof(double))
+    else:
+        result = array.clone(INT64_ARRAY, ints.size(), False)
+        memcpy(result.data.as_longlongs, ints.data(), ints.size() * sizeof(int64_t))
+    if pi.typed_arrays == TYPED_ARRAYS_NUMPY:
+        import numpy
+
+        # the ndarray shares the array's memory
+        return numpy.frombuffer(result, dtype=result.typecode)
+    return result
+
+
+cdef object parse_typed_array(ParseInfo *pi):
+    """Parse the array whose '(' was just consumed as an array.array of
+    'q' (64-bit integers) or 'd' (doubles, when any of the items is a float),
+    or as the equivalent numpy.ndarray.
+
+    Return None, and rewind pi.curr, if the array is empty or anything but a
+    number is found in it: it must then be parsed as a list, which also
+    reports any syntax error.
+    """
+    cdef:
+        vector[int64_t] ints
+        vector[double] floats
+        bint is_float = False
+        int64_t value
+        Py_UCS4 ch
+        UnquotedType kind
+
+    start = pi.curr
+    while advance_to_non_space(pi):
+        ch = pi.curr[0]
+        if ch == c')' and (ints.size() or floats.size()):
+            # after a trailing ','
+            pi.curr += 1
+            return new_typed_array(pi, ints, floats, is_float)
+        mark = pi.curr
+        while pi.curr < pi.end and is_valid_unquoted_string_char(pi.curr[0]):
+            pi.curr += 1
+        if pi.curr == mark:
+            break
+        kind = get_unquoted_string_type(mark, pi.curr - mark)
+        if kind == UNQUOTED_INTEGER:
+            if not int64_from_chars(mark, pi.curr - mark, &value):
+                break
+            if not is_float:
+                ints.push_back(value)
+            elif -MAX_EXACT_DOUBLE_INT <= value <= MAX_EXACT_DOUBLE_INT:
+                floats.push_back(<double>value)
+            else:
+                break
+        elif kind == UNQUOTED_FLOAT:
+            if not is_float:
+                if not ints_to_doubles(ints, floats):
+                    break
+                is_float = True
+            floats.push_back(float_from_chars(mark, pi.curr - mark))
+        else:
+            break
+        if not advance_to_non_space(pi):
+            break
+        ch = pi.curr[0]
+        if ch == c')':
+            pi.curr += 1
+            return new_typed_array(pi, ints, floats, is_float)
+        elif ch != c',':
+            break
+        pi.curr += 1
+
+    pi.curr = start
+    return None
+
+
+cdef object parse_plist_array(ParseInfo *pi):
+    if pi.typed_arrays:
+        typed = parse_typed_array(pi)
+        if typed is not None:
+            return typed
     cdef list result = []
     cdef object tmp = parse_plist_object(pi, required=False)
     cdef bint found_char
@@ -385,8 +877,17 @@ cdef list parse_plist_array(ParseInfo *pi):
 
 
 cdef object parse_plist_dict_content(ParseInfo *pi):
-    cdef object dict_type = <object>pi.dict_type
-    result = dict_type()
+    cdef object result = None
+    cdef list pairs = None
+    cdef bint is_dict = False
+    if pi.hooks != NULL and (<ParseHooks>pi.hooks).object_pairs_hook is not None:
+        pairs = []
+    elif pi.dict_type == <void *>dict:
+        # fast path for the default dict_type
+        result = PyDict_New()
+        is_dict = True
+    else:
+        result = (<object>pi.dict_type)()
     cdef object value
     cdef bint found_char
     cdef object key = parse_plist_string(pi, required=False)
@@ -408,9 +909,14 @@ cdef object parse_plist_dict_content(ParseInfo *pi):
         else:
             raise ParseError(
                 "Unexpected character after key at line %d: %r"
-                % (line_number_strings(pi), pi.curr[0])
+                % (line_number_strings(pi), current_char(pi))
             )
-        result[key] = value
+        if pairs is not None:
+            pairs.append((key, value))
+        elif is_dict:
+            PyDict_SetItem(result, key, value)
+        else:
+            result[key] = value
         key = None
         value = None
         found_char = advance_to_non_space(pi)
@@ -420,6 +926,8 @@ cdef object parse_plist_dict_content(ParseInfo *pi):
         else:
             raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
 
+    if pairs is not None:
+        return (<ParseHooks>pi.hooks).object_pairs_hook(pairs)
     return result
 
 
@@ -434,25 +942,54 @@ cdef object parse_plist_dict(ParseInfo *pi):
     return result
 
 
-cdef inline unsigned char from_hex_digit(unsigned char ch):
-    if isdigit(ch):
-        return ch - c'0'
-    if ch >= c'a' and ch <= c'f':
-        return ch - c'a' + 10
-    elif ch >= c'A' and ch <= c'F':
-        return ch - c'A' + 10
+# The value of the ASCII hexadecimal digits, 0xFF for the other characters
+cdef unsigned char* HEX_DIGIT_VALUES = [
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0x0A, 0x0B, 0x0C, 0x0D, 0x0E, 0x0F, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0x0A, 0x0B, 0x0C, 0x0D, 0x0E, 0x0F, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+]
+
+
+cdef inline unsigned char from_hex_digit(Py_UCS4 ch) noexcept nogil:
+    if ch < 128:
+        return HEX_DIGIT_VALUES[ch]
     return 0xff  # Just choose a large number for the error code
 
 
-cdef int get_data_bytes(ParseInfo *pi, vector[unsigned char]& result) except -1:
+cdef bytes get_data_bytes(ParseInfo *pi):
+    # Decode the data up to the closing '>', or to the end of the input which
+    # the caller reports, straight into the returned bytes. These are sized
+    # for the digits that precede the next '>', and only shrunk afterwards if
+    # there were spaces between them.
     cdef unsigned char first, second
-    cdef int num_bytes_read = 0
     cdef Py_UCS4 ch1, ch2
+    cdef Py_ssize_t size = 0, capacity
+    cdef unsigned char *dest
+    cdef PyObject *resized
+    if ParseInfo is ParseInfoUCS1 or ParseInfo is ParseInfoUTF8:
+        p = <const uint8_t *>memchr(pi.curr, c'>', pi.end - pi.curr)
+        if p == NULL:
+            p = pi.end
+    else:
+        p = pi.curr
+        while p < pi.end and p[0] != c'>':
+            p += 1
+    capacity = (p - pi.curr) // 2
+    result = PyBytes_FromStringAndSize(NULL, capacity)
+    dest = <unsigned char *>PyBytes_AS_STRING(result)
     while pi.curr < pi.end:
         ch1 = pi.curr[0]
         if ch1 == c'>':
-            return 0
-        first = from_hex_digit(<unsigned char>ch1)
+            break
+        first = from_hex_digit(ch1)
         if first != 0xff:
             # if the first char is a hex, then try to read a second hex
             pi.curr += 1
@@ -467,13 +1004,14 @@ cdef int get_data_bytes(ParseInfo *pi, vector[unsigned char]& result) except -1:
                     "Malformed data byte group at line %d: uneven length"
                     % line_number_strings(pi)
                 )
-            second = from_hex_digit(<unsigned char>ch2)
+            second = from_hex_digit(ch2)
             if second == 0xff:
                 raise ParseError(
                     "Malformed data byte group at line %d: invalid hex digit: %r"
-                    % (line_number_strings(pi), ch2)
+                    % (line_number_strings(pi), current_char(pi))
             )
-            result.push_back((first << 4) + second)
+            dest[size] = (first << 4) + second
+            size += 1
             pi.curr += 1
         elif (
             ch1 == c' ' or
@@ -485,18 +1023,30 @@ cdef int get_data_bytes(ParseInfo *pi, vector[unsigned char]& result) except -1:
         ):
             pi.curr += 1
         else:
+            if ParseInfo is ParseInfoUTF8:
+                if is_utf8_line_separator(pi.curr, pi.end):
+                    pi.curr += 3
+                    continue
             raise ParseError(
                 "Malformed data byte group at line %d: invalid hex digit: %r"
-                % (line_number_strings(pi), ch1)
+                % (line_number_strings(pi), current_char(pi))
             )
+    if size < capacity:
+        # _PyBytes_Resize requires the only reference to the bytes
+        resized = <PyObject *>result
+        Py_INCREF(result)
+        result = None
+        _PyBytes_Resize(&resized, size)
+        result = <bytes>resized
+        Py_DECREF(result)
+    return result
 
 
 cdef bytes parse_plist_data(ParseInfo *pi):
-    cdef vector[unsigned char] data
-    get_data_bytes(pi, data)
-    if pi.curr[0] == c">":
+    data = get_data_bytes(pi)
+    if pi.curr < pi.end and pi.curr[0] == c">":
         pi.curr += 1  # move past '>'
-        return PyBytes_FromStringAndSize(<const char*>data.const_data(), data.size())
+        return data
     else:
         raise ParseError(
             "Expected terminating '>' for data at line %d"
@@ -509,13 +1059,18 @@ cdef object parse_plist_object(ParseInfo *pi, bint required=True):
     if not advance_to_non_space(pi):
         if required:
             raise ParseError("Unexpected EOF while parsing plist")
+        return None
     ch = pi.curr[0]
     pi.curr += 1
     if ch == c'{':
         return parse_plist_dict(pi)
     elif ch == c'(':
+        if pi.hooks != NULL and (<ParseHooks>pi.hooks).array_hook is not None:
+            return (<ParseHooks>pi.hooks).array_hook(parse_plist_array(pi))
         return parse_plist_array(pi)
     elif ch == c'<':
+        if pi.hooks != NULL and (<ParseHooks>pi.hooks).data_hook is not None:
+            return (<ParseHooks>pi.hooks).data_hook(parse_plist_data(pi))
         return parse_plist_data(pi)
     elif ch == c'\'' or ch == c'"':
         return parse_quoted_plist_string(pi, ch)
@@ -527,51 +1082,2235 @@ cdef object parse_plist_object(ParseInfo *pi, bint required=True):
         if required:
             raise ParseError(
                 "Unexpected character at line %d: %r"
-                % (line_number_strings(pi), ch)
+                % (line_number_strings(pi), current_char(pi))
             )
 
 
-def loads(string, dict_type=dict, bint use_numbers=False):
-    cdef unicode s = tounicode(string)
-    cdef Py_ssize_t length = PyUnicode_GET_LENGTH(s)
-    cdef const Py_UCS4 *begin
+cdef object parse_plist_document(ParseInfo *pi):
     cdef object result = None
-    cdef Py_UCS4* buf = PyUnicode_AsUCS4Copy(s)
-    if not buf:
-        raise MemoryError()
-
-    cdef ParseInfo pi = ParseInfo(
-        begin=buf,
-        curr=buf,
-        end=buf + length,
-        dict_type=<void *>dict_type,
-        use_numbers=use_numbers,
+    begin = pi.curr
+    if not advance_to_non_space(pi):
+        # a file consisting of only whitespace or empty is defined as an
+        # empty dictionary
+        return parse_plist_dict_content(pi)
+    result = parse_plist_object(pi, required=True)
+    if result:
+        if advance_to_non_space(pi):
+            if not isinstance(result, unicode):
+                raise ParseError(
+                    "Junk after plist at line %d" % line_number_strings(pi)
+                )
+            else:
+                # keep parsing for a 'strings resource' file: it looks like
+                # a dictionary without the opening/closing curly braces
+                pi.curr = begin
+                result = parse_plist_dict_content(pi)
+    return result
+
+
+cdef int skip_quoted_string(ParseInfo *pi, Py_UCS4 quote) except -1:
+    # pi.curr is just past the opening quote
+    start = pi.curr
+    while pi.curr < pi.end:
+        ch = pi.curr[0]
+        if ch == quote:
+            pi.curr += 1
+            return 0
+        elif ch == c'\\':
+            pi.curr += 1
+            if pi.curr >= pi.end:
+                break
+        pi.curr += 1
+    pi.curr = start
+    raise ParseError(
+        "Unterminated quoted string starting on line %d"
+        % line_number_strings(pi)
     )
 
-    try:
-        begin = pi.curr
-        if not advance_to_non_space(&pi):
-            # a file consisting of only whitespace or empty is defined as an
-            # empty dictionary
-            result = {}
-        else:
-            result = parse_plist_object(&pi, required=True)
-            if result:
-                if advance_to_non_space(&pi):
-                    if not isinstance(result, unicode):
-                        raise ParseError(
-                            "Junk after plist at line %d" % line_number_strings(&pi)
-                        )
-                    else:
-                        # keep parsing for a 'strings resource' file: it looks like
-                        # a dictionary without the opening/closing curly braces
-                        pi.curr = begin
-                        result = parse_plist_dict_content(&pi)
-    finally:
-        PyMem_Free(buf)
 
+cdef int skip_plist_object(ParseInfo *pi) except -1:
+    """Move pi.curr past the value that starts at the next non-space character,
+    without creating any objects.
+
+    Only the tokens and the nesting of the containers are followed, to find
+    where the value ends: the rest of its syntax is checked when the value is
+    eventually parsed.
+    """
+    cdef Py_ssize_t depth = 0
+    cdef Py_UCS4 ch
+    while True:
+        if not advance_to_non_space(pi):
+            raise ParseError("Unexpected EOF while parsing plist")
+        ch = pi.curr[0]
+        if ch == c'{' or ch == c'(':
+            depth += 1
+            pi.curr += 1
+        elif (ch == c'}' or ch == c')') and depth > 0:
+            depth -= 1
+            pi.curr += 1
+        elif ch == c'\'' or ch == c'"':
+            pi.curr += 1
+            skip_quoted_string(pi, ch)
+        elif ch == c'<':
+            while pi.curr < pi.end and pi.curr[0] != c'>':
+                pi.curr += 1
+            if pi.curr >= pi.end:
+                raise ParseError(
+                    "Expected terminating '>' for data at line %d"
+                    % line_number_strings(pi)
+                )
+            pi.curr += 1
+        elif is_valid_unquoted_string_char(ch):
+            pi.curr += 1
+            while pi.curr < pi.end and is_valid_unquoted_string_char(pi.curr[0]):
+                pi.curr += 1
+        elif depth > 0:
+            # a separator between the items of a container
+            pi.curr += 1
+        else:
+            raise ParseError(
+                "Unexpected character at line %d: %r"
+                % (line_number_strings(pi), current_char(pi))
+            )
+        if depth == 0:
+            return 0
+
+
+# The selective parser builds only the values matched by a selector, which is
+# compiled from the 'select' key paths by compile_selector: a dict mapping
+# each selected dict key (a str) or array index (an int, or None for all the
+# items) to the selector of the value found there, or to None if the whole
+# value is selected. The other values are skipped with skip_plist_object.
+
+cdef object NOT_SELECTED = object()
+
+
+cdef object merge_selectors(object a, object b):
+    # the selector for an array item matched by both its index and '[*]'
+    if a is None or b is None:
+        return None
+    cdef dict result = dict(a)
+    for key, value in (<dict>b).items():
+        result[key] = merge_selectors(result[key], value) if key in result else value
+    return result
+
+
+cdef object new_selected_dict(ParseInfo *pi, list pairs):
+    if pi.hooks != NULL and (<ParseHooks>pi.hooks).object_pairs_hook is not None:
+        return (<ParseHooks>pi.hooks).object_pairs_hook(pairs)
+    result = (<object>pi.dict_type)()
+    for key, value in pairs:
+        result[key] = value
+    return result
+
+
+cdef object select_plist_array(ParseInfo *pi, dict selector):
+    cdef list result = []
+    cdef Py_ssize_t index = 0
+    cdef object any_item = selector.get(None, NOT_SELECTED)
+    cdef bint has_indices = len(selector) > (any_item is not NOT_SELECTED)
+    cdef object item_selector, item
+    cdef Py_UCS4 ch
+    while advance_to_non_space(pi):
+        ch = pi.curr[0]
+        if not (
+            ch == c'{' or ch == c'(' or ch == c'<' or ch == c'\'' or ch == c'"'
+            or is_valid_unquoted_string_char(ch)
+        ):
+            break
+        item_selector = any_item
+        if has_indices:
+            item_selector = selector.get(index, NOT_SELECTED)
+            if item_selector is NOT_SELECTED:
+                item_selector = any_item
+            elif any_item is not NOT_SELECTED:
+                item_selector = merge_selectors(item_selector, any_item)
+        if item_selector is NOT_SELECTED:
+            skip_plist_object(pi)
+        elif item_selector is None:
+            result.append(parse_plist_object(pi, required=True))
+        else:
+            item = select_plist_object(pi, <dict>item_selector)
+            if item is not NOT_SELECTED:
+                result.append(item)
+        index += 1
+        if not advance_to_non_space(pi):
+            raise ParseError(
+                "Missing ',' for array at line %d" % line_number_strings(pi)
+            )
+        if pi.curr[0] != c',':
+            break
+        pi.curr += 1
+    if not advance_to_non_space(pi) or pi.curr[0] != c')':
+        raise ParseError(
+            "Expected terminating ')' for array at line %d" % line_number_strings(pi)
+        )
+    pi.curr += 1
+    if pi.hooks != NULL and (<ParseHooks>pi.hooks).array_hook is not None:
+        return (<ParseHooks>pi.hooks).array_hook(result)
     return result
 
 
-def load(fp, dict_type=dict, use_numbers=False):
-    return loads(fp.read(), dict_type=dict_type, use_numbers=use_numbers)
+cdef object select_plist_dict_content(ParseInfo *pi, dict selector):
+    cdef list pairs = []
+    cdef object value_selector, value
+    cdef object key = parse_plist_string(pi, required=False)
+
+    while key is not None:
+        if not advance_to_non_space(pi):
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+        value_selector = selector.get(key, NOT_SELECTED)
+        if pi.curr[0] == c';':
+            if value_selector is None:
+                pairs.append((key, key))
+        elif pi.curr[0] == c'=':
+            pi.curr += 1
+            if value_selector is NOT_SELECTED:
+                skip_plist_object(pi)
+            elif value_selector is None:
+                pairs.append((key, parse_plist_object(pi, required=True)))
+            else:
+                value = select_plist_object(pi, <dict>value_selector)
+                if value is not NOT_SELECTED:
+                    pairs.append((key, value))
+                elif pairs:
+                    # a duplicate key overrides the previous values
+                    pairs = [pair for pair in pairs if pair[0] != key]
+        else:
+            raise ParseError(
+                "Unexpected character after key at line %d: %r"
+                % (line_number_strings(pi), current_char(pi))
+            )
+        key = None
+        if advance_to_non_space(pi) and pi.curr[0] == c';':
+            pi.curr += 1
+            key = parse_plist_string(pi, required=False)
+        else:
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+
+    return new_selected_dict(pi, pairs)
+
+
+cdef object select_plist_object(ParseInfo *pi, dict selector):
+    """Parse the parts of the container that starts at the next non-space
+    character which are matched by the selector, and skip the rest.
+
+    Return NOT_SELECTED, after skipping it, if the value isn't a dict and the
+    selector has keys, or an array and the selector has indices.
+    """
+    if not advance_to_non_space(pi):
+        raise ParseError("Unexpected EOF while parsing plist")
+    cdef Py_UCS4 ch = pi.curr[0]
+    cdef bint has_keys = False, has_indices = False
+    for key in selector:
+        if isinstance(key, unicode):
+            has_keys = True
+        else:
+            has_indices = True
+    if ch == c'{' and has_keys:
+        pi.curr += 1
+        result = select_plist_dict_content(pi, selector)
+        if not advance_to_non_space(pi) or pi.curr[0] != c'}':
+            raise ParseError(
+                "Expected terminating '}' for dictionary at line %d"
+                % line_number_strings(pi)
+            )
+        pi.curr += 1
+        return result
+    elif ch == c'(' and has_indices:
+        pi.curr += 1
+        return select_plist_array(pi, selector)
+    skip_plist_object(pi)
+    return NOT_SELECTED
+
+
+cdef object select_plist_document(ParseInfo *pi, dict selector):
+    # like parse_plist_document; a top-level value that isn't a container
+    # selects nothing, and None is returned
+    begin = pi.curr
+    if not advance_to_non_space(pi):
+        return new_selected_dict(pi, [])
+    cdef Py_UCS4 ch = pi.curr[0]
+    result = select_plist_object(pi, selector)
+    if advance_to_non_space(pi):
+        if ch == c'{' or ch == c'(' or ch == c'<':
+            raise ParseError(
+                "Junk after plist at line %d" % line_number_strings(pi)
+            )
+        # a 'strings resource' file
+        pi.curr = begin
+        return select_plist_dict_content(pi, selector)
+    return None if result is NOT_SELECTED else result
+
+
+cdef object parse_document(ParseInfo *pi, dict selector):
+    if selector is not None:
+        return select_plist_document(pi, selector)
+    return parse_plist_document(pi)
+
+
+# The scanner below checks the syntax of a document like the parser does,
+# raising the same errors, but without creating any objects so that it can
+# run without the GIL: the functions return False on error, after recording
+# what the error is and where in the ScanInfo.
+
+cdef enum ScanError:
+    SCAN_OK
+    SCAN_EOF
+    SCAN_UNEXPECTED_CHAR
+    SCAN_UNTERMINATED_STRING
+    SCAN_INVALID_UTF8
+    SCAN_DATA_UNEVEN_LENGTH
+    SCAN_DATA_INVALID_HEX_DIGIT
+    SCAN_DATA_UNTERMINATED
+    SCAN_ARRAY_MISSING_COMMA
+    SCAN_ARRAY_UNTERMINATED
+    SCAN_DICT_MISSING_SEMICOLON
+    SCAN_DICT_UNEXPECTED_CHAR_AFTER_KEY
+    SCAN_DICT_UNTERMINATED
+    SCAN_JUNK
+
+
+ctypedef struct ScanInfo:
+    Py_ssize_t dicts
+    Py_ssize_t arrays
+    Py_ssize_t strings
+    Py_ssize_t data_bytes
+    Py_ssize_t depth
+    Py_ssize_t max_depth
+    bint empty  # whether the last value scanned would be falsy
+    ScanError error
+    Py_ssize_t error_offset
+
+
+cdef inline bint scan_fail(
+    ParseInfo *pi, ScanInfo *info, ScanError error
+) noexcept nogil:
+    info.error = error
+    info.error_offset = pi.curr - pi.begin
+    return False
+
+
+cdef bint scan_quoted_string(
+    ParseInfo *pi, ScanInfo *info, Py_UCS4 quote, bint is_key
+) noexcept nogil:
+    # Like parse_quoted_plist_string: the UTF-8 input is decoded in runs that
+    # end at each escape sequence and at the closing quote, where the invalid
+    # sequences are reported.
+    cdef bint escaped = False
+    cdef bint invalid = False
+    cdef Py_UCS4 ch
+    cdef Py_ssize_t n
+    start = pi.curr
+    while pi.curr < pi.end:
+        ch = pi.curr[0]
+        if ch == quote:
+            break
+        elif ch == c'\\':
+            if invalid:
+                return scan_fail(pi, info, SCAN_INVALID_UTF8)
+            escaped = True
+            pi.curr += 1
+            if ParseInfo is ParseInfoUTF8:
+                if pi.curr < pi.end and pi.curr[0] >= 0x80:
+                    continue
+            get_slashed_char(pi)
+        else:
+            if ParseInfo is ParseInfoUTF8:
+                if ch >= 0x80 and not invalid:
+                    n = decode_utf8_char(pi.curr, pi.end, &ch)
+                    if n:
+                        pi.curr += n
+                        continue
+                    invalid = True
+            pi.curr += 1
+    if pi.curr >= pi.end:
+        return scan_fail(pi, info, SCAN_UNTERMINATED_STRING)
+    if invalid:
+        if not escaped and not is_key:
+            pi.curr += 1
+        return scan_fail(pi, info, SCAN_INVALID_UTF8)
+    info.empty = pi.curr == start
+    info.strings += 1
+    pi.curr += 1
+    return True
+
+
+cdef inline void scan_unquoted_string(ParseInfo *pi, ScanInfo *info) noexcept nogil:
+    while pi.curr < pi.end and is_valid_unquoted_string_char(pi.curr[0]):
+        pi.curr += 1
+    info.empty = False
+    info.strings += 1
+
+
+cdef bint scan_plist_data(ParseInfo *pi, ScanInfo *info) noexcept nogil:
+    # like parse_plist_data, after the opening '<'
+    cdef unsigned char first, second
+    cdef Py_UCS4 ch1, ch2
+    cdef Py_ssize_t count = 0
+    while pi.curr < pi.end:
+        ch1 = pi.curr[0]
+        if ch1 == c'>':
+            pi.curr += 1
+            info.data_bytes += count
+            info.empty = count == 0
+            return True
+        first = from_hex_digit(ch1)
+        if first != 0xff:
+            pi.curr += 1
+            if pi.curr >= pi.end or pi.curr[0] == c'>':
+                return scan_fail(pi, info, SCAN_DATA_UNEVEN_LENGTH)
+            ch2 = pi.curr[0]
+            second = from_hex_digit(ch2)
+            if second == 0xff:
+                return scan_fail(pi, info, SCAN_DATA_INVALID_HEX_DIGIT)
+            count += 1
+            pi.curr += 1
+        elif (
+            ch1 == c' ' or
+            ch1 == c'\n' or
+            ch1 == c'\t' or
+            ch1 == c'\r' or
+            ch1 == 0x2028 or
+            ch1 == 0x2029
+        ):
+            pi.curr += 1
+        else:
+            if ParseInfo is ParseInfoUTF8:
+                if is_utf8_line_separator(pi.curr, pi.end):
+                    pi.curr += 3
+                    continue
+            return scan_fail(pi, info, SCAN_DATA_INVALID_HEX_DIGIT)
+    return scan_fail(pi, info, SCAN_DATA_UNTERMINATED)
+
+
+cdef int scan_plist_key(ParseInfo *pi, ScanInfo *info) noexcept nogil:
+    # like parse_plist_string(required=False): returns 1 if a key was found,
+    # 0 if there's none, -1 on error
+    cdef Py_UCS4 ch
+    if not advance_to_non_space(pi):
+        return 0
+    ch = pi.curr[0]
+    if ch == c'\'' or ch == c'"':
+        pi.curr += 1
+        return 1 if scan_quoted_string(pi, info, ch, True) else -1
+    elif is_valid_unquoted_string_char(ch):
+        scan_unquoted_string(pi, info)
+        return 1
+    return 0
+
+
+cdef bint scan_plist_dict_content(ParseInfo *pi, ScanInfo *info) noexcept nogil:
+    cdef Py_ssize_t count = 0
+    cdef int found = scan_plist_key(pi, info)
+    info.dicts += 1
+    while found == 1:
+        count += 1
+        if not advance_to_non_space(pi):
+            return scan_fail(pi, info, SCAN_DICT_MISSING_SEMICOLON)
+        if pi.curr[0] == c'=':
+            pi.curr += 1
+            if scan_plist_object(pi, info, True) < 0:
+                return False
+        elif pi.curr[0] != c';':
+            return scan_fail(pi, info, SCAN_DICT_UNEXPECTED_CHAR_AFTER_KEY)
+        if advance_to_non_space(pi) and pi.curr[0] == c';':
+            pi.curr += 1
+            found = scan_plist_key(pi, info)
+        else:
+            return scan_fail(pi, info, SCAN_DICT_MISSING_SEMICOLON)
+    if found < 0:
+        return False
+    info.empty = count == 0
+    return True
+
+
+cdef bint scan_plist_array(ParseInfo *pi, ScanInfo *info) noexcept nogil:
+    cdef Py_ssize_t count = 0
+    cdef int found = scan_plist_object(pi, info, False)
+    info.arrays += 1
+    while found == 1:
+        count += 1
+        if not advance_to_non_space(pi):
+            return scan_fail(pi, info, SCAN_ARRAY_MISSING_COMMA)
+        if pi.curr[0] != c',':
+            break
+        pi.curr += 1
+        found = scan_plist_object(pi, info, False)
+    if found < 0:
+        return False
+    if not advance_to_non_space(pi) or pi.curr[0] != c')':
+        return scan_fail(pi, info, SCAN_ARRAY_UNTERMINATED)
+    pi.curr += 1
+    info.empty = count == 0
+    return True
+
+
+cdef int scan_plist_object(
+    ParseInfo *pi, ScanInfo *info, bint required
+) noexcept nogil:
+    # like parse_plist_object: returns 1 if a value was found, 0 if there's
+    # none (and it's not required), -1 on error
+    cdef Py_UCS4 ch
+    cdef bint ok
+    if not advance_to_non_space(pi):
+        if required:
+            scan_fail(pi, info, SCAN_EOF)
+            return -1
+        return 0
+    ch = pi.curr[0]
+    if ch == c'{' or ch == c'(':
+        pi.curr += 1
+        info.depth += 1
+        if info.depth > info.max_depth:
+            info.max_depth = info.depth
+        if ch == c'(':
+            ok = scan_plist_array(pi, info)
+        elif scan_plist_dict_content(pi, info):
+            ok = advance_to_non_space(pi) and pi.curr[0] == c'}'
+            if ok:
+                pi.curr += 1
+            else:
+                scan_fail(pi, info, SCAN_DICT_UNTERMINATED)
+        else:
+            ok = False
+        info.depth -= 1
+    elif ch == c'<':
+        pi.curr += 1
+        ok = scan_plist_data(pi, info)
+    elif ch == c'\'' or ch == c'"':
+        pi.curr += 1
+        ok = scan_quoted_string(pi, info, ch, False)
+    elif is_valid_unquoted_string_char(ch):
+        scan_unquoted_string(pi, info)
+        ok = True
+    elif required:
+        ok = scan_fail(pi, info, SCAN_UNEXPECTED_CHAR)
+    else:
+        return 0
+    return 1 if ok else -1
+
+
+cdef bint scan_plist_document(ParseInfo *pi, ScanInfo *info) noexcept nogil:
+    # like parse_plist_document
+    begin = pi.curr
+    if not advance_to_non_space(pi):
+        info.dicts = info.max_depth = 1
+        return True
+    cdef Py_UCS4 ch = pi.curr[0]
+    if scan_plist_object(pi, info, True) < 0:
+        return False
+    if not info.empty and advance_to_non_space(pi):
+        if not (
+            ch == c'\'' or ch == c'"' or is_valid_unquoted_string_char(ch)
+        ):
+            return scan_fail(pi, info, SCAN_JUNK)
+        # a 'strings resource' file: start over
+        memset(info, 0, sizeof(ScanInfo))
+        info.depth = info.max_depth = 1
+        pi.curr = begin
+        return scan_plist_dict_content(pi, info)
+    return True
+
+
+cdef object scan_document(ParseInfo *pi):
+    cdef ScanInfo info
+    cdef bint ok
+    memset(&info, 0, sizeof(ScanInfo))
+    with nogil:
+        ok = scan_plist_document(pi, &info)
+    if ok:
+        return ScanResult(
+            info.dicts, info.arrays, info.strings, info.data_bytes, info.max_depth
+        )
+    pi.curr = pi.begin + info.error_offset
+    cdef uint32_t line = line_number_strings(pi)
+    if info.error == SCAN_EOF:
+        msg = "Unexpected EOF while parsing plist"
+    elif info.error == SCAN_UNEXPECTED_CHAR:
+        msg = "Unexpected character at line %d: %r" % (line, current_char(pi))
+    elif info.error == SCAN_UNTERMINATED_STRING:
+        msg = "Unterminated quoted string starting on line %d" % line
+    elif info.error == SCAN_INVALID_UTF8:
+        msg = "Invalid UTF-8 byte sequence in string at line %d" % line
+    elif info.error == SCAN_DATA_UNEVEN_LENGTH:
+        msg = "Malformed data byte group at line %d: uneven length" % line
+    elif info.error == SCAN_DATA_INVALID_HEX_DIGIT:
+        msg = "Malformed data byte group at line %d: invalid hex digit: %r" % (
+            line, current_char(pi)
+        )
+    elif info.error == SCAN_DATA_UNTERMINATED:
+        msg = "Expected terminating '>' for data at line %d" % line
+    elif info.error == SCAN_ARRAY_MISSING_COMMA:
+        msg = "Missing ',' for array at line %d" % line
+    elif info.error == SCAN_ARRAY_UNTERMINATED:
+        msg = "Expected terminating ')' for array at line %d" % line
+    elif info.error == SCAN_DICT_MISSING_SEMICOLON:
+        msg = "Missing ';' on line %d" % line
+    elif info.error == SCAN_DICT_UNEXPECTED_CHAR_AFTER_KEY:
+        msg = "Unexpected character after key at line %d: %r" % (
+            line, current_char(pi)
+        )
+    elif info.error == SCAN_DICT_UNTERMINATED:
+        msg = "Expected terminating '}' for dictionary at line %d" % line
+    else:
+        msg = "Junk after plist at line %d" % line
+    raise ParseError(msg)
+
+
+cdef bint is_utf8_encoding(encoding) except -1:
+    name = codecs.lookup(encoding).name
+    if name == "utf-8":
+        return True
+    elif name == "iso8859-1":
+        return False
+    raise ValueError(
+        f"Unsupported encoding: {encoding!r}; expected 'utf-8' or 'latin-1'"
+    )
+
+
+cdef object loads_unicode(
+    unicode s,
+    dict_type,
+    bint use_numbers,
+    TypedArrays typed_arrays,
+    StringTable strings,
+    ParseHooks hooks,
+    dict selector,
+):
+    # parse the string's own storage directly, according to its PEP 393 kind
+    cdef Py_ssize_t length = PyUnicode_GET_LENGTH(s)
+    cdef int kind = PyUnicode_KIND(s)
+    cdef const void *data = PyUnicode_DATA(s)
+    cdef ParseInfoUCS1 pi1
+    cdef ParseInfoUCS2 pi2
+    cdef ParseInfoUCS4 pi4
+    cdef void *hooks_ptr = NULL if hooks is None else <void *>hooks
+
+    if kind == PyUnicode_1BYTE_KIND:
+        pi1 = ParseInfoUCS1(
+            begin=<const uint8_t *>data,
+            curr=<const uint8_t *>data,
+            end=<const uint8_t *>data + length,
+            dict_type=<void *>dict_type,
+            strings=<void *>strings,
+            hooks=hooks_ptr,
+            use_numbers=use_numbers,
+            typed_arrays=typed_arrays,
+            line_offset=0,
+        )
+        return parse_document(&pi1, selector)
+    elif kind == PyUnicode_2BYTE_KIND:
+        pi2 = ParseInfoUCS2(
+            begin=<const uint16_t *>data,
+            curr=<const uint16_t *>data,
+            end=<const uint16_t *>data + length,
+            dict_type=<void *>dict_type,
+            strings=<void *>strings,
+            hooks=hooks_ptr,
+            use_numbers=use_numbers,
+            typed_arrays=typed_arrays,
+            line_offset=0,
+        )
+        return parse_document(&pi2, selector)
+    else:
+        pi4 = ParseInfoUCS4(
+            begin=<const Py_UCS4 *>data,
+            curr=<const Py_UCS4 *>data,
+            end=<const Py_UCS4 *>data + length,
+            dict_type=<void *>dict_type,
+            strings=<void *>strings,
+            hooks=hooks_ptr,
+            use_numbers=use_numbers,
+            typed_arrays=typed_arrays,
+            line_offset=0,
+        )
+        return parse_document(&pi4, selector)
+
+
+cdef object loads_buffer(
+    object obj,
+    dict_type,
+    bint use_numbers,
+    TypedArrays typed_arrays,
+    bint utf8,
+    StringTable strings,
+    ParseHooks hooks,
+    dict selector,
+):
+    cdef Py_buffer view
+    cdef const uint8_t *buf
+    cdef ParseInfoUCS1 pi1
+    cdef ParseInfoUTF8 pi8
+    cdef void *hooks_ptr = NULL if hooks is None else <void *>hooks
+
+    PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE)
+    try:
+        buf = <const uint8_t *>view.buf
+        if utf8:
+            # skip the UTF-8 byte order mark, if any
+            if (
+                view.len >= 3
+                and buf[0] == 0xEF and buf[1] == 0xBB and buf[2] == 0xBF
+            ):
+                buf += 3
+            pi8 = ParseInfoUTF8(
+                begin=buf,
+                curr=buf,
+                end=<const uint8_t *>view.buf + view.len,
+                dict_type=<void *>dict_type,
+                strings=<void *>strings,
+                hooks=hooks_ptr,
+                use_numbers=use_numbers,
+                typed_arrays=typed_arrays,
+                line_offset=0,
+            )
+            return parse_document(&pi8, selector)
+        else:
+            pi1 = ParseInfoUCS1(
+                begin=buf,
+                curr=buf,
+                end=buf + view.len,
+                dict_type=<void *>dict_type,
+                strings=<void *>strings,
+                hooks=hooks_ptr,
+                use_numbers=use_numbers,
+                typed_arrays=typed_arrays,
+                line_offset=0,
+            )
+            return parse_document(&pi1, selector)
+    finally:
+        PyBuffer_Release(&view)
+
+
+cdef object scan_lazy_dict_content(ParseInfo *pi, list key_offsets=None):
+    # like parse_plist_dict_content, but only records where each value starts
+    # (-1 for the 'key;' shortcut, whose value is the key itself), and
+    # optionally where each key starts
+    cdef dict offsets = {}
+    cdef Py_ssize_t offset
+    if key_offsets is not None and advance_to_non_space(pi):
+        key_offsets.append(pi.curr - pi.begin)
+    cdef object key = parse_plist_string(pi, required=False)
+
+    while key is not None:
+        if not advance_to_non_space(pi):
+            raise ParseError(
+                "Missing ';' on line %d" % line_number_strings(pi)
+            )
+        if pi.curr[0] == c';':
+            offset = -1
+        elif pi.curr[0] == c'=':
+            pi.curr += 1
+            if not advance_to_non_space(pi):
+                raise ParseError("Unexpected EOF while parsing plist")
+            offset = pi.curr - pi.begin
+            skip_plist_object(pi)
+        else:
+            raise ParseError(
+                "Unexpected character after key at line %d: %r"
+                % (line_number_strings(pi), current_char(pi))
+            )
+        offsets[key] = offset
+        key = None
+        if advance_to_non_space(pi) and pi.curr[0] == c';':
+            pi.curr += 1
+            if key_offsets is not None and advance_to_non_space(pi):
+                key_offsets.append(pi.curr - pi.begin)
+            key = parse_plist_string(pi, required=False)
+        else:
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+
+    if key_offsets:
+        # what follows the last entry is not a key
+        key_offsets.pop()
+    if not advance_to_non_space(pi) or pi.curr[0] != c'}':
+        raise ParseError(
+            "Expected terminating '}' for dictionary at line %d"
+            % line_number_strings(pi)
+        )
+    pi.curr += 1
+    return offsets
+
+
+cdef list scan_lazy_array(ParseInfo *pi):
+    # like parse_plist_array, but only records where each element starts
+    cdef list offsets = []
+    cdef Py_UCS4 ch
+    while advance_to_non_space(pi):
+        ch = pi.curr[0]
+        if not (
+            ch == c'{' or ch == c'(' or ch == c'<' or ch == c'\'' or ch == c'"'
+            or is_valid_unquoted_string_char(ch)
+        ):
+            break
+        offsets.append(pi.curr - pi.begin)
+        skip_plist_object(pi)
+        if not advance_to_non_space(pi):
+            raise ParseError(
+                "Missing ',' for array at line %d" % line_number_strings(pi)
+            )
+        if pi.curr[0] != c',':
+            break
+        pi.curr += 1
+    if not advance_to_non_space(pi) or pi.curr[0] != c')':
+        raise ParseError(
+            "Expected terminating ')' for array at line %d" % line_number_strings(pi)
+        )
+    pi.curr += 1
+    return offsets
+
+
+cdef object scan_lazy_document(ParseInfo *pi, LazySource source):
+    if not advance_to_non_space(pi):
+        return {}
+    if pi.curr[0] == c'{':
+        pi.curr += 1
+        result = LazyDict(source, scan_lazy_dict_content(pi))
+    elif pi.curr[0] == c'(':
+        pi.curr += 1
+        result = LazyList(source, scan_lazy_array(pi))
+    else:
+        # strings and data have no children to defer
+        return parse_plist_document(pi)
+    if result and advance_to_non_space(pi):
+        raise ParseError("Junk after plist at line %d" % line_number_strings(pi))
+    return result
+
+
+cdef tuple scan_container_items(ParseInfo *pi, bint document):
+    # Find where the items of the container at pi.curr start: the elements of
+    # an array, or the keys of a dict (whose values offsets are also returned).
+    # Returns None if there's no container there, or if it's a document with
+    # something after the container.
+    cdef list starts = []
+    cdef dict values = None
+    if not advance_to_non_space(pi):
+        return None
+    if pi.curr[0] == c'{':
+        pi.curr += 1
+        values = scan_lazy_dict_content(pi, starts)
+    elif pi.curr[0] == c'(':
+        pi.curr += 1
+        starts = scan_lazy_array(pi)
+    else:
+        return None
+    cdef Py_ssize_t end = pi.curr - pi.begin
+    if document and advance_to_non_space(pi):
+        return None
+    return values is None, starts, values, end
+
+
+cdef list parse_array_items(ParseInfo *pi):
+    # parse array elements up to pi.end, where the last ',' is optional
+    cdef list result = []
+    while advance_to_non_space(pi):
+        result.append(parse_plist_object(pi, required=True))
+        if not advance_to_non_space(pi):
+            break
+        if pi.curr[0] != c',':
+            raise ParseError(
+                "Missing ',' for array at line %d" % line_number_strings(pi)
+            )
+        pi.curr += 1
+    return result
+
+
+cdef object parse_dict_items(ParseInfo *pi):
+    # parse dict entries up to pi.end
+    result = parse_plist_dict_content(pi)
+    if advance_to_non_space(pi):
+        raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+    return result
+
+
+cdef enum ParseTask:
+    PARSE_DOCUMENT
+    PARSE_LAZY_DOCUMENT
+    PARSE_VALUE
+    PARSE_TYPED_ARRAY
+    PARSE_ARRAY_ITEMS
+    PARSE_DICT_ITEMS
+    SCAN_DOCUMENT_ITEMS
+    SCAN_CONTAINER_ITEMS
+    SCAN_DOCUMENT
+
+
+cdef object run_parse_task(ParseInfo *pi, LazySource source, ParseTask task):
+    if task == PARSE_DOCUMENT:
+        return parse_plist_document(pi)
+    elif task == PARSE_LAZY_DOCUMENT:
+        return scan_lazy_document(pi, source)
+    elif task == PARSE_VALUE:
+        return parse_plist_object(pi, required=True)
+    elif task == PARSE_TYPED_ARRAY:
+        return parse_typed_array(pi)
+    elif task == PARSE_ARRAY_ITEMS:
+        return parse_array_items(pi)
+    elif task == PARSE_DICT_ITEMS:
+        return parse_dict_items(pi)
+    elif task == SCAN_DOCUMENT_ITEMS:
+        return scan_container_items(pi, document=True)
+    elif task == SCAN_CONTAINER_ITEMS:
+        return scan_container_items(pi, document=False)
+    else:
+        return scan_document(pi)
+
+
+cdef enum SourceKind:
+    SOURCE_UCS1
+    SOURCE_UTF8
+    SOURCE_UCS2
+    SOURCE_UCS4
+
+
+@cython.final
+cdef class LazySource:
+    """Keeps the text of a document alive (a str, or the buffer of a
+    bytes-like object), so that parts of it can be parsed at given offsets,
+    on demand (for the lazy documents) or from several threads.
+    """
+
+    cdef object string
+    cdef Py_buffer view
+    cdef bint has_view
+    cdef SourceKind kind
+    cdef const void *data
+    cdef Py_ssize_t length
+    cdef object dict_type
+    cdef bint use_numbers
+    cdef TypedArrays typed_arrays
+    cdef StringTable strings
+
+    def __cinit__(
+        self,
+        string,
+        dict_type,
+        bint use_numbers,
+        TypedArrays typed_arrays,
+        encoding,
+        StringTable strings,
+    ):
+        cdef int kind
+        cdef const uint8_t *buf
+        if isinstance(string, unicode):
+            self.string = string
+            kind = PyUnicode_KIND(string)
+            if kind == PyUnicode_1BYTE_KIND:
+                self.kind = SOURCE_UCS1
+            elif kind == PyUnicode_2BYTE_KIND:
+                self.kind = SOURCE_UCS2
+            else:
+                self.kind = SOURCE_UCS4
+            self.data = PyUnicode_DATA(string)
+            self.length = PyUnicode_GET_LENGTH(string)
+        elif PyObject_CheckBuffer(string):
+            self.kind = SOURCE_UTF8 if is_utf8_encoding(encoding) else SOURCE_UCS1
+            # holding on to the buffer also stops e.g. a bytearray from being
+            # resized while the document still refers to it
+            PyObject_GetBuffer(string, &self.view, PyBUF_SIMPLE)
+            self.has_view = True
+            buf = <const uint8_t *>self.view.buf
+            self.length = self.view.len
+            if (
+                self.kind == SOURCE_UTF8
+                and self.length >= 3
+                and buf[0] == 0xEF and buf[1] == 0xBB and buf[2] == 0xBF
+            ):
+                buf += 3
+                self.length -= 3
+            self.data = buf
+        else:
+            raise TypeError(
+                f"Expected str or bytes-like object, got {type(string).__name__}"
+            )
+        self.dict_type = dict_type
+        self.use_numbers = use_numbers
+        self.typed_arrays = typed_arrays
+        self.strings = strings
+
+    def __dealloc__(self):
+        if self.has_view:
+            PyBuffer_Release(&self.view)
+
+    cdef object run(
+        self,
+        ParseTask task,
+        Py_ssize_t start,
+        Py_ssize_t end,
+        StringTable strings,
+    ):
+        # Run the task on the text from 'start' up to 'end'. The parser always
+        # begins at the start of the document to get the line numbers right.
+        cdef ParseInfoUCS1 pi1
+        cdef ParseInfoUTF8 pi8
+        cdef ParseInfoUCS2 pi2
+        cdef ParseInfoUCS4 pi4
+        if self.kind == SOURCE_UTF8:
+            pi8 = ParseInfoUTF8(
+                begin=<const uint8_t *>self.data,
+                curr=<const uint8_t *>self.data + start,
+                end=<const uint8_t *>self.data + end,
+                dict_type=<void *>self.dict_type,
+                strings=<void *>strings,
+                hooks=NULL,
+                use_numbers=self.use_numbers,
+                typed_arrays=self.typed_arrays,
+                line_offset=0,
+            )
+            return run_parse_task(&pi8, self, task)
+        elif self.kind == SOURCE_UCS1:
+            pi1 = ParseInfoUCS1(
+                begin=<const uint8_t *>self.data,
+                curr=<const uint8_t *>self.data + start,
+                end=<const uint8_t *>self.data + end,
+                dict_type=<void *>self.dict_type,
+                strings=<void *>strings,
+                hooks=NULL,
+                use_numbers=self.use_numbers,
+                typed_arrays=self.typed_arrays,
+                line_offset=0,
+            )
+            return run_parse_task(&pi1, self, task)
+        elif self.kind == SOURCE_UCS2:
+            pi2 = ParseInfoUCS2(
+                begin=<const uint16_t *>self.data,
+                curr=<const uint16_t *>self.data + start,
+                end=<const uint16_t *>self.data + end,
+                dict_type=<void *>self.dict_type,
+                strings=<void *>strings,
+                hooks=NULL,
+                use_numbers=self.use_numbers,
+                typed_arrays=self.typed_arrays,
+                line_offset=0,
+            )
+            return run_parse_task(&pi2, self, task)
+        else:
+            pi4 = ParseInfoUCS4(
+                begin=<const Py_UCS4 *>self.data,
+                curr=<const Py_UCS4 *>self.data + start,
+                end=<const Py_UCS4 *>self.data + end,
+                dict_type=<void *>self.dict_type,
+                strings=<void *>strings,
+                hooks=NULL,
+                use_numbers=self.use_numbers,
+                typed_arrays=self.typed_arrays,
+                line_offset=0,
+            )
+            return run_parse_task(&pi4, self, task)
+
+    cdef inline object parse(self, ParseTask task, Py_ssize_t offset=0):
+        return self.run(task, offset, self.length, self.strings)
+
+    def parse_items(self, bint is_array, Py_ssize_t start, Py_ssize_t end):
+        # Called from the worker threads: the StringTable's cache can't be
+        # shared between them, but its table can.
+        return self.run(
+            PARSE_ARRAY_ITEMS if is_array else PARSE_DICT_ITEMS,
+            start,
+            end,
+            StringTable(self.strings.table),
+        )
+
+
+class LazyDict(Mapping):
+    """A read-only mapping returned by loads(..., lazy=True) for a top-level
+    dictionary.
+
+    The keys are known upfront, but each value is only parsed the first time
+    it is accessed, then cached.
+    """
+
+    __slots__ = ("_source", "_offsets", "_values")
+
+    def __init__(self, LazySource source, dict offsets):
+        self._source = source
+        self._offsets = offsets
+        self._values = {}
+
+    def __getitem__(self, key):
+        cdef dict values = self._values
+        try:
+            return values[key]
+        except KeyError:
+            pass
+        cdef Py_ssize_t offset = self._offsets[key]
+        if offset < 0:
+            value = key
+        else:
+            value = (<LazySource>self._source).parse(PARSE_VALUE, offset)
+        values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, key):
+        return key in self._offsets
+
+    def __repr__(self):
+        return f"<{type(self).__name__} with {len(self)} keys>"
+
+
+class LazyList(Sequence):
+    """A read-only sequence returned by loads(..., lazy=True) for a top-level
+    array.
+
+    Each element is only parsed the first time it is accessed, then cached.
+    """
+
+    __slots__ = ("_source", "_offsets", "_values")
+
+    def __init__(self, LazySource source, list offsets):
+        self._source = source
+        self._offsets = offsets
+        self._values = [None] * len(offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._offsets)))]
+        cdef list values = self._values
+        cdef Py_ssize_t n = len(values)
+        cdef Py_ssize_t i = index
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError("list index out of range")
+        value = values[i]
+        if value is None:
+            value = (<LazySource>self._source).parse(
+                PARSE_VALUE, self._offsets[i]
+            )
+            values[i] = value
+        return value
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyList):
+            other = list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} with {len(self)} items>"
+
+
+cdef object parse_items_in_parallel(
+    LazySource source,
+    bint is_array,
+    list starts,
+    Py_ssize_t stop,
+    Py_ssize_t workers,
+):
+    # Split the container's items in contiguous chunks, a few per worker to
+    # even out their load, and concatenate the parsed chunks in order
+    cdef Py_ssize_t n = len(starts)
+    cdef Py_ssize_t num_chunks = min(n, workers * 4)
+    cdef list bounds = [starts[n * i // num_chunks] for i in range(num_chunks)]
+    bounds.append(stop)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(source.parse_items, is_array, start, end)
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        chunks = [future.result() for future in futures]
+    if is_array:
+        result = []
+        for chunk in chunks:
+            result.extend(chunk)
+    else:
+        result = source.dict_type()
+        for chunk in chunks:
+            for key, value in chunk.items():
+                result[key] = value
+    return result
+
+
+cdef object validate_after_scan_error(LazySource source):
+    # The scan only follows the tokens, so its errors may not be the first
+    # ones the parser would find, nor worded the same: the document is
+    # validated instead, which raises the same errors as parsing it, without
+    # building any objects. (It's only parsed if it turns out to be valid.)
+    source.parse(SCAN_DOCUMENT)
+    return source.parse(PARSE_DOCUMENT)
+
+
+cdef object loads_parallel(LazySource source, Py_ssize_t workers):
+    # The document is scanned first to find where the items of its biggest
+    # container start. The errors raised while parsing the items come from
+    # the parser itself, with their line numbers, and are raised as they are:
+    # the parts of the document are parsed in order, so the first error is
+    # the same as without workers.
+    cdef tuple scanned
+    try:
+        scanned = source.parse(SCAN_DOCUMENT_ITEMS)
+    except ParseError:
+        return validate_after_scan_error(source)
+    if scanned is None:
+        return source.parse(PARSE_DOCUMENT)
+    return parse_scanned_in_parallel(source, scanned, workers)
+
+
+cdef object parse_container_in_parallel(
+    LazySource source,
+    bint is_array,
+    list starts,
+    Py_ssize_t end,
+    Py_ssize_t workers,
+):
+    if is_array and source.typed_arrays and starts:
+        # an array of numbers is quick to parse in one go
+        container = source.parse(PARSE_TYPED_ARRAY, starts[0])
+        if container is not None:
+            return container
+    # 'end' is past the closing bracket
+    return parse_items_in_parallel(source, is_array, starts, end - 1, workers)
+
+
+cdef object parse_scanned_in_parallel(
+    LazySource source, tuple scanned, Py_ssize_t workers
+):
+    # Parse the items of either the top-level container itself, or of the
+    # top-level dict's value that makes up most of the document (like the
+    # 'glyphs' of a .glyphs file).
+    cdef Py_ssize_t offset, span, best_span = 0
+    is_array, starts, values, end = scanned
+    target = None
+    if not is_array and len(values) < len(starts):
+        # a key is repeated: only the offset of its last value was kept, and
+        # the values before it must still be parsed, in order
+        return source.parse(PARSE_DOCUMENT)
+    if not is_array:
+        for key, offset in values.items():
+            if offset < 0:
+                continue
+            # the value ends before the next key (or the closing '}')
+            i = bisect_right(starts, offset)
+            span = (starts[i] if i < len(starts) else end) - offset
+            if span > best_span:
+                target, best_span = key, span
+        if target is not None and best_span * 2 > source.length:
+            try:
+                scanned = source.parse(SCAN_CONTAINER_ITEMS, values[target])
+            except ParseError:
+                return validate_after_scan_error(source)
+            if scanned is None:
+                target = None
+            else:
+                target_is_array, target_starts, _, target_end = scanned
+        else:
+            target = None
+
+    if target is None:
+        return parse_container_in_parallel(source, is_array, starts, end, workers)
+    result = source.dict_type()
+    for key, offset in values.items():
+        if key == target:
+            result[key] = parse_container_in_parallel(
+                source, target_is_array, target_starts, target_end, workers
+            )
+        elif offset < 0:
+            result[key] = key
+        else:
+            result[key] = source.parse(PARSE_VALUE, offset)
+    return result
+
+
+cdef TypedArrays get_typed_arrays(typed_arrays, bint use_numbers) except *:
+    if typed_arrays is False:
+        return TYPED_ARRAYS_NONE
+    if not use_numbers:
+        raise ValueError("typed_arrays requires use_numbers=True")
+    if typed_arrays is True:
+        return TYPED_ARRAYS_ARRAY
+    elif typed_arrays == "numpy":
+        import numpy
+
+        return TYPED_ARRAYS_NUMPY
+    raise ValueError(
+        f"Unsupported typed_arrays: {typed_arrays!r}; expected a bool or 'numpy'"
+    )
+
+
+SELECT_TOKEN = re.compile(
+    r'(?:^|\.)([^.\[\]]+)|\[(\*|\d+)\]|\["((?:[^"\\]|\\.)*)"\]', re.DOTALL
+)
+SELECT_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+
+
+cdef dict compile_selector(paths):
+    # see the description of the selectors above NOT_SELECTED
+    if isinstance(paths, unicode):
+        paths = [paths]
+    cdef dict selector = {}
+    cdef dict node
+    cdef Py_ssize_t pos
+    for path in paths:
+        segments = []
+        pos = 0
+        while pos < len(path):
+            m = SELECT_TOKEN.match(path, pos)
+            if m is None:
+                raise ValueError(f"Invalid select path: {path!r}")
+            if m.group(1) is not None:
+                segments.append(m.group(1))
+            elif m.group(3) is not None:
+                segments.append(SELECT_ESCAPE.sub(r"\1", m.group(3)))
+            else:
+                segments.append(None if m.group(2) == "*" else int(m.group(2)))
+            pos = m.end()
+        if not segments:
+            raise ValueError(f"Invalid select path: {path!r}")
+        node = selector
+        for i, segment in enumerate(segments):
+            if segment in node and node[segment] is None:
+                # the whole value is already selected
+                break
+            if i == len(segments) - 1:
+                node[segment] = None
+            else:
+                node = node.setdefault(segment, {})
+    return selector
+
+
+def loads(
+    string,
+    dict_type=dict,
+    bint use_numbers=False,
+    encoding="utf-8",
+    bint lazy=False,
+    dict string_table=None,
+    Py_ssize_t workers=1,
+    typed_arrays=False,
+    object_pairs_hook=None,
+    array_hook=None,
+    data_hook=None,
+    select=None,
+):
+    """Parse an OpenStep plist from a str, or from a bytes-like object (bytes,
+    bytearray, memoryview or anything supporting the buffer protocol).
+
+    Bytes-like input is parsed in place without being decoded to str first;
+    the 'encoding' can be either "utf-8" (the default, which also covers plain
+    ASCII) or "latin-1". It is ignored when the input is already a str.
+
+    With lazy=True, a top-level dictionary or array is returned as a read-only
+    LazyDict or LazyList: the document is only scanned to find where its
+    top-level values start, and each of them is parsed the first time it is
+    accessed. The returned object keeps a reference to the input.
+
+    The dict keys and the unquoted strings are interned, so that equal strings
+    share a single str object. A 'string_table' dict can be passed to share
+    the interned strings with other calls: it's updated in place, mapping each
+    string to itself.
+
+    With workers > 1, the items of the document's biggest container (e.g. the
+    'glyphs' array of a .glyphs file) are parsed in chunks by that many
+    threads, on free-threaded Python builds. When the GIL is enabled, the
+    threads couldn't run in parallel, so the document is parsed in one go and
+    a RuntimeWarning is issued. (Worker processes wouldn't help either: the
+    objects they'd send back take longer to unpickle than to parse.)
+
+    With use_numbers=True, typed_arrays=True returns the non-empty arrays that
+    only contain numbers as array.array objects, of type 'q' (64-bit signed
+    integers) or 'd' (doubles, if any of the numbers is a float), instead of
+    lists; typed_arrays="numpy" returns them as numpy.ndarray objects. Arrays
+    with integers that don't fit in those types are still returned as lists.
+
+    The 'object_pairs_hook', 'array_hook' and 'data_hook' callbacks, when not
+    None, build the values in place of the dict_type, list and bytes: each is
+    called once per dict, array or <hex> data with all of its items (the list
+    of (key, value) pairs in document order, the list of values, or the
+    bytes), and its return value is used instead. With typed_arrays, the
+    array_hook is passed the typed array (an array.array or a numpy.ndarray)
+    in place of the list, for the arrays that only contain numbers. The hooks
+    can't be used with lazy=True or workers > 1.
+
+    With 'select', a list of key paths like "fontMaster" or
+    "glyphs[*].glyphname", only the values found at those paths are built.
+    A path is made of dict keys separated by '.', and of array indices in
+    brackets, '[*]' standing for all the items. A key containing '.' or
+    brackets is written double-quoted in brackets instead, like
+    'userData["com.example.foo"]', with '\\' escaping a '"' or a '\\'.
+    The result keeps the shape of the document, with only the selected keys
+    in the dicts and the selected items in the arrays: the values that the
+    paths don't lead to are skipped without creating any objects, and only
+    their nesting is checked. It can't be used with lazy=True or workers > 1.
+    """
+    cdef StringTable strings = StringTable(string_table)
+    cdef TypedArrays typed = get_typed_arrays(typed_arrays, use_numbers)
+    cdef ParseHooks hooks = None
+    cdef dict selector = None
+    if workers < 1:
+        raise ValueError("workers must be positive")
+    if (
+        object_pairs_hook is not None
+        or array_hook is not None
+        or data_hook is not None
+    ):
+        if lazy or workers > 1:
+            raise ValueError("hooks can't be used with lazy or workers")
+        hooks = ParseHooks(object_pairs_hook, array_hook, data_hook)
+    if select is not None:
+        if lazy or workers > 1:
+            raise ValueError("select can't be used with lazy or workers")
+        selector = compile_selector(select)
+    if lazy:
+        if workers > 1:
+            raise ValueError("lazy and workers can't be used together")
+        return LazySource(
+            string, dict_type, use_numbers, typed, encoding, strings
+        ).parse(PARSE_LAZY_DOCUMENT)
+    if workers > 1:
+        if not getattr(sys, "_is_gil_enabled", lambda: True)():
+            return loads_parallel(
+                LazySource(
+                    string, dict_type, use_numbers, typed, encoding, strings
+                ),
+                workers,
+            )
+        warnings.warn(
+            "workers > 1 has no effect when the GIL is enabled: the document "
+            "is parsed by a single thread",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+    if isinstance(string, unicode):
+        return loads_unicode(
+            tounicode(string),
+            dict_type,
+            use_numbers,
+            typed,
+            strings,
+            hooks,
+            selector,
+        )
+    elif PyObject_CheckBuffer(string):
+        return loads_buffer(
+            string,
+            dict_type,
+            use_numbers,
+            typed,
+            is_utf8_encoding(encoding),
+            strings,
+            hooks,
+            selector,
+        )
+    raise TypeError(
+        f"Expected str or bytes-like object, got {type(string).__name__}"
+    )
+
+
+def load(
+    fp,
+    dict_type=dict,
+    use_numbers=False,
+    encoding="utf-8",
+    lazy=False,
+    string_table=None,
+    workers=1,
+    typed_arrays=False,
+    object_pairs_hook=None,
+    array_hook=None,
+    data_hook=None,
+    select=None,
+):
+    return loads(
+        fp.read(),
+        dict_type=dict_type,
+        use_numbers=use_numbers,
+        encoding=encoding,
+        lazy=lazy,
+        string_table=string_table,
+        workers=workers,
+        typed_arrays=typed_arrays,
+        object_pairs_hook=object_pairs_hook,
+        array_hook=array_hook,
+        data_hook=data_hook,
+        select=select,
+    )
+
+
+def load_path(
+    path,
+    dict_type=dict,
+    use_numbers=False,
+    encoding="utf-8",
+    lazy=False,
+    string_table=None,
+    workers=1,
+    typed_arrays=False,
+    object_pairs_hook=None,
+    array_hook=None,
+    data_hook=None,
+    select=None,
+):
+    """Parse the OpenStep plist file at the given path.
+
+    The file is memory-mapped read-only and parsed straight from the mapping,
+    so its content is never copied into a Python object: the OS pages it in
+    as the parser goes, and can drop the pages again afterwards.
+
+    With lazy=True, the mapping stays open for as long as the returned
+    LazyDict or LazyList is alive.
+    """
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            # empty files can't be mapped (and neither can pipes or other
+            # special files that report a zero size): read them instead
+            return loads(
+                fp.read(),
+                dict_type=dict_type,
+                use_numbers=use_numbers,
+                encoding=encoding,
+                lazy=lazy,
+                string_table=string_table,
+                workers=workers,
+                typed_arrays=typed_arrays,
+                object_pairs_hook=object_pairs_hook,
+                array_hook=array_hook,
+                data_hook=data_hook,
+                select=select,
+            )
+        m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if lazy:
+            # the lazy document holds on to the mapping's buffer, and it gets
+            # closed when both are garbage collected
+            return loads(
+                m,
+                dict_type=dict_type,
+                use_numbers=use_numbers,
+                encoding=encoding,
+                lazy=True,
+                string_table=string_table,
+                typed_arrays=typed_arrays,
+                object_pairs_hook=object_pairs_hook,
+                array_hook=array_hook,
+                data_hook=data_hook,
+                select=select,
+            )
+        with m:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                m.madvise(mmap.MADV_SEQUENTIAL)
+            return loads(
+                m,
+                dict_type=dict_type,
+                use_numbers=use_numbers,
+                encoding=encoding,
+                string_table=string_table,
+                workers=workers,
+                typed_arrays=typed_arrays,
+                object_pairs_hook=object_pairs_hook,
+                array_hook=array_hook,
+                data_hook=data_hook,
+                select=select,
+            )
+
+
+ScanResult = namedtuple(
+    "ScanResult", ["dicts", "arrays", "strings", "data_bytes", "max_depth"]
+)
+
+
+def scan(data, encoding="utf-8"):
+    """Check that an OpenStep plist (a str or a bytes-like object, like for
+    loads) is well-formed, and count what it contains, without building it.
+
+    Returns a ScanResult with the number of dicts, arrays and strings (keys
+    included), the total number of bytes in the <hex> data, and the maximum
+    nesting depth of the containers. Raises the same ParseError as loads if
+    the plist is malformed.
+
+    The document is scanned without holding the GIL, so several threads can
+    check different documents in parallel.
+    """
+    return LazySource(
+        data, None, False, TYPED_ARRAYS_NONE, encoding, None
+    ).parse(SCAN_DOCUMENT)
+
+
+def validate(data, encoding="utf-8"):
+    """Raise a ParseError, like loads would, if the OpenStep plist in 'data'
+    is malformed. See scan().
+    """
+    scan(data, encoding=encoding)
+
+
+# The incremental parser only ever reads bytes (str chunks are encoded first)
+ctypedef fused BytesParseInfo:
+    ParseInfoUCS1
+    ParseInfoUTF8
+
+
+cdef enum PushState:
+    PUSH_TOP_VALUE  # expecting the top-level value (an empty document is {})
+    PUSH_TOP_END  # the top-level value is complete, expecting EOF
+    PUSH_ARRAY_VALUE  # after '(' or ',': expecting a value or ')'
+    PUSH_ARRAY_SEP  # after an array value: expecting ',' or ')'
+    PUSH_DICT_KEY  # after '{' or ';': expecting a key or '}'
+    PUSH_DICT_ASSIGN  # after a key: expecting '=' or ';'
+    PUSH_DICT_VALUE  # after '=': expecting a value
+    PUSH_DICT_SEMI  # after a dict value: expecting ';'
+    PUSH_DONE  # the rest of the input is ignored
+
+
+cdef enum CommentState:
+    COMMENT_NONE
+    COMMENT_LINE
+    COMMENT_BLOCK
+
+
+cdef bytes UTF8_BOM = b"\xef\xbb\xbf"
+
+
+@cython.final
+cdef class IncrementalParser:
+    """Parse an OpenStep plist that arrives in chunks.
+
+    Pass the chunks to feed() as they arrive, then call close() to get the
+    parsed object. Chunks can be bytes-like objects in the given encoding,
+    or str. They can be split anywhere (e.g. in the middle of a quoted string,
+    an escape sequence, a <hex> data block or a comment): only the incomplete
+    token at the end of the input fed so far is kept in memory, all the rest
+    is parsed as soon as it is received.
+    """
+
+    cdef vector[uint8_t] buf  # input that was fed but not consumed yet
+    cdef Py_ssize_t scan_pos  # where to resume scanning the pending token
+    cdef uint32_t line_offset  # number of lines consumed before 'buf'
+    cdef PushState state
+    cdef CommentState comment
+    cdef list containers  # the arrays and dicts being parsed
+    cdef list keys  # the keys of the containers in their parent dicts
+    cdef vector[bint] in_array  # whether each container is an array
+    cdef bint empty  # whether the innermost container is empty so far
+    cdef object key  # the key of the innermost dict's pending value
+    cdef object result
+    # In events mode (used by iterparse), the parsing events are appended to
+    # this list instead of building the containers, which are replaced by
+    # None on the stack; 'promote' makes the next value be built and reported
+    # as a single "value" event.
+    cdef list events
+    cdef bint promote
+    cdef object dict_type
+    cdef bint use_numbers
+    cdef str encoding
+    cdef bint utf8
+    cdef bint strings_file
+    cdef bint at_start
+    cdef bint closed
+    cdef StringTable strings
+
+    def __cinit__(
+        self,
+        dict_type=dict,
+        bint use_numbers=False,
+        encoding="utf-8",
+        dict string_table=None,
+    ):
+        self.utf8 = is_utf8_encoding(encoding)
+        self.encoding = "utf-8" if self.utf8 else "latin-1"
+        self.dict_type = dict_type
+        self.use_numbers = use_numbers
+        self.strings = StringTable(string_table)
+        self.state = PUSH_TOP_VALUE
+        self.comment = COMMENT_NONE
+        self.containers = []
+        self.keys = []
+        self.at_start = True
+
+    def feed(self, data):
+        """Feed the next chunk of the document to the parser."""
+        if self.closed:
+            raise ValueError("feed() called on a closed parser")
+        self.append(data)
+        self.parse(final=False)
+
+    def close(self):
+        """Finish parsing the input fed so far and return the parsed object.
+        Raise ParseError if the document is incomplete.
+        """
+        if self.closed:
+            raise ValueError("close() called on a closed parser")
+        self.parse(final=True)
+        self.closed = True
+        result = self.result
+        self.result = None
+        return result
+
+    cdef int append(self, object data) except -1:
+        cdef Py_buffer view
+        cdef const uint8_t *p
+        if isinstance(data, unicode):
+            data = (<unicode>data).encode(self.encoding)
+        PyObject_GetBuffer(data, &view, PyBUF_SIMPLE)
+        try:
+            p = <const uint8_t *>view.buf
+            self.buf.insert(self.buf.end(), p, p + view.len)
+        finally:
+            PyBuffer_Release(&view)
+        return 0
+
+    cdef int parse(self, bint final, bint stop_at_event=False) except -1:
+        cdef ParseInfoUCS1 pi1
+        cdef ParseInfoUTF8 pi8
+        cdef const uint8_t *data
+        cdef Py_ssize_t consumed
+
+        if self.at_start and self.utf8:
+            # strip the UTF-8 byte order mark, if any
+            if (
+                not final
+                and self.buf.size() < 3
+                and UTF8_BOM.startswith(
+                    PyBytes_FromStringAndSize(
+                        <const char *>self.buf.const_data(), self.buf.size()
+                    )
+                )
+            ):
+                return 0  # not enough data to tell yet
+            if (
+                self.buf.size() >= 3
+                and self.buf[0] == 0xEF and self.buf[1] == 0xBB and self.buf[2] == 0xBF
+            ):
+                self.buf.erase(self.buf.begin(), self.buf.begin() + 3)
+        self.at_start = False
+
+        data = self.buf.const_data()
+        if self.utf8:
+            pi8 = ParseInfoUTF8(
+                begin=data,
+                curr=data,
+                end=data + self.buf.size(),
+                dict_type=<void *>self.dict_type,
+                strings=<void *>self.strings,
+                hooks=NULL,
+                use_numbers=self.use_numbers,
+                typed_arrays=TYPED_ARRAYS_NONE,
+                line_offset=self.line_offset,
+            )
+            self.process(&pi8, final, stop_at_event)
+            consumed = pi8.curr - data
+        else:
+            pi1 = ParseInfoUCS1(
+                begin=data,
+                curr=data,
+                end=data + self.buf.size(),
+                dict_type=<void *>self.dict_type,
+                strings=<void *>self.strings,
+                hooks=NULL,
+                use_numbers=self.use_numbers,
+                typed_arrays=TYPED_ARRAYS_NONE,
+                line_offset=self.line_offset,
+            )
+            self.process(&pi1, final, stop_at_event)
+            consumed = pi1.curr - data
+
+        # Drop the consumed input, keeping track of the line count. A trailing
+        # '\r' is kept, as it may be followed by a '\n' in the next chunk.
+        if consumed and data[consumed - 1] == c'\r':
+            consumed -= 1
+        if consumed:
+            if self.utf8:
+                pi8.curr = data + consumed
+                self.line_offset = line_number_strings(&pi8) - 1
+            else:
+                pi1.curr = data + consumed
+                self.line_offset = line_number_strings(&pi1) - 1
+            self.buf.erase(self.buf.begin(), self.buf.begin() + consumed)
+        return 0
+
+    cdef bint skip_space(self, BytesParseInfo *pi, bint final) except -1:
+        # Like advance_to_non_space, but comments can span several chunks.
+        # Return False if more input is needed to tell whether a comment or
+        # a line separator starts at pi.curr.
+        cdef Py_UCS4 ch
+        while pi.curr < pi.end:
+            ch = pi.curr[0]
+            if self.comment == COMMENT_LINE:
+                if ch == c'\n' or ch == c'\r':
+                    self.comment = COMMENT_NONE
+                    continue
+                if BytesParseInfo is ParseInfoUTF8:
+                    if ch == 0xE2:
+                        if pi.end - pi.curr < 3 and not final:
+                            return False
+                        if is_utf8_line_separator(pi.curr, pi.end):
+                            self.comment = COMMENT_NONE
+                            continue
+                pi.curr += 1
+            elif self.comment == COMMENT_BLOCK:
+                if ch == c'*':
+                    if pi.curr + 1 >= pi.end and not final:
+                        return False
+                    elif pi.curr + 1 < pi.end and pi.curr[1] == c'/':
+                        pi.curr += 1
+                        self.comment = COMMENT_NONE
+                pi.curr += 1
+            elif (ch >= 9 and ch <= 0x0d) or ch == c' ':
+                pi.curr += 1
+            elif ch == c'/':
+                if pi.curr + 1 >= pi.end:
+                    return final
+                elif pi.curr[1] == c'/':
+                    self.comment = COMMENT_LINE
+                    pi.curr += 2
+                elif pi.curr[1] == c'*':
+                    self.comment = COMMENT_BLOCK
+                    pi.curr += 2
+                else:
+                    return True
+            else:
+                if BytesParseInfo is ParseInfoUTF8:
+                    if ch == 0xE2:
+                        if pi.end - pi.curr < 3 and not final:
+                            return False
+                        if is_utf8_line_separator(pi.curr, pi.end):
+                            pi.curr += 3
+                            continue
+                return True
+        return True
+
+    cdef bint token_complete(
+        self, BytesParseInfo *pi, Py_UCS4 ch, bint final
+    ) except -1:
+        # Return True if the string or data token starting at pi.curr is
+        # complete; otherwise remember how far it was scanned and return False.
+        # At the end of the input the incomplete token is passed on anyway,
+        # for the parse functions to report the error.
+        cdef Py_ssize_t i = self.scan_pos
+        cdef Py_ssize_t n = pi.end - pi.curr
+        p = pi.curr
+        if ch == c'"' or ch == c'\'':
+            if i == 0:
+                i = 1
+            while i < n:
+                if p[i] == c'\\':
+                    if i + 1 >= n:
+                        break
+                    i += 2
+                elif p[i] == ch:
+                    self.scan_pos = 0
+                    return True
+                else:
+                    i += 1
+        elif ch == c'<':
+            while i < n:
+                if p[i] == c'>':
+                    self.scan_pos = 0
+                    return True
+                i += 1
+        else:
+            while i < n and is_valid_unquoted_string_char(p[i]):
+                i += 1
+            if i < n:
+                self.scan_pos = 0
+                return True
+        if final:
+            self.scan_pos = 0
+            return True
+        self.scan_pos = i
+        return False
+
+    cdef object parse_token(self, BytesParseInfo *pi, Py_UCS4 ch, bint is_key):
+        if ch == c'"' or ch == c'\'':
+            pi.curr += 1
+            return parse_quoted_plist_string(pi, ch, intern=is_key)
+        elif ch == c'<':
+            pi.curr += 1
+            return parse_plist_data(pi)
+        else:
+            return parse_unquoted_plist_string(pi, ensure_string=is_key)
+
+    cdef inline bint emitting(self):
+        # whether the current value must be reported as events
+        return (
+            self.events is not None
+            and not self.promote
+            and (not self.containers or self.containers[-1] is None)
+        )
+
+    cdef int begin_container(self, bint is_array) except -1:
+        cdef object container = None
+        if self.emitting():
+            self.events.append(("start_array" if is_array else "start_dict", None))
+        elif is_array:
+            container = []
+        else:
+            container = self.dict_type()
+        self.keys.append(self.key)
+        self.key = None
+        self.containers.append(container)
+        self.in_array.push_back(is_array)
+        self.empty = True
+        self.state = PUSH_ARRAY_VALUE if is_array else PUSH_DICT_KEY
+        return 0
+
+    cdef int end_container(self) except -1:
+        cdef bint is_array = self.in_array.back()
+        container = self.containers.pop()
+        self.in_array.pop_back()
+        self.key = self.keys.pop()
+        if container is None:
+            self.events.append(("end_array" if is_array else "end_dict", None))
+            return self.value_done(not self.empty)
+        return self.add_value(container)
+
+    cdef int add_key(self, object key) except -1:
+        if self.emitting():
+            self.events.append(("key", key))
+        self.key = key
+        self.state = PUSH_DICT_ASSIGN
+        return 0
+
+    cdef int add_value(self, object value) except -1:
+        if self.containers and self.containers[-1] is not None:
+            if self.in_array.back():
+                (<list>self.containers[-1]).append(value)
+            else:
+                self.containers[-1][self.key] = value
+        elif self.events is None:
+            self.result = value
+        elif not self.containers and not self.promote and (
+            isinstance(value, unicode) and value
+        ):
+            # a top-level string may be the first key of a 'strings resource'
+            # file: its event is delayed until we know what follows
+            self.result = value
+        else:
+            self.events.append(("value", value))
+            self.promote = False
+        return self.value_done(True if self.containers else bool(value))
+
+    cdef int value_done(self, bint truthy) except -1:
+        self.empty = False
+        if not self.containers:
+            # like loads, ignore anything that follows a false-y value
+            self.state = PUSH_TOP_END if truthy else PUSH_DONE
+        elif self.in_array.back():
+            self.state = PUSH_ARRAY_SEP
+        else:
+            self.key = None
+            self.state = PUSH_DICT_SEMI
+        return 0
+
+    cdef int end_strings_file(self) except -1:
+        container = self.containers.pop()
+        self.in_array.pop_back()
+        self.keys.pop()
+        if container is None:
+            self.events.append(("end_dict", None))
+        else:
+            self.result = container
+        self.state = PUSH_DONE
+        return 0
+
+    cdef int process(
+        self, BytesParseInfo *pi, bint final, bint stop_at_event
+    ) except -1:
+        cdef Py_UCS4 ch
+        while True:
+            if stop_at_event and self.events:
+                return 0
+            if not self.skip_space(pi, final):
+                return 0
+            if pi.curr >= pi.end:
+                if final:
+                    self.finish(pi)
+                return 0
+            ch = pi.curr[0]
+
+            if self.state == PUSH_DONE:
+                pi.curr = pi.end
+            elif self.state == PUSH_TOP_END:
+                if not isinstance(self.result, unicode):
+                    raise ParseError(
+                        "Junk after plist at line %d" % line_number_strings(pi)
+                    )
+                # this is a 'strings resource' file: it looks like a dictionary
+                # without the opening/closing curly braces, and the top-level
+                # string we just parsed is its first key
+                self.strings_file = True
+                if self.events is not None:
+                    self.events.append(("start_dict", None))
+                    self.containers.append(None)
+                else:
+                    self.containers.append(self.dict_type())
+                self.keys.append(None)
+                self.in_array.push_back(False)
+                key = self.result
+                self.result = None
+                self.add_key(key)
+            elif (
+                self.state == PUSH_TOP_VALUE
+                or self.state == PUSH_ARRAY_VALUE
+                or self.state == PUSH_DICT_VALUE
+            ):
+                if ch == c'{':
+                    pi.curr += 1
+                    self.begin_container(is_array=False)
+                elif ch == c'(':
+                    pi.curr += 1
+                    self.begin_container(is_array=True)
+                elif ch == c')' and self.state == PUSH_ARRAY_VALUE:
+                    pi.curr += 1
+                    self.end_container()
+                elif (
+                    ch == c'"' or ch == c'\'' or ch == c'<'
+                    or is_valid_unquoted_string_char(ch)
+                ):
+                    if not self.token_complete(pi, ch, final):
+                        return 0
+                    self.add_value(self.parse_token(pi, ch, is_key=False))
+                elif self.state == PUSH_ARRAY_VALUE:
+                    raise ParseError(
+                        "Expected terminating ')' for array at line %d"
+                        % line_number_strings(pi)
+                    )
+                else:
+                    raise ParseError(
+                        "Unexpected character at line %d: %r"
+                        % (line_number_strings(pi), current_char(pi))
+                    )
+            elif self.state == PUSH_ARRAY_SEP:
+                if ch == c',':
+                    pi.curr += 1
+                    self.state = PUSH_ARRAY_VALUE
+                elif ch == c')':
+                    pi.curr += 1
+                    self.end_container()
+                else:
+                    raise ParseError(
+                        "Expected terminating ')' for array at line %d"
+                        % line_number_strings(pi)
+                    )
+            elif self.state == PUSH_DICT_KEY:
+                if ch == c'"' or ch == c'\'' or is_valid_unquoted_string_char(ch):
+                    if not self.token_complete(pi, ch, final):
+                        return 0
+                    self.add_key(self.parse_token(pi, ch, is_key=True))
+                elif self.strings_file and len(self.containers) == 1:
+                    # like loads, stop parsing a 'strings resource' file
+                    # at the first character that can't start a key
+                    self.end_strings_file()
+                elif ch == c'}':
+                    pi.curr += 1
+                    self.end_container()
+                else:
+                    raise ParseError(
+                        "Expected terminating '}' for dictionary at line %d"
+                        % line_number_strings(pi)
+                    )
+            elif self.state == PUSH_DICT_ASSIGN:
+                if ch == c';':
+                    # 'strings resource' shortcut: the key is also the value
+                    pi.curr += 1
+                    self.add_value(self.key)
+                    self.state = PUSH_DICT_KEY
+                elif ch == c'=':
+                    pi.curr += 1
+                    self.state = PUSH_DICT_VALUE
+                else:
+                    raise ParseError(
+                        "Unexpected character after key at line %d: %r"
+                        % (line_number_strings(pi), current_char(pi))
+                    )
+            elif self.state == PUSH_DICT_SEMI:
+                if ch == c';':
+                    pi.curr += 1
+                    self.state = PUSH_DICT_KEY
+                else:
+                    raise ParseError(
+                        "Missing ';' on line %d" % line_number_strings(pi)
+                    )
+
+    cdef int finish(self, BytesParseInfo *pi) except -1:
+        # reached the end of the input: check that the document is complete
+        if self.state == PUSH_TOP_VALUE:
+            # a document consisting of only whitespace or empty is defined
+            # as an empty dictionary
+            if self.events is not None:
+                self.events.append(("start_dict", None))
+                self.events.append(("end_dict", None))
+            else:
+                self.result = {}
+        elif self.state == PUSH_TOP_END:
+            if self.events is not None and self.result is not None:
+                # the delayed top-level string
+                self.events.append(("value", self.result))
+                self.result = None
+        elif self.state == PUSH_DICT_KEY and (
+            self.strings_file and len(self.containers) == 1
+        ):
+            self.end_strings_file()
+        elif self.state == PUSH_ARRAY_VALUE:
+            raise ParseError(
+                "Expected terminating ')' for array at line %d"
+                % line_number_strings(pi)
+            )
+        elif self.state == PUSH_ARRAY_SEP:
+            raise ParseError(
+                "Missing ',' for array at line %d" % line_number_strings(pi)
+            )
+        elif self.state == PUSH_DICT_KEY:
+            raise ParseError(
+                "Expected terminating '}' for dictionary at line %d"
+                % line_number_strings(pi)
+            )
+        elif self.state == PUSH_DICT_ASSIGN or self.state == PUSH_DICT_SEMI:
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+        elif self.state == PUSH_DICT_VALUE:
+            raise ParseError("Unexpected EOF while parsing plist")
+        self.state = PUSH_DONE
+        return 0
+
+
+@cython.final
+cdef class EventIterator:
+    """Iterator over the parsing events of an OpenStep plist, returned by
+    iterparse().
+    """
+
+    cdef IncrementalParser parser
+    cdef object read  # the source's read method, if it's a file object
+    cdef object data  # otherwise, the source itself
+    cdef Py_ssize_t pos
+    cdef Py_ssize_t chunk_size
+    cdef bint eof
+
+    def __cinit__(
+        self,
+        source,
+        dict_type=dict,
+        bint use_numbers=False,
+        encoding="utf-8",
+        Py_ssize_t chunk_size=65536,
+        dict string_table=None,
+    ):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.parser = IncrementalParser(
+            dict_type=dict_type,
+            use_numbers=use_numbers,
+            encoding=encoding,
+            string_table=string_table,
+        )
+        self.parser.events = []
+        self.chunk_size = chunk_size
+        if isinstance(source, unicode):
+            self.data = source
+        elif PyObject_CheckBuffer(source):
+            self.data = memoryview(source).cast("B")
+        else:
+            self.read = source.read
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        event = self.next_event()
+        if event is None:
+            raise StopIteration
+        return event
+
+    def read_value(self):
+        """Parse the next value as a whole and return it as a fully built
+        object, instead of generating the events for its content.
+
+        It can be called where a value is expected: before the first event,
+        after a "key" event, or after a "start_array" event or an array
+        element (as long as the array doesn't end there).
+        """
+        cdef IncrementalParser parser = self.parser
+        if parser.events is None:
+            raise ValueError("No more values to read")
+        if parser.state == PUSH_TOP_VALUE and not parser.events:
+            # the whole document is requested: parse it like loads
+            parser.events = None
+            while not self.eof:
+                self.read_chunk()
+                parser.parse(final=False)
+            parser.parse(final=True)
+            result = parser.result
+            parser.result = None
+            return result
+        if parser.events or not (
+            parser.state == PUSH_ARRAY_VALUE
+            or parser.state == PUSH_ARRAY_SEP
+            or parser.state == PUSH_DICT_ASSIGN
+            or parser.state == PUSH_DICT_VALUE
+        ):
+            raise ValueError("The next event is not a value")
+        parser.promote = True
+        try:
+            event = self.next_event()
+        finally:
+            parser.promote = False
+        if event is None or event[0] != "value":
+            if event is not None:
+                parser.events.insert(0, event)
+            raise ValueError("The next event is not a value")
+        return event[1]
+
+    cdef object next_event(self):
+        cdef IncrementalParser parser = self.parser
+        cdef list events = parser.events
+        if events is None:
+            return None
+        while not events:
+            if parser.state == PUSH_DONE:
+                return None
+            parser.parse(final=self.eof, stop_at_event=True)
+            if not events and not self.eof:
+                self.read_chunk()
+        return events.pop(0)
+
+    cdef int read_chunk(self) except -1:
+        if self.read is not None:
+            chunk = self.read(self.chunk_size)
+        else:
+            chunk = self.data[self.pos : self.pos + self.chunk_size]
+            self.pos += self.chunk_size
+        if len(chunk):
+            self.parser.append(chunk)
+        else:
+            self.eof = True
+        return 0
+
+
+def iterparse(
+    source,
+    dict_type=dict,
+    bint use_numbers=False,
+    encoding="utf-8",
+    Py_ssize_t chunk_size=65536,
+    dict string_table=None,
+):
+    """Iterate over the parsing events of an OpenStep plist, without building
+    the whole object tree in memory.
+
+    The source can be a str, a bytes-like object, or a file object opened in
+    text or binary mode, which is read in chunks of 'chunk_size'.
+
+    Yields (event, value) tuples, where event is one of "start_dict",
+    "end_dict", "start_array", "end_array" (with value None), "key" (with the
+    dict key as value) or "value" (with a string, number or bytes value).
+    The returned iterator's read_value() method can be called to get the next
+    value as a fully built object instead of as a sequence of events.
+    """
+    return EventIterator(
+        source,
+        dict_type=dict_type,
+        use_numbers=use_numbers,
+        encoding=encoding,
+        chunk_size=chunk_size,
+        string_table=string_table,
+    )
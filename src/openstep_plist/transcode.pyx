@@ -0,0 +1,766 @@
+#cython: language_level=3
+#distutils: define_macros=CYTHON_TRACE_NOGIL=1
+
+from cpython.buffer cimport (
+    PyObject_CheckBuffer, PyObject_GetBuffer, PyBuffer_Release, PyBUF_SIMPLE,
+)
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
+from cpython.unicode cimport (
+    PyUnicode_1BYTE_KIND, PyUnicode_2BYTE_KIND, PyUnicode_DATA,
+    PyUnicode_DecodeUTF8, PyUnicode_GET_LENGTH, PyUnicode_KIND, PyUnicode_READ,
+)
+from cpython.mem cimport PyMem_Free
+from libc.math cimport isfinite
+from libc.stdint cimport int64_t, uint8_t, uint16_t, uint32_t
+from libc.stdio cimport snprintf
+from libc.string cimport strlen
+from libcpp.vector cimport vector
+cimport cython
+
+from operator import itemgetter
+
+from .parser cimport (
+    ParseError,
+    ParseInfo,
+    ParseInfoUCS1,
+    ParseInfoUTF8,
+    ParseInfoUCS2,
+    ParseInfoUCS4,
+    char_type,
+    TYPED_ARRAYS_NONE,
+    UnquotedType,
+    UNQUOTED_STRING,
+    UNQUOTED_FLOAT,
+    line_number_strings,
+    advance_to_non_space,
+    is_utf8_line_separator,
+    current_char,
+    get_slashed_char,
+    get_unquoted_string_type,
+    parse_plist_string,
+    int64_from_chars,
+    float_from_chars,
+    from_hex_digit,
+    is_utf8_encoding,
+)
+from .util cimport (
+    tounicode,
+    is_valid_unquoted_string_char,
+    is_high_surrogate,
+    is_low_surrogate,
+    unicode_scalar_from_surrogates,
+    high_surrogate_from_unicode_scalar,
+    low_surrogate_from_unicode_scalar,
+    decode_utf8_char,
+    encode_utf8_char,
+)
+
+cdef extern from "Python.h":
+    int Py_DTSF_ADD_DOT_0
+    char *PyOS_double_to_string(
+        double val, char format_code, int precision, int flags, int *ptype
+    ) except NULL
+
+
+cdef const char *HEX_DIGITS = b"0123456789abcdef"
+cdef const char *BASE64_DIGITS = (
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+)
+
+
+cdef enum DataFormat:
+    DATA_FORMAT_PLIST  # "<00ff>", the data as written in the plist
+    DATA_FORMAT_HEX  # "00ff"
+    DATA_FORMAT_BASE64  # "AP8="
+
+
+# What the transcode_* functions return about the value they've written (or
+# -1 on error): the top-level value is checked like in parse_plist_document
+cdef enum ValueKind:
+    VALUE_EMPTY = 0  # an empty string, container or data, or a zero
+    VALUE_NON_EMPTY = 1
+    VALUE_STRING = 2  # a non-empty string
+
+
+@cython.final
+cdef class JSONOutput:
+    """The JSON text being written, as UTF-8 bytes. With a file object, they
+    are decoded and written to it each time they reach the chunk size, so
+    that only a chunk is ever held in memory (except while a dict with sorted
+    keys is open, whose entries are buffered until its end).
+    """
+
+    cdef vector[char] buf
+    cdef object write
+    cdef Py_ssize_t chunk_size
+    cdef Py_ssize_t indent  # -1 for none, i.e. everything on one line
+    cdef Py_ssize_t depth
+    cdef bint ensure_ascii
+    cdef bint use_numbers
+    cdef bint sort_keys
+    cdef Py_ssize_t sorted_dicts  # the number of open dicts with sorted keys
+    cdef DataFormat data_format
+
+    def __cinit__(
+        self,
+        fp,
+        indent,
+        bint ensure_ascii,
+        bint use_numbers,
+        bint sort_keys,
+        data_format,
+        Py_ssize_t chunk_size,
+    ):
+        if indent is not None and indent < 0:
+            raise ValueError("indent must be None or a non-negative int")
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if data_format == "plist":
+            self.data_format = DATA_FORMAT_PLIST
+        elif data_format == "hex":
+            self.data_format = DATA_FORMAT_HEX
+        elif data_format == "base64":
+            self.data_format = DATA_FORMAT_BASE64
+        else:
+            raise ValueError(
+                f"Invalid data_format: {data_format!r}; "
+                "expected 'plist', 'hex' or 'base64'"
+            )
+        self.write = None if fp is None else fp.write
+        self.indent = -1 if indent is None else indent
+        self.ensure_ascii = ensure_ascii
+        self.use_numbers = use_numbers
+        self.sort_keys = sort_keys
+        self.chunk_size = chunk_size
+
+    cdef inline void extend(self, const char *s, Py_ssize_t length) noexcept:
+        self.buf.insert(self.buf.end(), s, s + length)
+
+    cdef unicode decode(self):
+        # lone surrogates, from \U escapes, are encoded like the others
+        return PyUnicode_DecodeUTF8(
+            self.buf.data(), self.buf.size(), "surrogatepass"
+        )
+
+    cdef int flush(self, bint force=False) except -1:
+        # only called between two values, so no character is ever split
+        if self.write is not None and (
+            force
+            or <Py_ssize_t>self.buf.size() >= self.chunk_size
+            and not self.sorted_dicts
+        ):
+            if self.buf.size():
+                self.write(self.decode())
+            self.buf.clear()
+        return 0
+
+    cdef void newline(self) noexcept:
+        if self.indent >= 0:
+            self.buf.push_back(c'\n')
+            self.buf.insert(self.buf.end(), self.indent * self.depth, c' ')
+
+    cdef void begin_item(self, Py_ssize_t count) noexcept:
+        # the separator and indentation that precede a container's item
+        if count:
+            self.buf.push_back(c',')
+            if self.indent < 0:
+                self.buf.push_back(c' ')
+        self.newline()
+
+    cdef void end_container(self, char ch, Py_ssize_t count) noexcept:
+        self.depth -= 1
+        if count:
+            self.newline()
+        self.buf.push_back(ch)
+
+    cdef void write_char(self, Py_UCS4 ch) noexcept:
+        # escape the character like json.dumps
+        cdef char escape[13]
+        cdef uint8_t utf8[4]
+        cdef Py_ssize_t n
+        if ch >= 0x20 and ch != c'"' and ch != c'\\' and ch < 0x7F:
+            self.buf.push_back(<char>ch)
+        elif ch == c'"':
+            self.extend(b'\\"', 2)
+        elif ch == c'\\':
+            self.extend(b"\\\\", 2)
+        elif ch == c'\n':
+            self.extend(b"\\n", 2)
+        elif ch == c'\r':
+            self.extend(b"\\r", 2)
+        elif ch == c'\t':
+            self.extend(b"\\t", 2)
+        elif ch == c'\b':
+            self.extend(b"\\b", 2)
+        elif ch == c'\f':
+            self.extend(b"\\f", 2)
+        elif ch < 0x20 or (self.ensure_ascii and ch <= 0xFFFF):
+            n = snprintf(escape, sizeof(escape), "\\u%04x", <unsigned int>ch)
+            self.extend(escape, n)
+        elif self.ensure_ascii:
+            n = snprintf(
+                escape,
+                sizeof(escape),
+                "\\u%04x\\u%04x",
+                <unsigned int>high_surrogate_from_unicode_scalar(ch),
+                <unsigned int>low_surrogate_from_unicode_scalar(ch),
+            )
+            self.extend(escape, n)
+        else:
+            n = encode_utf8_char(ch, utf8)
+            self.extend(<const char *>utf8, n)
+
+    cdef void write_string(self, unicode s) noexcept:
+        cdef Py_ssize_t i
+        cdef int kind = PyUnicode_KIND(s)
+        cdef const void *data = PyUnicode_DATA(s)
+        self.buf.push_back(c'"')
+        for i in range(PyUnicode_GET_LENGTH(s)):
+            self.write_char(PyUnicode_READ(kind, data, i))
+        self.buf.push_back(c'"')
+
+
+cdef inline bint is_value_start(Py_UCS4 ch) noexcept:
+    return (
+        ch == c'{'
+        or ch == c'('
+        or ch == c'<'
+        or ch == c'"'
+        or ch == c'\''
+        or is_valid_unquoted_string_char(ch)
+    )
+
+
+cdef int transcode_quoted_string(
+    JSONOutput out, ParseInfo *pi, Py_UCS4 quote
+) except -1:
+    # like parse_quoted_plist_string, pi.curr is just past the opening quote
+    cdef Py_UCS4 ch, ch2
+    cdef Py_ssize_t n
+    start = pi.curr
+    out.buf.push_back(c'"')
+    while pi.curr < pi.end:
+        ch = pi.curr[0]
+        if ch == quote:
+            break
+        elif ch == c'\\':
+            pi.curr += 1
+            if ParseInfo is ParseInfoUTF8:
+                if pi.curr < pi.end and pi.curr[0] >= 0x80:
+                    # a backslash followed by a non-ASCII character stands for
+                    # the character itself
+                    continue
+            ch = get_slashed_char(pi)
+            # two successive \UXXXX escapes can be a surrogate pair
+            if (
+                is_high_surrogate(ch)
+                and pi.curr < pi.end and pi.curr[0] == c'\\'
+            ):
+                tmp = pi.curr
+                pi.curr += 1
+                ch2 = get_slashed_char(pi)
+                if is_low_surrogate(ch2):
+                    ch = unicode_scalar_from_surrogates(high=ch, low=ch2)
+                else:
+                    pi.curr = tmp
+            out.write_char(ch)
+        else:
+            if ParseInfo is ParseInfoUTF8:
+                if ch >= 0x80:
+                    n = decode_utf8_char(pi.curr, pi.end, &ch)
+                    if n == 0:
+                        raise ParseError(
+                            "Invalid UTF-8 byte sequence in string at line %d"
+                            % line_number_strings(pi)
+                        )
+                    if not out.ensure_ascii:
+                        # the input is already UTF-8
+                        out.extend(<const char *>pi.curr, n)
+                        pi.curr += n
+                        continue
+                    pi.curr += n - 1
+            pi.curr += 1
+            out.write_char(ch)
+    if pi.curr >= pi.end:
+        raise ParseError(
+            "Unterminated quoted string starting on line %d"
+            % line_number_strings(pi)
+        )
+    pi.curr += 1
+    out.buf.push_back(c'"')
+    return VALUE_STRING if pi.curr - start > 1 else VALUE_EMPTY
+
+
+cdef int transcode_number(
+    JSONOutput out, const char_type *buf, Py_ssize_t length, UnquotedType kind
+) except -1:
+    cdef int64_t value
+    cdef double d
+    cdef char digits[24]
+    cdef char *string
+    cdef Py_ssize_t i
+    if kind == UNQUOTED_FLOAT:
+        d = float_from_chars(buf, length)
+        if not isfinite(d):
+            # not valid JSON: keep the text, as a string
+            out.buf.push_back(c'"')
+            for i in range(length):
+                out.buf.push_back(<char>buf[i])
+            out.buf.push_back(c'"')
+            return VALUE_NON_EMPTY
+        # the same as repr(float), like json.dumps
+        string = PyOS_double_to_string(d, b'r', 0, Py_DTSF_ADD_DOT_0, NULL)
+        try:
+            out.extend(string, strlen(string))
+        finally:
+            PyMem_Free(string)
+        return VALUE_NON_EMPTY if d != 0.0 else VALUE_EMPTY
+    if int64_from_chars(buf, length, &value):
+        length = snprintf(digits, sizeof(digits), "%lld", <long long>value)
+        out.extend(digits, length)
+        return VALUE_NON_EMPTY if value != 0 else VALUE_EMPTY
+    # too big for 64 bits: the digits are written as they are, bar any
+    # leading zeros (or minus sign of a zero, which wouldn't be this big)
+    i = 0
+    if buf[0] == c'-':
+        out.buf.push_back(c'-')
+        i = 1
+    while i < length - 1 and buf[i] == c'0':
+        i += 1
+    for i in range(i, length):
+        out.buf.push_back(<char>buf[i])
+    return VALUE_NON_EMPTY
+
+
+cdef int transcode_unquoted_string(
+    JSONOutput out, ParseInfo *pi, bint ensure_string=False
+) except -1:
+    cdef Py_ssize_t length, i
+    cdef UnquotedType kind
+    mark = pi.curr
+    while pi.curr < pi.end and is_valid_unquoted_string_char(pi.curr[0]):
+        pi.curr += 1
+    length = pi.curr - mark
+    if not ensure_string and out.use_numbers:
+        kind = get_unquoted_string_type(mark, length)
+        if kind != UNQUOTED_STRING:
+            return transcode_number(out, mark, length, kind)
+    # the unquoted string characters are all ASCII, and need no escaping
+    out.buf.push_back(c'"')
+    for i in range(length):
+        out.buf.push_back(<char>mark[i])
+    out.buf.push_back(c'"')
+    return VALUE_STRING
+
+
+cdef int transcode_data(JSONOutput out, ParseInfo *pi) except -1:
+    # like parse_plist_data, after the opening '<'
+    cdef unsigned char first, second
+    cdef Py_UCS4 ch1, ch2
+    cdef Py_ssize_t count = 0
+    cdef uint32_t group = 0
+    cdef DataFormat data_format = out.data_format
+    out.buf.push_back(c'"')
+    if data_format == DATA_FORMAT_PLIST:
+        out.buf.push_back(c'<')
+    while pi.curr < pi.end:
+        ch1 = pi.curr[0]
+        if ch1 == c'>':
+            break
+        first = from_hex_digit(ch1)
+        if first != 0xff:
+            pi.curr += 1
+            if pi.curr >= pi.end or pi.curr[0] == c'>':
+                raise ParseError(
+                    "Malformed data byte group at line %d: uneven length"
+                    % line_number_strings(pi)
+                )
+            ch2 = pi.curr[0]
+            second = from_hex_digit(ch2)
+            if second == 0xff:
+                raise ParseError(
+                    "Malformed data byte group at line %d: invalid hex digit: %r"
+                    % (line_number_strings(pi), current_char(pi))
+                )
+            pi.curr += 1
+            if data_format == DATA_FORMAT_BASE64:
+                # every 3 bytes are written as 4 characters
+                group = (group << 8) | (first << 4) | second
+                if count % 3 == 2:
+                    out.buf.push_back(BASE64_DIGITS[group >> 18])
+                    out.buf.push_back(BASE64_DIGITS[(group >> 12) & 0x3F])
+                    out.buf.push_back(BASE64_DIGITS[(group >> 6) & 0x3F])
+                    out.buf.push_back(BASE64_DIGITS[group & 0x3F])
+                    group = 0
+            else:
+                out.buf.push_back(HEX_DIGITS[first])
+                out.buf.push_back(HEX_DIGITS[second])
+            count += 1
+        elif (
+            ch1 == c' ' or
+            ch1 == c'\n' or
+            ch1 == c'\t' or
+            ch1 == c'\r' or
+            ch1 == 0x2028 or
+            ch1 == 0x2029
+        ):
+            pi.curr += 1
+        else:
+            if ParseInfo is ParseInfoUTF8:
+                if is_utf8_line_separator(pi.curr, pi.end):
+                    pi.curr += 3
+                    continue
+            raise ParseError(
+                "Malformed data byte group at line %d: invalid hex digit: %r"
+                % (line_number_strings(pi), current_char(pi))
+            )
+    if pi.curr >= pi.end:
+        raise ParseError(
+            "Expected terminating '>' for data at line %d"
+            % line_number_strings(pi)
+        )
+    pi.curr += 1
+    if data_format == DATA_FORMAT_BASE64 and count % 3:
+        # pad the last group
+        if count % 3 == 1:
+            group <<= 16
+        else:
+            group <<= 8
+        out.buf.push_back(BASE64_DIGITS[group >> 18])
+        out.buf.push_back(BASE64_DIGITS[(group >> 12) & 0x3F])
+        if count % 3 == 2:
+            out.buf.push_back(BASE64_DIGITS[(group >> 6) & 0x3F])
+        else:
+            out.buf.push_back(c'=')
+        out.buf.push_back(c'=')
+    elif data_format == DATA_FORMAT_PLIST:
+        out.buf.push_back(c'>')
+    out.buf.push_back(c'"')
+    return VALUE_NON_EMPTY if count else VALUE_EMPTY
+
+
+cdef int transcode_array(JSONOutput out, ParseInfo *pi) except -1:
+    # like parse_plist_array, after the opening '('
+    cdef Py_ssize_t count = 0
+    out.buf.push_back(c'[')
+    out.depth += 1
+    if advance_to_non_space(pi) and is_value_start(pi.curr[0]):
+        while True:
+            out.begin_item(count)
+            transcode_object(out, pi)
+            count += 1
+            out.flush()
+            if not advance_to_non_space(pi):
+                raise ParseError(
+                    "Missing ',' for array at line %d" % line_number_strings(pi)
+                )
+            if pi.curr[0] != c',':
+                break
+            pi.curr += 1
+            if not advance_to_non_space(pi) or not is_value_start(pi.curr[0]):
+                break
+    if not advance_to_non_space(pi) or pi.curr[0] != c')':
+        raise ParseError(
+            "Expected terminating ')' for array at line %d"
+            % line_number_strings(pi)
+        )
+    pi.curr += 1
+    out.end_container(c']', count)
+    return VALUE_NON_EMPTY if count else VALUE_EMPTY
+
+
+cdef bint transcode_key(
+    JSONOutput out, ParseInfo *pi, Py_ssize_t count
+) except -1:
+    # like parse_plist_string(required=False): return False if there's no key
+    cdef Py_UCS4 ch
+    if not advance_to_non_space(pi):
+        return False
+    ch = pi.curr[0]
+    if ch == c'\'' or ch == c'"':
+        out.begin_item(count)
+        pi.curr += 1
+        transcode_quoted_string(out, pi, ch)
+        return True
+    elif is_valid_unquoted_string_char(ch):
+        out.begin_item(count)
+        transcode_unquoted_string(out, pi, ensure_string=True)
+        return True
+    return False
+
+
+cdef int transcode_dict_content(
+    JSONOutput out, ParseInfo *pi
+) except -1:
+    # like parse_plist_dict_content; keys that are repeated are all written,
+    # and JSON parsers keep the last one, like the plist parser does
+    cdef Py_ssize_t count = 0, length, i
+    cdef size_t key_start, start, end
+    cdef list entries = None
+    cdef bint unsorted = False
+    cdef unicode key
+    cdef bytes data
+    out.buf.push_back(c'{')
+    out.depth += 1
+    if out.sort_keys:
+        # the entries are buffered, with their keys as str to compare them,
+        # and rewritten in order at the end if they aren't already sorted
+        entries = []
+        out.sorted_dicts += 1
+    start = key_start = out.buf.size()
+    while True:
+        if entries is None:
+            if not transcode_key(out, pi, count):
+                break
+        else:
+            key = parse_plist_string(pi, required=False)
+            if key is None:
+                break
+            out.begin_item(count)
+            key_start = out.buf.size()
+            out.write_string(key)
+        if not advance_to_non_space(pi):
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+        if pi.curr[0] == c';':
+            # the 'strings resource' shortcut: the value is the key itself
+            out.extend(b": ", 2)
+            if entries is not None:
+                out.write_string(key)
+            else:
+                while out.buf[key_start] != c'"':
+                    key_start += 1  # skip the separator and indentation
+                length = out.buf.size() - 2 - key_start
+                out.buf.reserve(out.buf.size() + length)
+                for i in range(length):
+                    out.buf.push_back(out.buf[key_start + i])
+        elif pi.curr[0] == c'=':
+            pi.curr += 1
+            out.extend(b": ", 2)
+            transcode_object(out, pi)
+        else:
+            raise ParseError(
+                "Unexpected character after key at line %d: %r"
+                % (line_number_strings(pi), current_char(pi))
+            )
+        if entries is not None:
+            if entries and key < entries[-1][0]:
+                unsorted = True
+            entries.append((key, key_start, out.buf.size()))
+        count += 1
+        out.flush()
+        if not advance_to_non_space(pi) or pi.curr[0] != c';':
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+        pi.curr += 1
+        key_start = out.buf.size()
+    if entries is not None:
+        out.sorted_dicts -= 1
+        if unsorted:
+            # stable, like the plist parser keeping the last repeated key
+            entries.sort(key=itemgetter(0))
+            data = PyBytes_FromStringAndSize(
+                out.buf.data() + start, out.buf.size() - start
+            )
+            out.buf.resize(start)
+            for i, (_, key_start, end) in enumerate(entries):
+                out.begin_item(i)
+                out.extend(
+                    PyBytes_AS_STRING(data) + key_start - start, end - key_start
+                )
+    out.end_container(c'}', count)
+    return VALUE_NON_EMPTY if count else VALUE_EMPTY
+
+
+cdef int transcode_object(JSONOutput out, ParseInfo *pi) except -1:
+    # like parse_plist_object(required=True)
+    cdef Py_UCS4 ch
+    cdef int result
+    if not advance_to_non_space(pi):
+        raise ParseError("Unexpected EOF while parsing plist")
+    ch = pi.curr[0]
+    pi.curr += 1
+    if ch == c'{':
+        result = transcode_dict_content(out, pi)
+        if not advance_to_non_space(pi) or pi.curr[0] != c'}':
+            raise ParseError(
+                "Expected terminating '}' for dictionary at line %d"
+                % line_number_strings(pi)
+            )
+        pi.curr += 1
+        return result
+    elif ch == c'(':
+        return transcode_array(out, pi)
+    elif ch == c'<':
+        return transcode_data(out, pi)
+    elif ch == c'\'' or ch == c'"':
+        return transcode_quoted_string(out, pi, ch)
+    elif is_valid_unquoted_string_char(ch):
+        pi.curr -= 1
+        return transcode_unquoted_string(out, pi)
+    pi.curr -= 1
+    raise ParseError(
+        "Unexpected character at line %d: %r"
+        % (line_number_strings(pi), current_char(pi))
+    )
+
+
+cdef int transcode_document(JSONOutput out, ParseInfo *pi) except -1:
+    # like parse_plist_document
+    cdef size_t start = out.buf.size()
+    begin = pi.curr
+    if not advance_to_non_space(pi):
+        # an empty document is an empty dictionary
+        transcode_dict_content(out, pi)
+        return 0
+    kind = transcode_object(out, pi)
+    if kind != VALUE_EMPTY and advance_to_non_space(pi):
+        if kind != VALUE_STRING:
+            raise ParseError(
+                "Junk after plist at line %d" % line_number_strings(pi)
+            )
+        # a 'strings resource' file: a dictionary without the braces, whose
+        # first key was written as the value
+        out.buf.resize(start)
+        pi.curr = begin
+        transcode_dict_content(out, pi)
+    return 0
+
+
+cdef int transcode_unicode(JSONOutput out, unicode s) except -1:
+    # transcode the string's own storage, according to its PEP 393 kind
+    cdef Py_ssize_t length = PyUnicode_GET_LENGTH(s)
+    cdef int kind = PyUnicode_KIND(s)
+    cdef const void *data = PyUnicode_DATA(s)
+    cdef ParseInfoUCS1 pi1
+    cdef ParseInfoUCS2 pi2
+    cdef ParseInfoUCS4 pi4
+
+    if kind == PyUnicode_1BYTE_KIND:
+        pi1 = ParseInfoUCS1(
+            begin=<const uint8_t *>data,
+            curr=<const uint8_t *>data,
+            end=<const uint8_t *>data + length,
+            dict_type=NULL,
+            strings=NULL,
+            hooks=NULL,
+            use_numbers=out.use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
+        )
+        return transcode_document(out, &pi1)
+    elif kind == PyUnicode_2BYTE_KIND:
+        pi2 = ParseInfoUCS2(
+            begin=<const uint16_t *>data,
+            curr=<const uint16_t *>data,
+            end=<const uint16_t *>data + length,
+            dict_type=NULL,
+            strings=NULL,
+            hooks=NULL,
+            use_numbers=out.use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
+        )
+        return transcode_document(out, &pi2)
+    else:
+        pi4 = ParseInfoUCS4(
+            begin=<const Py_UCS4 *>data,
+            curr=<const Py_UCS4 *>data,
+            end=<const Py_UCS4 *>data + length,
+            dict_type=NULL,
+            strings=NULL,
+            hooks=NULL,
+            use_numbers=out.use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
+        )
+        return transcode_document(out, &pi4)
+
+
+cdef int transcode_buffer(JSONOutput out, object obj, bint utf8) except -1:
+    cdef Py_buffer view
+    cdef const uint8_t *buf
+    cdef ParseInfoUCS1 pi1
+    cdef ParseInfoUTF8 pi8
+
+    PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE)
+    try:
+        buf = <const uint8_t *>view.buf
+        if utf8:
+            # skip the UTF-8 byte order mark, if any
+            if (
+                view.len >= 3
+                and buf[0] == 0xEF and buf[1] == 0xBB and buf[2] == 0xBF
+            ):
+                buf += 3
+            pi8 = ParseInfoUTF8(
+                begin=buf,
+                curr=buf,
+                end=<const uint8_t *>view.buf + view.len,
+                dict_type=NULL,
+                strings=NULL,
+                hooks=NULL,
+                use_numbers=out.use_numbers,
+                typed_arrays=TYPED_ARRAYS_NONE,
+                line_offset=0,
+            )
+            return transcode_document(out, &pi8)
+        else:
+            pi1 = ParseInfoUCS1(
+                begin=buf,
+                curr=buf,
+                end=buf + view.len,
+                dict_type=NULL,
+                strings=NULL,
+                hooks=NULL,
+                use_numbers=out.use_numbers,
+                typed_arrays=TYPED_ARRAYS_NONE,
+                line_offset=0,
+            )
+            return transcode_document(out, &pi1)
+    finally:
+        PyBuffer_Release(&view)
+
+
+def to_json(
+    data,
+    fp=None,
+    *,
+    bint use_numbers=False,
+    encoding="utf-8",
+    indent=None,
+    bint ensure_ascii=True,
+    bint sort_keys=False,
+    data_format="plist",
+    Py_ssize_t chunk_size=65536,
+):
+    """Convert an OpenStep plist (a str or a bytes-like object, like for
+    loads) to JSON text in a single pass, without building the objects.
+
+    The result is the same as json.dumps(loads(data, use_numbers=use_numbers))
+    with the given 'indent', 'ensure_ascii' and 'sort_keys', except that:
+    - the <hex> data, which JSON has no type for, is written as a string: with
+      data_format="plist" (the default) like "<00ff>", with "hex" like "00ff",
+      or with "base64" like "AP8=";
+    - a repeated key is written again rather than replacing the previous
+      value;
+    - with use_numbers=True, the floats too big for a double, which JSON
+      can't represent, are written as strings of their digits.
+
+    If 'fp' is a text file object, the JSON is written to it in chunks of
+    about 'chunk_size' bytes, and None is returned, so that converting a big
+    document only takes a bounded amount of memory on top of the input (which
+    can be a mmap.mmap); otherwise the JSON is returned as a str.
+    """
+    cdef JSONOutput out = JSONOutput(
+        fp, indent, ensure_ascii, use_numbers, sort_keys, data_format, chunk_size
+    )
+    if isinstance(data, unicode):
+        transcode_unicode(out, tounicode(data))
+    elif PyObject_CheckBuffer(data):
+        transcode_buffer(out, data, is_utf8_encoding(encoding))
+    else:
+        raise TypeError(
+            f"Expected str or bytes-like object, got {type(data).__name__}"
+        )
+    if fp is None:
+        return out.decode()
+    out.flush(force=True)
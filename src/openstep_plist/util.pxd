@@ -1,9 +1,9 @@
 #cython: language_level=3
 
-from libc.stdint cimport uint16_t, uint32_t
+from libc.stdint cimport uint8_t, uint16_t, uint32_t
 
 
-cdef extern from "<ctype.h>":
+cdef extern from "<ctype.h>" nogil:
     int isxdigit(int c)
     int isdigit(int c)
     int isprint(int c)
@@ -15,7 +15,7 @@ cdef unicode tounicode(s, encoding=*, errors=*)
 cdef tostr(s, encoding=*, errors=*)
 
 
-cdef bint is_valid_unquoted_string_char(Py_UCS4 x)
+cdef bint is_valid_unquoted_string_char(Py_UCS4 x) noexcept nogil
 
 
 cdef bint is_high_surrogate(uint32_t ch)
@@ -31,3 +31,14 @@ cdef uint16_t high_surrogate_from_unicode_scalar(uint32_t scalar)
 
 
 cdef uint16_t low_surrogate_from_unicode_scalar(uint32_t scalar)
+
+
+cdef Py_ssize_t decode_utf8_char(
+    const uint8_t *s, const uint8_t *end, Py_UCS4 *ch
+) noexcept nogil
+
+
+cdef Py_ssize_t utf8_char_length(uint32_t ch) noexcept nogil
+
+
+cdef Py_ssize_t encode_utf8_char(uint32_t ch, uint8_t *dest) noexcept nogil
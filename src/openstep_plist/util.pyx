@@ -1,7 +1,7 @@
 #cython: language_level=3
 #distutils: define_macros=CYTHON_TRACE_NOGIL=1
 
-from libc.stdint cimport uint16_t, uint32_t
+from libc.stdint cimport uint8_t, uint16_t, uint32_t
 
 
 cdef inline unicode tounicode(s, encoding="ascii", errors="strict"):
@@ -22,7 +22,7 @@ cdef inline object tostr(s, encoding="ascii", errors="strict"):
         raise TypeError(f"Could not convert to str: {s!r}")
 
 
-cdef inline bint is_valid_unquoted_string_char(Py_UCS4 x):
+cdef inline bint is_valid_unquoted_string_char(Py_UCS4 x) noexcept nogil:
     return (
         (x >= c'a' and x <= c'z') or
         (x >= c'A' and x <= c'Z') or
@@ -54,3 +54,79 @@ cdef inline uint16_t high_surrogate_from_unicode_scalar(uint32_t scalar):
 
 cdef inline uint16_t low_surrogate_from_unicode_scalar(uint32_t scalar):
     return (scalar - 0x10000) % 0x400 + 0xDC00
+
+
+cdef inline Py_ssize_t decode_utf8_char(
+    const uint8_t *s, const uint8_t *end, Py_UCS4 *ch
+) noexcept nogil:
+    """Decode a single UTF-8 encoded code point starting at 's' into 'ch'.
+    Return the number of bytes consumed, or 0 if the sequence is truncated
+    or malformed (overlong forms, surrogates and values beyond U+10FFFF are
+    rejected, like Python's strict UTF-8 codec does).
+    """
+    cdef uint8_t b0 = s[0]
+    cdef Py_ssize_t n, i
+    cdef uint32_t c
+    if b0 < 0x80:
+        ch[0] = b0
+        return 1
+    elif b0 < 0xC2:
+        return 0  # continuation byte or overlong 2-byte lead
+    elif b0 < 0xE0:
+        n = 2
+        c = b0 & 0x1F
+    elif b0 < 0xF0:
+        n = 3
+        c = b0 & 0x0F
+    elif b0 < 0xF5:
+        n = 4
+        c = b0 & 0x07
+    else:
+        return 0
+    if end - s < n:
+        return 0
+    for i in range(1, n):
+        if (s[i] & 0xC0) != 0x80:
+            return 0
+        c = (c << 6) | (s[i] & 0x3F)
+    if (
+        (n == 3 and (c < 0x800 or (c >= 0xD800 and c <= 0xDFFF)))
+        or (n == 4 and (c < 0x10000 or c > 0x10FFFF))
+    ):
+        return 0
+    ch[0] = c
+    return n
+
+
+cdef inline Py_ssize_t utf8_char_length(uint32_t ch) noexcept nogil:
+    if ch < 0x80:
+        return 1
+    elif ch < 0x800:
+        return 2
+    elif ch < 0x10000:
+        return 3
+    return 4
+
+
+cdef inline Py_ssize_t encode_utf8_char(uint32_t ch, uint8_t *dest) noexcept nogil:
+    """Encode the code point 'ch' as UTF-8 into 'dest', which must have room
+    for 4 bytes, and return the number of bytes written. Lone surrogates are
+    encoded like any other code point (like the 'surrogatepass' handler does).
+    """
+    if ch < 0x80:
+        dest[0] = <uint8_t>ch
+        return 1
+    elif ch < 0x800:
+        dest[0] = <uint8_t>(0xC0 | (ch >> 6))
+        dest[1] = <uint8_t>(0x80 | (ch & 0x3F))
+        return 2
+    elif ch < 0x10000:
+        dest[0] = <uint8_t>(0xE0 | (ch >> 12))
+        dest[1] = <uint8_t>(0x80 | ((ch >> 6) & 0x3F))
+        dest[2] = <uint8_t>(0x80 | (ch & 0x3F))
+        return 3
+    dest[0] = <uint8_t>(0xF0 | (ch >> 18))
+    dest[1] = <uint8_t>(0x80 | ((ch >> 12) & 0x3F))
+    dest[2] = <uint8_t>(0x80 | ((ch >> 6) & 0x3F))
+    dest[3] = <uint8_t>(0x80 | (ch & 0x3F))
+    return 4
@@ -2,21 +2,41 @@
 #distutils: define_macros=CYTHON_TRACE_NOGIL=1
 
 from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from operator import itemgetter
+import array
+import sys
 from cpython.unicode cimport (
-    PyUnicode_AsUTF8String,
-    PyUnicode_4BYTE_KIND,
-    PyUnicode_FromKindAndData,
-    PyUnicode_AsUCS4Copy,
+    PyUnicode_DecodeUTF8,
     PyUnicode_GET_LENGTH,
     PyUnicode_DATA,
     PyUnicode_KIND,
     PyUnicode_READ,
+    PyUnicode_1BYTE_KIND,
+    PyUnicode_2BYTE_KIND,
 )
-from cpython.bytes cimport PyBytes_GET_SIZE
+from cpython.buffer cimport (
+    PyObject_CheckBuffer,
+    PyObject_GetBuffer,
+    PyBuffer_Release,
+    PyBUF_SIMPLE,
+    PyBUF_ND,
+    PyBUF_FORMAT,
+)
+from cpython.bytes cimport (
+    PyBytes_AS_STRING, PyBytes_FromStringAndSize, PyBytes_GET_SIZE,
+)
+from cpython.dict cimport PyDict_GetItem
 from cpython.object cimport Py_SIZE
+from cpython.ref cimport PyObject
 from cpython.mem cimport PyMem_Free
 from libcpp.vector cimport vector
-from libc.stdint cimport uint16_t
+from libc.stdint cimport (
+    int8_t, int16_t, int32_t, int64_t, uint8_t, uint16_t, uint32_t, uint64_t,
+)
+from libc.stdio cimport snprintf
+from libc.stdlib cimport atoi
+from libc.string cimport memchr, memcpy, strlen
 cimport cython
 
 from .util cimport (
@@ -25,17 +45,57 @@ from .util cimport (
     isprint,
     high_surrogate_from_unicode_scalar,
     low_surrogate_from_unicode_scalar,
+    utf8_char_length,
+    encode_utf8_char,
+    is_valid_unquoted_string_char,
+)
+from .parser cimport (
+    ParseError,
+    ParseInfo,
+    ParseInfoUCS1,
+    ParseInfoUTF8,
+    ParseInfoUCS2,
+    ParseInfoUCS4,
+    TYPED_ARRAYS_NONE,
+    line_number_strings,
+    advance_to_non_space,
+    current_char,
+    parse_plist_string,
+    parse_plist_object,
+    is_utf8_encoding,
 )
 
+cdef extern from "Python.h":
+    bint PyUnicode_IS_ASCII(object o)
+    char *PyOS_double_to_string(
+        double val, char format_code, int precision, int flags, int *ptype
+    ) except NULL
 
-cdef Py_UCS4 *HEX_MAP = [
-    c'0', c'1', c'2', c'3', c'4', c'5', c'6', c'7',
-    c'8', c'9', c'A', c'B', c'C', c'D', c'E', c'F',
-]
 
-cdef Py_UCS4 *ARRAY_SEP_NO_INDENT = [c',', c' ']
-cdef Py_UCS4 *DICT_KEY_VALUE_SEP = [c' ', c'=', c' ']
-cdef Py_UCS4 *DICT_ITEM_SEP_NO_INDENT = [c';', c' ']
+ctypedef fused char_type:
+    uint8_t
+    uint16_t
+    Py_UCS4
+
+
+cdef const char *HEX_MAP = b"0123456789ABCDEF"
+
+# The two hexadecimal digits of each byte value, for write_data
+cdef char HEX_PAIRS[512]
+
+
+cdef void init_hex_pairs() noexcept:
+    cdef int i
+    for i in range(256):
+        HEX_PAIRS[2 * i] = HEX_MAP[i >> 4]
+        HEX_PAIRS[2 * i + 1] = HEX_MAP[i & 0x0F]
+
+
+init_hex_pairs()
+
+cdef const char *ARRAY_SEP_NO_INDENT = b", "
+cdef const char *DICT_KEY_VALUE_SEP = b" = "
+cdef const char *DICT_ITEM_SEP_NO_INDENT = b"; "
 
 
 # this table includes A-Z, a-z, 0-9, '.', '_' and '$'
@@ -60,22 +120,26 @@ cdef bint *VALID_UNQUOTED_CHARS = [
 
 
 cpdef bint string_needs_quotes(unicode a):
-    cdef Py_ssize_t length = len(a)
+    cdef Py_ssize_t length = PyUnicode_GET_LENGTH(a)
     # empty string is always quoted
     if length == 0:
         return True
+    # if non-ASCII, we must write it with quotes
+    if not PyUnicode_IS_ASCII(a):
+        return True
 
     cdef:
+        const uint8_t *s = <const uint8_t *>PyUnicode_DATA(a)
         Py_ssize_t i
-        Py_UCS4 ch
+        uint8_t ch
         bint is_number = True
         bint seen_period = False
 
     for i in range(length):
-        ch = a[i]
-        # if non-ASCII or contains any invalid unquoted characters,
-        # we must write it with quotes
-        if ch > 0x7F or not VALID_UNQUOTED_CHARS[ch]:
+        ch = s[i]
+        # if it contains any invalid unquoted characters, we must write it
+        # with quotes
+        if not VALID_UNQUOTED_CHARS[ch]:
             return True
         elif is_number:
             # check if the string could be confused with an integer or float;
@@ -95,8 +159,17 @@ cpdef bint string_needs_quotes(unicode a):
     return is_number
 
 
-cdef inline void escape_unicode(uint16_t ch, Py_UCS4 *dest):
-    # caller must ensure 'dest' has rooms for 6 more Py_UCS4
+cdef inline bint is_plain_char(unsigned long ch, bint escape_newlines) noexcept:
+    # whether the character is written as is in a quoted string
+    return (
+        (ch >= c' ' and ch < 0x7F and ch != c'\\' and ch != c'"')
+        or ch == c'\t'
+        or (ch == c'\n' and not escape_newlines)
+    )
+
+
+cdef inline void escape_unicode(uint16_t ch, char *dest):
+    # caller must ensure 'dest' has rooms for 6 more bytes
     dest[0] = c'\\'
     dest[1] = c'U'
     dest[5] = (ch & 15) + 55 if (ch & 15) > 9 else (ch & 15) + 48
@@ -108,12 +181,56 @@ cdef inline void escape_unicode(uint16_t ch, Py_UCS4 *dest):
     dest[2] = (ch & 15) + 55 if (ch & 15) > 9 else (ch & 15) + 48
 
 
+cdef enum:
+    # how much of the output dump() buffers before writing it to the file
+    DEFAULT_BUFFER_SIZE = 1 << 20
+    # the limits of the Writer's cache of the dict keys' output
+    MAX_CACHED_KEYS = 4096
+    MAX_CACHED_KEY_LENGTH = 64
+
+
+cdef bint is_binary_file(object file) except -1:
+    # figure out whether file object expects bytes or unicodes
+    try:
+        file.write(b"")
+    except TypeError:
+        file.write("")  # this better not fail...
+        return False
+    return True
+
+
+cdef enum ContainerType:
+    CONTAINER_ARRAY
+    CONTAINER_TUPLE
+    CONTAINER_DICT
+    CONTAINER_SORTED_DICT
+
+
+# A container opened by the Writer's begin_* methods
+ctypedef struct Container:
+    ContainerType type
+    Py_ssize_t count  # the number of items (or keys) so far
+    bint has_key  # for dicts: whether a key is waiting for its value
+    bint indented  # whether the items go on their own indented lines
+    Py_ssize_t start  # for sorted dicts: where the first entry starts
+    bint unsorted  # for sorted dicts: whether the keys came out of order
+
+
+cdef inline bint is_numpy_array(object obj):
+    # numpy can't have made the object unless it was already imported
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
 @cython.final
 cdef class Writer:
 
-    cdef vector[Py_UCS4] *dest
+    # the output is accumulated as UTF-8 encoded bytes; the counts returned by
+    # the write methods are in characters
+    cdef vector[char] *dest
     cdef bint unicode_escape
     cdef int float_precision
+    cdef bint shortest_float_repr
     cdef unicode indent
     cdef int current_indent_level
     cdef bint single_line_tuples
@@ -121,6 +238,16 @@ cdef class Writer:
     cdef bint sort_keys
     cdef bint single_line_empty_objects
     cdef bint binary_spaces
+    cdef object file
+    cdef bint binary_file
+    cdef Py_ssize_t buffer_size
+    # the containers opened by begin_array/begin_tuple/begin_dict; the
+    # entries of the dicts with sorted keys are buffered until their end()
+    cdef vector[Container] containers
+    cdef list sorted_entries
+    cdef Py_ssize_t buffered_dicts
+    cdef dict key_cache
+    cdef object default
 
     def __cinit__(
         self,
@@ -131,11 +258,20 @@ cdef class Writer:
         bint escape_newlines=True,
         bint sort_keys=True,
         bint single_line_empty_objects=True,
-        bint binary_spaces=True
+        bint binary_spaces=True,
+        bint shortest_float_repr=False,
+        default=None,
+        file=None,
+        Py_ssize_t buffer_size=DEFAULT_BUFFER_SIZE,
     ):
-        self.dest = new vector[Py_UCS4]()
+        self.dest = new vector[char]()
         self.unicode_escape = unicode_escape
         self.float_precision = float_precision
+        # With shortest_float_repr, the floats are written with the fewest
+        # digits that read back as the same value (as long as that's no more
+        # than float_precision decimals), rather than rounded to
+        # float_precision decimals with the trailing zeros removed.
+        self.shortest_float_repr = shortest_float_repr
         self.escape_newlines = escape_newlines
         self.sort_keys = sort_keys
         self.single_line_empty_objects = single_line_empty_objects
@@ -150,6 +286,18 @@ cdef class Writer:
             self.indent = None
         self.single_line_tuples = single_line_tuples
         self.current_indent_level = 0
+        self.sorted_entries = []
+        # called with the objects that can't otherwise be serialized, it
+        # returns something that can be (or raises TypeError)
+        self.default = default
+        self.key_cache = {}
+
+        # With a file, the output is streamed to it: written out and cleared
+        # whenever it grows past the buffer_size (in bytes), and by flush().
+        if file is not None:
+            self.file = file
+            self.binary_file = is_binary_file(file)
+            self.buffer_size = buffer_size
 
     def __dealloc__(self):
         del self.dest
@@ -157,36 +305,243 @@ cdef class Writer:
     def getvalue(self):
         return self._getvalue()
 
+    def getvalue_bytes(self):
+        """Return the output as UTF-8 encoded bytes."""
+        return self._getvalue_bytes()
+
     def dump(self, file):
-        cdef unicode s = self._getvalue()
-        # figure out whether file object expects bytes or unicodes
-        try:
-            file.write(b"")
-        except TypeError:
-            file.write("")  # this better not fail...
-            # file already accepts unicodes; use it directly
-            file.write(s)
+        if is_binary_file(file):
+            # the output is already UTF-8
+            file.write(self._getvalue_bytes())
         else:
-            # file expects bytes; always encode as UTF-8
-            file.write(PyUnicode_AsUTF8String(s))
+            # file already accepts unicodes; use it directly
+            file.write(self._getvalue())
 
     def write(self, object obj):
-        return self.write_object(obj)
+        if not self.containers.empty():
+            raise ValueError("Can't write() inside a container, use value()")
+        cdef Py_ssize_t count = self.write_object(obj)
+        self.maybe_flush()
+        return count
+
+    def flush(self):
+        """Write out the buffered output to the Writer's file (except while
+        a dict with sorted keys is open, whose entries must stay buffered).
+        """
+        if self.file is None:
+            raise ValueError("Writer has no file to flush to")
+        self._flush()
+
+    # The builder methods write a document piece by piece, without building
+    # the objects first, e.g. for {a = (1, 2);}:
+    #     begin_dict(); key("a"); begin_array(); value(1); value(2); end(); end()
+    # and format it like write() would have.
+
+    def begin_array(self):
+        self.begin_container(CONTAINER_ARRAY)
+
+    def begin_tuple(self):
+        """Like begin_array, for an array formatted like a tuple (on a single
+        line with single_line_tuples=True).
+        """
+        self.begin_container(CONTAINER_TUPLE)
+
+    def begin_dict(self):
+        """Begin a dict, whose entries are added by calling key() before each
+        value. With sort_keys=True, the entries are buffered until the dict's
+        end(), and then written out sorted by key.
+        """
+        self.begin_container(
+            CONTAINER_SORTED_DICT if self.sort_keys else CONTAINER_DICT
+        )
+
+    def key(self, key):
+        self.begin_key(key)
+
+    def value(self, object obj):
+        self.begin_value()
+        self.write_object(obj)
+        self.end_value()
+
+    def end(self):
+        """End the innermost container opened by one of the begin_* methods."""
+        self.end_container()
+
+    cdef int begin_key(self, key) except -1:
+        cdef Container *c = NULL
+        if not self.containers.empty():
+            c = &self.containers.back()
+        if c == NULL or c.type < CONTAINER_DICT:
+            raise ValueError("key() can only be called inside a dict")
+        if c.has_key:
+            raise ValueError(f"Missing value for the previous key before {key!r}")
+        self.write_separator(c)
+        if c.type == CONTAINER_SORTED_DICT:
+            entries = self.sorted_entries[-1]
+            if entries and key < entries[-1][0]:
+                c.unsorted = True
+            entries.append([key, self.dest.size()])
+        c.count += 1
+        c.has_key = True
+        if not isinstance(key, unicode):
+            key = unicode(key)
+        self.write_key(key)
+        self.extend_buffer(DICT_KEY_VALUE_SEP, 3)
+        return 0
+
+    cdef int end_container(self) except -1:
+        cdef:
+            Container c
+            list entries
+            bytes data
+            const char *ptr
+            Py_ssize_t start, size
+            unicode indent = self.indent
+
+        if self.containers.empty():
+            raise ValueError("No container to end")
+        c = self.containers.back()
+        if c.has_key:
+            raise ValueError("Missing value for the last key of the dict")
+
+        if c.type == CONTAINER_SORTED_DICT:
+            entries = self.sorted_entries.pop()
+            self.buffered_dicts -= 1
+        if c.type == CONTAINER_SORTED_DICT and c.unsorted:
+            # rewrite the entries in order, between the same separators
+            entries.sort(key=itemgetter(0))
+            size = self.dest.size()
+            data = PyBytes_FromStringAndSize(
+                self.dest.data() + c.start, size - c.start
+            )
+            ptr = PyBytes_AS_STRING(data)
+            self.dest.resize(c.start)
+            for c.count, (_, start, size) in enumerate(entries):
+                self.write_separator(&c)
+                self.extend_buffer(ptr + start - c.start, size - start)
+            c.count = len(entries)
+
+        if c.indented:
+            self.current_indent_level -= 1
+        if c.count == 0 and not (self.single_line_empty_objects or indent is None):
+            self.write_unquoted_string("\n" + self.current_indent_level * indent)
+        elif c.count != 0 and c.indented:
+            self.write_unquoted_string("\n" + self.current_indent_level * indent)
+        self.dest.push_back(c'}' if c.type >= CONTAINER_DICT else c')')
+
+        self.containers.pop_back()
+        self.end_value()
+        return 0
+
+    cdef int begin_container(self, ContainerType type) except -1:
+        cdef Container c
+        self.begin_value()
+        c.type = type
+        c.count = 0
+        c.has_key = False
+        c.indented = self.indent is not None and not (
+            type == CONTAINER_TUPLE and self.single_line_tuples
+        )
+        c.start = 0
+        c.unsorted = False
+        self.dest.push_back(c'{' if type >= CONTAINER_DICT else c'(')
+        if c.indented:
+            self.current_indent_level += 1
+        if type == CONTAINER_SORTED_DICT:
+            c.start = self.dest.size()
+            self.sorted_entries.append([])
+            self.buffered_dicts += 1
+        self.containers.push_back(c)
+        return 0
+
+    cdef int begin_value(self) except -1:
+        cdef Container *c
+        if self.containers.empty():
+            return 0
+        c = &self.containers.back()
+        if c.type >= CONTAINER_DICT:
+            if not c.has_key:
+                raise ValueError("Missing key() before the value in a dict")
+            c.has_key = False
+        else:
+            self.write_separator(c)
+            c.count += 1
+        return 0
+
+    cdef int end_value(self) except -1:
+        cdef Container *c
+        if not self.containers.empty():
+            c = &self.containers.back()
+            if c.type >= CONTAINER_DICT:
+                self.dest.push_back(c';')
+                if c.type == CONTAINER_SORTED_DICT:
+                    self.sorted_entries[-1][-1].append(self.dest.size())
+        self.maybe_flush()
+        return 0
+
+    cdef int write_separator(self, Container *c) except -1:
+        # write what goes before the next item (or key) of the container
+        if c.indented:
+            if c.count and c.type < CONTAINER_DICT:
+                self.dest.push_back(c',')
+            self.write_unquoted_string("\n" + self.current_indent_level * self.indent)
+        elif c.count:
+            if c.type >= CONTAINER_DICT:
+                self.dest.push_back(c' ')
+            elif self.indent is None:
+                self.extend_buffer(ARRAY_SEP_NO_INDENT, 2)
+            else:
+                self.dest.push_back(c',')  # a single line tuple
+        return 0
+
+    cdef int _flush(self) except -1:
+        if self.dest.size() == 0 or self.buffered_dicts:
+            return 0
+        # the buffer only ever ends after a complete value, not in the middle
+        # of a UTF-8 sequence
+        if self.binary_file:
+            self.file.write(self._getvalue_bytes())
+        else:
+            self.file.write(self._getvalue())
+        self.dest.clear()
+        return 0
+
+    cdef inline int maybe_flush(self) except -1:
+        if (
+            self.file is not None
+            and <Py_ssize_t>self.dest.size() >= self.buffer_size
+        ):
+            self._flush()
+        return 0
 
     cdef inline Py_ssize_t extend_buffer(
-        self, const Py_UCS4 *s, Py_ssize_t length
+        self, const char *s, Py_ssize_t length
     ) except -1:
-        self.dest.reserve(self.dest.size() + length)
         self.dest.insert(self.dest.end(), s, s + length)
         return length
 
     cdef inline unicode _getvalue(self):
-        return PyUnicode_FromKindAndData(
-            PyUnicode_4BYTE_KIND,
-            self.dest.const_data(),
-            self.dest.size()
+        # lone surrogates can only be in the output with unicode_escape=False;
+        # they are passed through, like any other character
+        return PyUnicode_DecodeUTF8(
+            self.dest.data(), self.dest.size(), "surrogatepass"
         )
 
+    cdef bytes _getvalue_bytes(self):
+        # The lone surrogates (only written with unicode_escape=False) are
+        # in the buffer as 'surrogatepass' sequences, which aren't valid
+        # UTF-8: raise the UnicodeEncodeError of encoding the str output.
+        # They are the only sequences that start with 0xED followed by a byte
+        # of 0xA0 or more.
+        cdef const char *data = self.dest.data()
+        cdef const char *end = data + self.dest.size()
+        cdef const char *p = <const char *>memchr(data, 0xED, end - data)
+        while p != NULL and p + 1 < end:
+            if <uint8_t>p[1] >= 0xA0:
+                self._getvalue().encode("utf-8")
+            p = <const char *>memchr(p + 1, 0xED, end - p - 1)
+        return PyBytes_FromStringAndSize(data, end - data)
+
     cdef Py_ssize_t write_object(self, object obj) except -1:
         if obj is None:
             return self.write_string("(nil)")
@@ -204,79 +559,113 @@ cdef class Writer:
         elif isinstance(obj, tuple):
             return self.write_array_from_tuple(obj)
         elif isinstance(obj, OrderedDict):
-            return self.write_ordered_dict(obj)
+            return self.write_mapping(obj, False)
         elif isinstance(obj, dict):
             return self.write_dict(obj)
         elif isinstance(obj, bytes):
-            return self.write_data(obj)
+            return self.write_data(
+                <const unsigned char *>PyBytes_AS_STRING(obj), PyBytes_GET_SIZE(obj)
+            )
+        elif isinstance(obj, array.array) or is_numpy_array(obj):
+            # like the typed arrays returned by loads(..., typed_arrays=True)
+            count = self.write_typed_array(obj)
+            if count >= 0:
+                return count
+            # not a one-dimensional contiguous array of numbers
+            items = obj.tolist()
+            if isinstance(items, list):
+                return self.write_array_from_tuple(tuple(items))
+            return self.write_object(items)  # a 0-dimensional ndarray
+        elif isinstance(obj, (bytearray, memoryview)):
+            return self.write_buffer(obj)
+        elif isinstance(obj, Mapping):
+            return self.write_mapping(obj, self.sort_keys)
+        elif isinstance(obj, Sequence):
+            return self.write_array_from_list(list(obj))
+        elif self.default is not None:
+            return self.write_object(self.default(obj))
         else:
             raise TypeError(
                 f"Object of type {type(obj).__name__} is not PLIST serializable"
             )
 
     cdef Py_ssize_t write_quoted_string(self, unicode string) except -1:
+        # read the characters straight from the string's storage
         cdef Py_ssize_t length = PyUnicode_GET_LENGTH(string)
-        cdef Py_UCS4 *s = PyUnicode_AsUCS4Copy(string)
-        if not s:
-            raise MemoryError()
-        try:
-            return self._write_quoted_string(s, length)
-        finally:
-            PyMem_Free(s)
+        cdef int kind = PyUnicode_KIND(string)
+        cdef const void *data = PyUnicode_DATA(string)
+        if kind == PyUnicode_1BYTE_KIND:
+            return self._write_quoted_string(<const uint8_t *>data, length)
+        elif kind == PyUnicode_2BYTE_KIND:
+            return self._write_quoted_string(<const uint16_t *>data, length)
+        else:
+            return self._write_quoted_string(<const Py_UCS4 *>data, length)
 
     cdef Py_ssize_t _write_quoted_string(
-        self, const Py_UCS4 *s, Py_ssize_t length
+        self, const char_type *s, Py_ssize_t length
     ) except -1:
 
         cdef:
-            vector[Py_UCS4] *dest = self.dest
+            vector[char] *dest = self.dest
             bint unicode_escape = self.unicode_escape
-            const Py_UCS4 *curr = s
-            const Py_UCS4 *end = &s[length]
-            Py_UCS4 *ptr
+            const char_type *curr = s
+            const char_type *end = &s[length]
+            const char_type *run
+            char *ptr
             unsigned long ch
             Py_ssize_t base_length = dest.size()
             Py_ssize_t new_length = 0
+            Py_ssize_t new_size = 0
             bint escape_newlines = self.escape_newlines
 
         while curr < end:
             ch = curr[0]
-            if ch == c'\t' or ch == c' ' or (ch == c'\n' and not escape_newlines):
+            if is_plain_char(ch, escape_newlines):
                 new_length += 1
             elif (
                 ch == c'\\' or ch == c'"' or ch == c'\a'
                 or ch == c'\b' or ch == c'\v' or ch == c'\f' or ch == c'\r'
-            ) or (
-                ch == c'\n' and escape_newlines
+                or ch == c'\n'
             ):
                 new_length += 2
-            else:
-                if ch < 128:
-                    if isprint(ch):
-                        new_length += 1
-                    else:
-                        new_length += 4
-                elif unicode_escape:
-                    if ch > 0xFFFF:
-                        new_length += 12
-                    else:
-                        new_length += 6
+            elif ch < 128:
+                new_length += 4
+            elif unicode_escape:
+                if ch > 0xFFFF:
+                    new_length += 12
                 else:
-                    new_length += 1
+                    new_length += 6
+            else:
+                new_length += 1
+                # the extra UTF-8 bytes
+                new_size += utf8_char_length(ch) - 1
             curr += 1
 
-        dest.resize(base_length + new_length + 2)
-        ptr = <Py_UCS4*>dest.data() + base_length
-        ptr[0] = '"'
+        new_size += new_length + 2
+        dest.resize(base_length + new_size)
+        ptr = dest.data() + base_length
+        ptr[0] = c'"'
         ptr += 1
 
         curr = s
         while curr < end:
             ch = curr[0]
-            if ch == c'\t' or ch == c' ' or (ch == c'\n' and not escape_newlines):
-                ptr[0] = ch
-                ptr += 1
-            elif ch == c'\n' and escape_newlines:
+            if is_plain_char(ch, escape_newlines):
+                # copy the whole run of characters that need no escaping
+                run = curr
+                curr += 1
+                while curr < end and is_plain_char(curr[0], escape_newlines):
+                    curr += 1
+                if char_type is uint8_t:
+                    memcpy(ptr, run, curr - run)
+                    ptr += curr - run
+                else:
+                    while run < curr:
+                        ptr[0] = <char>run[0]
+                        ptr += 1
+                        run += 1
+                continue
+            elif ch == c'\n':
                 ptr[0] = c'\\'; ptr[1] = c'n'; ptr += 2
             elif ch == c'\a':
                 ptr[0] = c'\\'; ptr[1] = c'a'; ptr += 2
@@ -292,32 +681,27 @@ cdef class Writer:
                 ptr[0] = c'\\'; ptr[1] = c'"'; ptr += 2
             elif ch == c'\r':
                 ptr[0] = c'\\'; ptr[1] = c'r'; ptr += 2
-            else:
-                if ch < 128:
-                    if isprint(ch):
-                        ptr[0] = ch
-                        ptr += 1
-                    else:
-                        ptr[0] = c'\\'
-                        ptr += 1
-                        ptr[2] = (ch & 7) + c'0'
-                        ch >>= 3
-                        ptr[1] = (ch & 7) + c'0'
-                        ch >>= 3
-                        ptr[0] = (ch & 7) + c'0'
-                        ptr += 3
-                elif unicode_escape:
-                    if ch > 0xFFFF:
-                        escape_unicode(high_surrogate_from_unicode_scalar(ch), ptr)
-                        ptr += 6
-                        escape_unicode(low_surrogate_from_unicode_scalar(ch), ptr)
-                        ptr += 6
-                    else:
-                        escape_unicode(ch, ptr)
-                        ptr += 6
+            elif ch < 128:
+                # the other non-printable ASCII characters, as octal escapes
+                ptr[0] = c'\\'
+                ptr += 1
+                ptr[2] = <char>((ch & 7) + c'0')
+                ch >>= 3
+                ptr[1] = <char>((ch & 7) + c'0')
+                ch >>= 3
+                ptr[0] = <char>((ch & 7) + c'0')
+                ptr += 3
+            elif unicode_escape:
+                if ch > 0xFFFF:
+                    escape_unicode(high_surrogate_from_unicode_scalar(ch), ptr)
+                    ptr += 6
+                    escape_unicode(low_surrogate_from_unicode_scalar(ch), ptr)
+                    ptr += 6
                 else:
-                    ptr[0] = ch
-                    ptr += 1
+                    escape_unicode(ch, ptr)
+                    ptr += 6
+            else:
+                ptr += encode_utf8_char(ch, <uint8_t *>ptr)
 
             curr += 1
 
@@ -330,43 +714,148 @@ cdef class Writer:
         cdef Py_UCS4 ch
         cdef Py_ssize_t i, length = PyUnicode_GET_LENGTH(string)
         cdef void *data = PyUnicode_DATA(string)
-        self.dest.reserve(self.dest.size() + length)
+        cdef uint8_t buf[4]
+        if PyUnicode_IS_ASCII(string):
+            # its storage is already valid UTF-8
+            return self.extend_buffer(<const char *>data, length)
         for i in range(length):
             ch = PyUnicode_READ(kind, data, i)
-            self.dest.push_back(ch)
+            self.extend_buffer(<const char *>buf, encode_utf8_char(ch, buf))
         return length
 
+    cdef Py_ssize_t write_key(self, unicode key) except -1:
+        # The dict keys tend to be the same few strings over and over: their
+        # output is cached, as long as it's all ASCII (so its length is also
+        # the number of characters).
+        cdef PyObject *cached = PyDict_GetItem(self.key_cache, key)
+        cdef Py_ssize_t start, count
+        if cached != NULL:
+            return self.extend_buffer(
+                PyBytes_AS_STRING(<object>cached), PyBytes_GET_SIZE(<object>cached)
+            )
+        start = self.dest.size()
+        count = self.write_string(key)
+        if (
+            count <= MAX_CACHED_KEY_LENGTH
+            and <Py_ssize_t>self.dest.size() - start == count
+        ):
+            if len(self.key_cache) >= MAX_CACHED_KEYS:
+                self.key_cache.clear()
+            self.key_cache[key] = PyBytes_FromStringAndSize(
+                self.dest.data() + start, count
+            )
+        return count
+
     cdef Py_ssize_t write_string(self, unicode string) except -1:
         if string_needs_quotes(string):
             return self.write_quoted_string(string)
         else:
             return self.write_unquoted_string(string)
 
-    cdef Py_ssize_t write_short_float_repr(self, object py_float) except -1:
+    cdef Py_ssize_t write_short_float_repr(self, double value) except -1:
+        cdef:
+            char *string
+            Py_ssize_t length
+
+        if self.shortest_float_repr:
+            length = self.write_shortest_float_repr(value)
+            if length >= 0:
+                return length
+
+        string = PyOS_double_to_string(value, b'f', self.float_precision, 0, NULL)
+        try:
+            length = strlen(string)
+            if memchr(string, c'.', length) != NULL:
+                # read digits backwards, skipping all the '0's until either a
+                # non-'0' or '.' is found
+                while string[length - 1] == c'0':
+                    length -= 1
+                if string[length - 1] == c'.':
+                    length -= 1  # skip the trailing dot
+            return self.extend_buffer(string, length)
+        finally:
+            PyMem_Free(string)
+
+    cdef Py_ssize_t write_shortest_float_repr(self, double value) except -2:
+        # Write the shortest digits that round-trip to the same value, like
+        # repr() does, but always in fixed-point notation. Return -1 without
+        # writing anything if that needs more than float_precision decimals.
         cdef:
-            unicode string = f"{py_float:.{self.float_precision}f}"
-            Py_ssize_t length = PyUnicode_GET_LENGTH(string)
-            Py_UCS4 ch
-
-        # read digits backwards, skipping all the '0's until either a
-        # non-'0' or '.' is found
-        while length > 0:
-            ch = string[length-1]
-            if ch == c'.':
-                length -= 1  # skip the trailing dot
-                break
-            elif ch != c'0':
-                break
-            length -= 1
-
-        return self.write_unquoted_string(string[:length])
-
-    cdef Py_ssize_t write_data(self, bytes data) except -1:
+            char *string = PyOS_double_to_string(value, b'r', 0, 0, NULL)
+            char *p = string
+            char digits[20]
+            Py_ssize_t num_digits = 0, start = 0, point = 0
+            bint seen_dot = False
+            vector[char] *dest = self.dest
+            Py_ssize_t size = dest.size()
+
+        try:
+            if p[0] == c'-':
+                p += 1
+            if not isdigit(p[0]):
+                # inf or nan
+                return self.extend_buffer(string, strlen(string))
+            # collect the (at most 17) significant digits, and the position
+            # of the decimal point relative to them
+            while isdigit(p[0]) or p[0] == c'.':
+                if p[0] == c'.':
+                    seen_dot = True
+                else:
+                    digits[num_digits] = p[0]
+                    num_digits += 1
+                    if not seen_dot:
+                        point += 1
+                p += 1
+            if p[0] == c'e':
+                point += atoi(p + 1)
+            while start < num_digits and digits[start] == c'0':
+                start += 1
+                point -= 1
+            while num_digits > start and num_digits > point and (
+                digits[num_digits - 1] == c'0'
+            ):
+                num_digits -= 1
+            if num_digits - start - point > self.float_precision:
+                return -1
+
+            if string[0] == c'-':
+                dest.push_back(c'-')
+            if start == num_digits:
+                dest.push_back(c'0')
+            elif point <= 0:
+                dest.push_back(c'0')
+                dest.push_back(c'.')
+                dest.insert(dest.end(), -point, c'0')
+                self.extend_buffer(digits + start, num_digits - start)
+            elif point >= num_digits - start:
+                self.extend_buffer(digits + start, num_digits - start)
+                dest.insert(dest.end(), point - (num_digits - start), c'0')
+            else:
+                self.extend_buffer(digits + start, point)
+                dest.push_back(c'.')
+                self.extend_buffer(digits + start + point, num_digits - start - point)
+            return dest.size() - size
+        finally:
+            PyMem_Free(string)
+
+    cdef Py_ssize_t write_buffer(self, object obj) except -1:
+        # the bytes are encoded from the object's own memory, unless it's a
+        # memoryview that isn't contiguous
+        cdef Py_buffer view
+        if isinstance(obj, memoryview) and not obj.c_contiguous:
+            obj = obj.tobytes()
+        PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE)
+        try:
+            return self.write_data(<const unsigned char *>view.buf, view.len)
+        finally:
+            PyBuffer_Release(&view)
+
+    cdef Py_ssize_t write_data(
+        self, const unsigned char *src, Py_ssize_t length
+    ) except -1:
         cdef:
-            vector[Py_UCS4] *dest = self.dest
-            const unsigned char *src = data
-            Py_UCS4 *ptr
-            Py_ssize_t length = PyBytes_GET_SIZE(data)
+            vector[char] *dest = self.dest
+            char *ptr
             Py_ssize_t extra_length, i, j
 
         binary_spaces = self.binary_spaces
@@ -378,19 +867,26 @@ cdef class Writer:
 
         j = dest.size()
         dest.resize(j + extra_length)
-        ptr = <Py_UCS4*>dest.data()
+        ptr = dest.data()
 
         ptr[j] = c'<'
         j += 1
+        if binary_spaces:
+            # a space follows each group of 4 bytes (a 32-bit int), but the last
+            i = 0
+            while i + 4 < length:
+                memcpy(ptr + j, HEX_PAIRS + 2 * src[i], 2)
+                memcpy(ptr + j + 2, HEX_PAIRS + 2 * src[i + 1], 2)
+                memcpy(ptr + j + 4, HEX_PAIRS + 2 * src[i + 2], 2)
+                memcpy(ptr + j + 6, HEX_PAIRS + 2 * src[i + 3], 2)
+                ptr[j + 8] = c' '
+                i += 4
+                j += 9
+            src += i
+            length -= i
         for i in range(length):
-            ptr[j] = HEX_MAP[(src[i] >> 4) & 0x0F]
-            j += 1
-            ptr[j] = HEX_MAP[src[i] & 0x0F]
-            if binary_spaces and (i & 3) == 3 and i < length - 1:
-                # if we've just finished a 32-bit int, print a space
-                j += 1
-                ptr[j] = c' '
-            j += 1
+            memcpy(ptr + j, HEX_PAIRS + 2 * src[i], 2)
+            j += 2
         ptr[j] = c'>'
 
         return extra_length
@@ -407,7 +903,7 @@ cdef class Writer:
             Py_ssize_t last
             Py_ssize_t count
             Py_ssize_t i
-            vector[Py_UCS4] *dest = self.dest
+            vector[char] *dest = self.dest
             unicode indent, newline_indent = ""
 
         indent = self.indent
@@ -432,6 +928,7 @@ cdef class Writer:
         last = length - 1
         for i in range(length):
             count += self.write_object(seq[i])
+            self.maybe_flush()
             if i != last:
                 if indent is None:
                     count += self.extend_buffer(ARRAY_SEP_NO_INDENT, 2)
@@ -457,7 +954,7 @@ cdef class Writer:
             Py_ssize_t last
             Py_ssize_t count
             Py_ssize_t i
-            vector[Py_UCS4] *dest = self.dest
+            vector[char] *dest = self.dest
             unicode indent, newline_indent = ""
 
         indent = self.indent
@@ -482,6 +979,7 @@ cdef class Writer:
         last = length - 1
         for i in range(length):
             count += self.write_object(seq[i])
+            self.maybe_flush()
             if i != last:
                 if indent is None:
                     count += self.extend_buffer(ARRAY_SEP_NO_INDENT, 2)
@@ -499,11 +997,121 @@ cdef class Writer:
 
         return count
 
+    cdef Py_ssize_t write_typed_array(self, object obj) except -1:
+        # Write the numbers straight from the buffer of an array.array or
+        # numpy.ndarray, formatted like write_array_from_tuple would format
+        # the same ints and floats. Return -2 without writing anything if the
+        # array isn't one-dimensional, C-contiguous, and made of (native)
+        # integers or floats.
+        cdef:
+            Py_buffer view
+            const char *fmt
+            char kind
+            char buf[32]
+            Py_ssize_t i, length, itemsize, count
+            const char *item
+            int64_t value
+            uint64_t uvalue
+            int n
+            vector[char] *dest = self.dest
+            unicode indent = self.indent, newline_indent = ""
+
+        try:
+            PyObject_GetBuffer(obj, &view, PyBUF_ND | PyBUF_FORMAT)
+        except BufferError:
+            return -2
+        try:
+            fmt = view.format
+            if fmt[0] == c'@' or fmt[0] == c'=':
+                fmt += 1
+            itemsize = view.itemsize
+            if (
+                view.ndim != 1
+                or fmt[0] == 0
+                or fmt[1] != 0
+                or memchr(b"bhilqnBHILQN?fd", fmt[0], 15) == NULL
+                or itemsize not in (1, 2, 4, 8)
+                or (fmt[0] == c'f' and itemsize != 4)
+                or (fmt[0] == c'd' and itemsize != 8)
+            ):
+                return -2
+            if fmt[0] == c'f' or fmt[0] == c'd':
+                kind = c'f'
+            elif memchr(b"bhilqn", fmt[0], 6) != NULL:
+                kind = c'i'
+            else:
+                kind = c'u'
+            length = view.shape[0]
+
+            if length == 0:
+                if self.single_line_empty_objects or indent is None:
+                    dest.push_back(c'(')
+                    dest.push_back(c')')
+                    return 2
+                newline_indent = '(\n' + self.current_indent_level * indent + ')'
+                return self.write_unquoted_string(newline_indent)
+
+            dest.push_back(c'(')
+            count = 1
+            if indent is not None and not self.single_line_tuples:
+                self.current_indent_level += 1
+                newline_indent = '\n' + self.current_indent_level * indent
+                count += self.write_unquoted_string(newline_indent)
+
+            item = <const char *>view.buf
+            for i in range(length):
+                if i:
+                    if indent is None:
+                        count += self.extend_buffer(ARRAY_SEP_NO_INDENT, 2)
+                    else:
+                        dest.push_back(c',')
+                        count += 1 + self.write_unquoted_string(newline_indent)
+                if kind == c'f':
+                    if itemsize == 4:
+                        count += self.write_short_float_repr((<const float *>item)[0])
+                    else:
+                        count += self.write_short_float_repr((<const double *>item)[0])
+                else:
+                    if kind == c'i':
+                        if itemsize == 1:
+                            value = (<const int8_t *>item)[0]
+                        elif itemsize == 2:
+                            value = (<const int16_t *>item)[0]
+                        elif itemsize == 4:
+                            value = (<const int32_t *>item)[0]
+                        else:
+                            value = (<const int64_t *>item)[0]
+                        n = snprintf(buf, sizeof(buf), "%lld", <long long>value)
+                    else:
+                        if itemsize == 1:
+                            uvalue = (<const uint8_t *>item)[0]
+                        elif itemsize == 2:
+                            uvalue = (<const uint16_t *>item)[0]
+                        elif itemsize == 4:
+                            uvalue = (<const uint32_t *>item)[0]
+                        else:
+                            uvalue = (<const uint64_t *>item)[0]
+                        n = snprintf(
+                            buf, sizeof(buf), "%llu", <unsigned long long>uvalue
+                        )
+                    count += self.extend_buffer(buf, n)
+                item += itemsize
+                self.maybe_flush()
+
+            if indent is not None and not self.single_line_tuples:
+                self.current_indent_level -= 1
+                newline_indent = '\n' + self.current_indent_level * indent
+                count += self.write_unquoted_string(newline_indent)
+            dest.push_back(c')')
+            return count + 1
+        finally:
+            PyBuffer_Release(&view)
+
     cdef Py_ssize_t write_dict(self, dict d) except -1:
         cdef:
             unicode indent
             unicode newline_indent = ""
-            vector[Py_UCS4] *dest = self.dest
+            vector[char] *dest = self.dest
             Py_ssize_t last, count, i
 
         indent = self.indent
@@ -532,11 +1140,12 @@ cdef class Writer:
         for i, (key, value) in enumerate(items):
             if not isinstance(key, unicode):
                 key = unicode(key)
-            count += self.write_string(key)
+            count += self.write_key(key)
 
             count += self.extend_buffer(DICT_KEY_VALUE_SEP, 3)
 
             count += self.write_object(value)
+            self.maybe_flush()
 
             if i != last:
                 if indent is None:
@@ -558,15 +1167,16 @@ cdef class Writer:
 
         return count
 
-    cdef Py_ssize_t write_ordered_dict(self, object d) except -1:
-        # This is the same as the write_dict method but doesn't sort the items.
-        # Also, in `write_dict`, the type of `d` is `dict` so it uses optimized
-        # C dict methods, whereas here is generic `object`, as OrderedDict does
-        # not have a C API (as far as I know).
+    cdef Py_ssize_t write_mapping(self, object d, bint sort_keys) except -1:
+        # This is the same as the write_dict method, for an OrderedDict (whose
+        # items are never sorted) or any other Mapping. In `write_dict`, the
+        # type of `d` is `dict` so it uses optimized C dict methods, whereas
+        # here is generic `object`, as OrderedDict does not have a C API (as
+        # far as I know).
         cdef:
             unicode indent
             unicode newline_indent = ""
-            vector[Py_UCS4] *dest = self.dest
+            vector[char] *dest = self.dest
             Py_ssize_t last, count, i
 
         indent = self.indent
@@ -589,15 +1199,18 @@ cdef class Writer:
             count += self.write_unquoted_string(newline_indent)
 
         last = len(d) - 1
-        # we don't sort OrderedDict
-        for i, (key, value) in enumerate(d.items()):
+        items = d.items()
+        if sort_keys:
+            items = sorted(items)
+        for i, (key, value) in enumerate(items):
             if not isinstance(key, unicode):
                 key = unicode(key)
-            count += self.write_string(key)
+            count += self.write_key(key)
 
             count += self.extend_buffer(DICT_KEY_VALUE_SEP, 3)
 
             count += self.write_object(value)
+            self.maybe_flush()
 
             if i != last:
                 if indent is None:
@@ -620,10 +1233,304 @@ cdef class Writer:
         return count
 
 
+# reformat() streams the parsed tokens to a Writer: the containers are opened
+# and closed as they are parsed, and only the scalar values are made into
+# objects, one at a time, to be written like dumps() would.
+
+cdef Py_ssize_t write_scalar(
+    Writer w, ParseInfo *pi, object value, Py_UCS4 first
+) except -1:
+    # Write the value parsed from a token starting with 'first'. Without
+    # use_numbers, the unquoted strings are copied verbatim, even those that
+    # dumps would quote (like 0041, 1.10 or a-b), so that they still read
+    # back as numbers with use_numbers. The quoted ones are written like
+    # dumps writes them, which keeps the quotes of those that would read
+    # back as numbers (like "1" or "-1").
+    if pi.use_numbers or not isinstance(value, unicode):
+        return w.write_object(value)
+    if is_valid_unquoted_string_char(first):
+        return w.write_unquoted_string(value)
+    return w.write_string(value)
+
+
+cdef Py_ssize_t reformat_array(Writer w, ParseInfo *pi) except -1:
+    # like parse_plist_array, after the opening '('
+    cdef Py_ssize_t count = 0
+    w.begin_container(CONTAINER_ARRAY)
+    while reformat_object(w, pi, required=False):
+        count += 1
+        if not advance_to_non_space(pi):
+            raise ParseError(
+                "Missing ',' for array at line %d" % line_number_strings(pi)
+            )
+        if pi.curr[0] != c',':
+            break
+        pi.curr += 1
+    if not advance_to_non_space(pi) or pi.curr[0] != c')':
+        raise ParseError(
+            "Expected terminating ')' for array at line %d"
+            % line_number_strings(pi)
+        )
+    pi.curr += 1
+    w.end_container()
+    return count
+
+
+cdef Py_ssize_t reformat_dict_content(Writer w, ParseInfo *pi) except -1:
+    # like parse_plist_dict_content; keys that are repeated are all written
+    cdef Py_ssize_t count = 0
+    cdef unicode key
+    w.begin_container(CONTAINER_SORTED_DICT if w.sort_keys else CONTAINER_DICT)
+    key = parse_plist_string(pi, required=False)
+    while key is not None:
+        if not advance_to_non_space(pi):
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+        if pi.curr[0] == c';':
+            # the 'strings resource' shortcut: the value is the key itself
+            w.begin_key(key)
+            w.begin_value()
+            w.write_object(key)
+            w.end_value()
+        elif pi.curr[0] == c'=':
+            pi.curr += 1
+            w.begin_key(key)
+            reformat_object(w, pi, required=True)
+        else:
+            raise ParseError(
+                "Unexpected character after key at line %d: %r"
+                % (line_number_strings(pi), current_char(pi))
+            )
+        count += 1
+        if not advance_to_non_space(pi) or pi.curr[0] != c';':
+            raise ParseError("Missing ';' on line %d" % line_number_strings(pi))
+        pi.curr += 1
+        key = parse_plist_string(pi, required=False)
+    w.end_container()
+    return count
+
+
+cdef Py_ssize_t reformat_dict(Writer w, ParseInfo *pi) except -1:
+    # like parse_plist_dict, after the opening '{'
+    cdef Py_ssize_t count = reformat_dict_content(w, pi)
+    if not advance_to_non_space(pi) or pi.curr[0] != c'}':
+        raise ParseError(
+            "Expected terminating '}' for dictionary at line %d"
+            % line_number_strings(pi)
+        )
+    pi.curr += 1
+    return count
+
+
+cdef bint reformat_object(Writer w, ParseInfo *pi, bint required) except -1:
+    # like parse_plist_object: return False if there's no value (and it isn't
+    # required)
+    cdef Py_UCS4 ch
+    if not advance_to_non_space(pi):
+        if required:
+            raise ParseError("Unexpected EOF while parsing plist")
+        return False
+    ch = pi.curr[0]
+    if ch == c'{':
+        pi.curr += 1
+        reformat_dict(w, pi)
+    elif ch == c'(':
+        pi.curr += 1
+        reformat_array(w, pi)
+    else:
+        value = parse_plist_object(pi, required)
+        if value is None:
+            return False
+        w.begin_value()
+        write_scalar(w, pi, value, ch)
+        w.end_value()
+    return True
+
+
+cdef int reformat_document(Writer w, ParseInfo *pi) except -1:
+    # like parse_plist_document
+    cdef Py_UCS4 ch
+    cdef Py_ssize_t count
+    begin = pi.curr
+    if not advance_to_non_space(pi):
+        # an empty document is an empty dictionary
+        reformat_dict_content(w, pi)
+        return 0
+    ch = pi.curr[0]
+    if ch == c'{' or ch == c'(':
+        pi.curr += 1
+        count = reformat_dict(w, pi) if ch == c'{' else reformat_array(w, pi)
+        if count and advance_to_non_space(pi):
+            raise ParseError(
+                "Junk after plist at line %d" % line_number_strings(pi)
+            )
+        return 0
+    ch = pi.curr[0]
+    value = parse_plist_object(pi, required=True)
+    if value and advance_to_non_space(pi):
+        if not isinstance(value, unicode):
+            raise ParseError(
+                "Junk after plist at line %d" % line_number_strings(pi)
+            )
+        # a 'strings resource' file: a dictionary without the braces, whose
+        # first key was parsed as the value
+        pi.curr = begin
+        reformat_dict_content(w, pi)
+        return 0
+    write_scalar(w, pi, value, ch)
+    return 0
+
+
+cdef int reformat_unicode(Writer w, unicode s, bint use_numbers) except -1:
+    # parse the string's own storage, according to its PEP 393 kind
+    cdef Py_ssize_t length = PyUnicode_GET_LENGTH(s)
+    cdef int kind = PyUnicode_KIND(s)
+    cdef const void *data = PyUnicode_DATA(s)
+    cdef ParseInfoUCS1 pi1
+    cdef ParseInfoUCS2 pi2
+    cdef ParseInfoUCS4 pi4
+
+    if kind == PyUnicode_1BYTE_KIND:
+        pi1 = ParseInfoUCS1(
+            begin=<const uint8_t *>data,
+            curr=<const uint8_t *>data,
+            end=<const uint8_t *>data + length,
+            dict_type=NULL,
+            strings=NULL,
+            hooks=NULL,
+            use_numbers=use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
+        )
+        return reformat_document(w, &pi1)
+    elif kind == PyUnicode_2BYTE_KIND:
+        pi2 = ParseInfoUCS2(
+            begin=<const uint16_t *>data,
+            curr=<const uint16_t *>data,
+            end=<const uint16_t *>data + length,
+            dict_type=NULL,
+            strings=NULL,
+            hooks=NULL,
+            use_numbers=use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
+        )
+        return reformat_document(w, &pi2)
+    else:
+        pi4 = ParseInfoUCS4(
+            begin=<const Py_UCS4 *>data,
+            curr=<const Py_UCS4 *>data,
+            end=<const Py_UCS4 *>data + length,
+            dict_type=NULL,
+            strings=NULL,
+            hooks=NULL,
+            use_numbers=use_numbers,
+            typed_arrays=TYPED_ARRAYS_NONE,
+            line_offset=0,
+        )
+        return reformat_document(w, &pi4)
+
+
+cdef int reformat_buffer(
+    Writer w, object obj, bint use_numbers, bint utf8
+) except -1:
+    cdef Py_buffer view
+    cdef const uint8_t *buf
+    cdef ParseInfoUCS1 pi1
+    cdef ParseInfoUTF8 pi8
+
+    PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE)
+    try:
+        buf = <const uint8_t *>view.buf
+        if utf8:
+            # skip the UTF-8 byte order mark, if any
+            if (
+                view.len >= 3
+                and buf[0] == 0xEF and buf[1] == 0xBB and buf[2] == 0xBF
+            ):
+                buf += 3
+            pi8 = ParseInfoUTF8(
+                begin=buf,
+                curr=buf,
+                end=<const uint8_t *>view.buf + view.len,
+                dict_type=NULL,
+                strings=NULL,
+                hooks=NULL,
+                use_numbers=use_numbers,
+                typed_arrays=TYPED_ARRAYS_NONE,
+                line_offset=0,
+            )
+            return reformat_document(w, &pi8)
+        else:
+            pi1 = ParseInfoUCS1(
+                begin=buf,
+                curr=buf,
+                end=buf + view.len,
+                dict_type=NULL,
+                strings=NULL,
+                hooks=NULL,
+                use_numbers=use_numbers,
+                typed_arrays=TYPED_ARRAYS_NONE,
+                line_offset=0,
+            )
+            return reformat_document(w, &pi1)
+    finally:
+        PyBuffer_Release(&view)
+
+
+def reformat(data, fp=None, *, bint use_numbers=False, encoding="utf-8",
+             bint unicode_escape=True, int float_precision=6, indent=None,
+             bint escape_newlines=True, bint sort_keys=True,
+             bint single_line_empty_objects=True, bint binary_spaces=True,
+             bint shortest_float_repr=False,
+             Py_ssize_t buffer_size=DEFAULT_BUFFER_SIZE):
+    """Rewrite an OpenStep plist (a str or a bytes-like object, like for
+    loads) in the formatting of dumps, in a single pass, without building
+    the dicts and lists.
+
+    The result is the same as dumps(loads(data, use_numbers=use_numbers))
+    with the given formatting options, except that a repeated key is written
+    again rather than replacing the previous value, and that with the default
+    use_numbers=False the unquoted strings are copied verbatim, where dumps
+    would quote those that look like numbers or contain characters like '-'
+    or '/': e.g. (1, 2.5, a-b) stays as it is rather than becoming
+    ("1", "2.5", "a-b"). That way nothing is lost, and the output reads back
+    the same with or without use_numbers. With use_numbers=True, the numbers
+    are rewritten like dumps writes them.
+
+    If 'fp' is a file object, the output is written to it (flushed whenever
+    it grows past 'buffer_size' bytes, except while a dict with sorted keys
+    is open) and None is returned; otherwise it's returned as a str.
+    """
+    cdef Writer w = Writer(
+        unicode_escape=unicode_escape,
+        float_precision=float_precision,
+        indent=indent,
+        escape_newlines=escape_newlines,
+        sort_keys=sort_keys,
+        single_line_empty_objects=single_line_empty_objects,
+        binary_spaces=binary_spaces,
+        shortest_float_repr=shortest_float_repr,
+        file=fp,
+        buffer_size=buffer_size,
+    )
+    if isinstance(data, unicode):
+        reformat_unicode(w, tounicode(data), use_numbers)
+    elif PyObject_CheckBuffer(data):
+        reformat_buffer(w, data, use_numbers, is_utf8_encoding(encoding))
+    else:
+        raise TypeError(
+            f"Expected str or bytes-like object, got {type(data).__name__}"
+        )
+    if fp is None:
+        return w._getvalue()
+    w._flush()
+
+
 def dumps(obj, bint unicode_escape=True, int float_precision=6, indent=None,
           bint single_line_tuples=False, bint escape_newlines=True,
           bint sort_keys=True, bint single_line_empty_objects=True,
-          bint binary_spaces=True):
+          bint binary_spaces=True, bint shortest_float_repr=False,
+          default=None):
     w = Writer(
         unicode_escape=unicode_escape,
         float_precision=float_precision,
@@ -633,6 +1540,8 @@ def dumps(obj, bint unicode_escape=True, int float_precision=6, indent=None,
         sort_keys=sort_keys,
         single_line_empty_objects=single_line_empty_objects,
         binary_spaces=binary_spaces,
+        shortest_float_repr=shortest_float_repr,
+        default=default,
     )
     w.write(obj)
     return w.getvalue()
@@ -641,7 +1550,39 @@ def dumps(obj, bint unicode_escape=True, int float_precision=6, indent=None,
 def dump(obj, fp, bint unicode_escape=True, int float_precision=6, indent=None,
          bint single_line_tuples=False, bint escape_newlines=True,
          bint sort_keys=True, bint single_line_empty_objects=True,
-         bint binary_spaces=True):
+         bint binary_spaces=True, bint shortest_float_repr=False,
+         default=None, Py_ssize_t buffer_size=DEFAULT_BUFFER_SIZE):
+    """Serialize obj to the file object fp, which may be opened in text or
+    binary mode (in the latter case the output is UTF-8).
+
+    The output is written out in chunks, whenever more than 'buffer_size'
+    bytes of it are buffered, so that the memory use doesn't grow with the
+    size of the document.
+    """
+    w = Writer(
+        unicode_escape=unicode_escape,
+        float_precision=float_precision,
+        indent=indent,
+        single_line_tuples=single_line_tuples,
+        escape_newlines=escape_newlines,
+        sort_keys=sort_keys,
+        single_line_empty_objects=single_line_empty_objects,
+        binary_spaces=binary_spaces,
+        shortest_float_repr=shortest_float_repr,
+        default=default,
+        file=fp,
+        buffer_size=buffer_size,
+    )
+    w.write(obj)
+    w.flush()
+
+
+def dumps_bytes(obj, bint unicode_escape=True, int float_precision=6, indent=None,
+                bint single_line_tuples=False, bint escape_newlines=True,
+                bint sort_keys=True, bint single_line_empty_objects=True,
+                bint binary_spaces=True, bint shortest_float_repr=False,
+                default=None):
+    """Like dumps, but return the output as UTF-8 encoded bytes."""
     w = Writer(
         unicode_escape=unicode_escape,
         float_precision=float_precision,
@@ -651,6 +1592,8 @@ def dump(obj, fp, bint unicode_escape=True, int float_precision=6, indent=None,
         sort_keys=sort_keys,
         single_line_empty_objects=single_line_empty_objects,
         binary_spaces=binary_spaces,
+        shortest_float_repr=shortest_float_repr,
+        default=default,
     )
     w.write(obj)
-    w.dump(fp)
+    return w._getvalue_bytes()
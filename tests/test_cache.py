@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import os
+import openstep_plist
+from openstep_plist import cache
+from openstep_plist.cache import CacheDict, CacheList
+from io import BytesIO
+from collections import OrderedDict
+from array import array
+import pytest
+
+
+DOCUMENT = """{
+familyName = "Test Family";
+versionMajor = 1;
+glyphs = (
+{
+glyphname = A;
+unicode = 0041;
+layers = ({width = 600; anchors = ({name = top; position = "{300, 700}";});});
+},
+{
+glyphname = "\\U00E9";
+unicode = 00E9;
+note = <00FF>;
+}
+);
+}"""
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "",
+        "abc",
+        "é€\U0001F600",
+        "\ud800",
+        0,
+        -1,
+        2**59 - 1,
+        -(2**59),
+        2**59,
+        -(2**59) - 1,
+        2**63 - 1,
+        -(2**63),
+        2**100,
+        -(2**100),
+        0.0,
+        -1.5,
+        1e300,
+        True,
+        False,
+        b"",
+        b"\x00\xff",
+        [],
+        {},
+        ["a", ["b", {"c": "a"}], "a"],
+        {"a": {"b": [1, 2.5, b"\x01"]}, "c": "a"},
+        array("q", [1, -2, 2**62]),
+        array("d", [0.5, -1.0]),
+        array("B", []),
+    ],
+)
+def test_round_trip(value):
+    data = cache.dumps(value)
+    result = cache.loads(data)
+    assert result == value
+    assert type(result) is type(value)
+    assert cache.loads(bytearray(data)) == value
+    assert cache.loads(memoryview(data)) == value
+
+
+def test_round_trip_parsed():
+    for kwargs in (
+        {},
+        {"use_numbers": True},
+        {"use_numbers": True, "typed_arrays": True},
+    ):
+        tree = openstep_plist.loads(DOCUMENT, **kwargs)
+        assert cache.loads(cache.dumps(tree)) == tree
+
+
+def test_strings_are_shared():
+    data = cache.dumps({"abc": ["abc", "abc"]})
+    assert data.count(b"abc") == 1
+    result = cache.loads(data)
+    assert result["abc"][0] is result["abc"][1]
+
+
+def test_converted_values():
+    assert cache.loads(cache.dumps((1, (2,)))) == [1, [2]]
+    value = cache.loads(cache.dumps(OrderedDict(b=1, a=2)))
+    assert type(value) is dict
+    assert list(value) == ["b", "a"]
+    value = cache.loads(cache.dumps([bytearray(b"a"), memoryview(b"b")]))
+    assert value == [b"a", b"b"]
+
+
+def test_dict_type():
+    result = cache.loads(
+        cache.dumps({"a": {"b": "c"}, "d": [{}]}), dict_type=OrderedDict
+    )
+    assert type(result) is OrderedDict
+    assert type(result["a"]) is OrderedDict
+    assert type(result["d"][0]) is OrderedDict
+
+
+def test_numpy_arrays():
+    numpy = pytest.importorskip("numpy")
+    value = [numpy.array([1, 2], dtype=numpy.int64), numpy.array([[0.5]])]
+    assert cache.loads(cache.dumps(value)) == [array("q", [1, 2]), [[0.5]]]
+
+
+def test_dump_load():
+    tree = openstep_plist.loads(DOCUMENT)
+    fp = BytesIO()
+    cache.dump(tree, fp)
+    fp.seek(0)
+    assert cache.load(fp) == tree
+
+
+def test_lazy():
+    tree = openstep_plist.loads(DOCUMENT, use_numbers=True)
+    result = cache.loads(cache.dumps(tree), lazy=True)
+    assert isinstance(result, CacheDict)
+    assert len(result) == 3
+    assert list(result) == ["familyName", "versionMajor", "glyphs"]
+    assert "glyphs" in result and "missing" not in result
+    assert repr(result) == "<CacheDict with 3 keys>"
+    glyphs = result["glyphs"]
+    assert glyphs is result["glyphs"]
+    assert isinstance(glyphs, CacheList)
+    assert repr(glyphs) == "<CacheList with 2 items>"
+    assert glyphs[-1]["glyphname"] == "é"
+    assert glyphs[0]["layers"][0]["anchors"][0]["name"] == "top"
+    assert glyphs[:1] == [glyphs[0]]
+    assert glyphs == tree["glyphs"]
+    assert result == tree
+    assert result.get("versionMajor") == 1
+    with pytest.raises(IndexError):
+        glyphs[2]
+    with pytest.raises(KeyError):
+        result["missing"]
+    with pytest.raises(TypeError):
+        result["familyName"] = "Other"
+    assert cache.loads(cache.dumps("abc"), lazy=True) == "abc"
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        (None, "Object of type NoneType is not supported"),
+        ({"a": object()}, "Object of type object is not supported"),
+        ({1: "a"}, "dict keys must be str, not int"),
+    ],
+)
+def test_dumps_unsupported(value, message):
+    with pytest.raises(TypeError, match=message):
+        cache.dumps(value)
+
+
+def test_loads_invalid():
+    data = cache.dumps({"a": ["b", 1.5, b"c"]})
+    with pytest.raises(ValueError, match="not a cache file"):
+        cache.loads(b"{a = b;}" * 20)
+    with pytest.raises(ValueError, match="truncated file"):
+        cache.loads(data[:-8])
+    with pytest.raises(ValueError, match="unsupported version"):
+        cache.loads(data[:8] + b"\xff" + data[9:])
+    with pytest.raises(TypeError):
+        cache.loads("abc")
+    # any corruption is reported as an error, never read out of bounds
+    for i in range(cache.HEADER.size, len(data)):
+        corrupted = bytearray(data)
+        corrupted[i] ^= 0xFF
+        try:
+            cache.loads(bytes(corrupted))
+        except ValueError:
+            pass
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "test.glyphs"
+    path.write_text(DOCUMENT, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def parse_count(monkeypatch):
+    count = [0]
+    load_path = openstep_plist.parser.load_path
+
+    def counting_load_path(*args, **kwargs):
+        count[0] += 1
+        return load_path(*args, **kwargs)
+
+    monkeypatch.setattr(openstep_plist.parser, "load_path", counting_load_path)
+    return count
+
+
+def test_load_cached(source, parse_count):
+    expected = openstep_plist.load_path(source)
+    assert cache.load_cached(source) == expected
+    assert parse_count[0] == 1
+    assert os.path.exists(str(source) + ".cache")
+    assert cache.load_cached(source) == expected
+    assert cache.load_cached(str(source)) == expected
+    assert parse_count[0] == 1
+
+    # touched without changing the content: the cache is still valid
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load_cached(source) == expected
+    assert parse_count[0] == 1
+    assert cache.load_cached(source) == expected
+    assert parse_count[0] == 1
+
+    # changed content with the same size
+    source.write_text(DOCUMENT.replace("Test", "Best"), encoding="utf-8")
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    assert cache.load_cached(source)["familyName"] == "Best Family"
+    assert parse_count[0] == 2
+
+
+def test_load_cached_options(source, parse_count):
+    assert cache.load_cached(source)["versionMajor"] == "1"
+    assert cache.load_cached(source, use_numbers=True)["versionMajor"] == 1
+    assert cache.load_cached(source, use_numbers=True)["versionMajor"] == 1
+    assert parse_count[0] == 2
+    result = cache.load_cached(source, dict_type=OrderedDict)
+    assert type(result) is OrderedDict
+    assert parse_count[0] == 3
+    # the dict_type isn't saved in the cache
+    result = cache.load_cached(source, dict_type=OrderedDict)
+    assert type(result) is OrderedDict
+    assert parse_count[0] == 3
+
+
+def test_load_cached_lazy(source, parse_count):
+    expected = openstep_plist.load_path(source)
+    for _ in range(2):
+        result = cache.load_cached(source, lazy=True)
+        assert isinstance(result, CacheDict)
+        assert result["glyphs"][1]["note"] == b"\x00\xff"
+        assert result == expected
+    assert parse_count[0] == 1
+
+
+def test_load_cached_path(source, tmp_path, parse_count):
+    cache_path = tmp_path / "cache" / "test.bin"
+    expected = openstep_plist.load_path(source)
+    # failing to write the cache isn't an error
+    assert cache.load_cached(source, cache_path=cache_path) == expected
+    assert not cache_path.exists()
+    cache_path.parent.mkdir()
+    assert cache.load_cached(source, cache_path=cache_path) == expected
+    assert cache.load_cached(source, cache_path=cache_path) == expected
+    assert parse_count[0] == 2
+    # a corrupted cache is replaced
+    cache_path.write_bytes(b"garbage")
+    assert cache.load_cached(source, cache_path=cache_path) == expected
+    assert parse_count[0] == 3
+    assert cache.loads(cache_path.read_bytes()) == expected
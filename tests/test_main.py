@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import json
+import os
+import openstep_plist
+from openstep_plist.__main__ import main, expand_paths, process_file
+import pytest
+
+
+DOCUMENT = """{
+glyphs = (
+{
+glyphname = A;
+unicode = 0041;
+layers = ({width = 600; anchors = ({name = top; position = "{300, 700}";});});
+}
+);
+familyName = "Test Family";
+versionMajor = 1;
+}"""
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "sub").mkdir()
+    paths = [
+        tmp_path / "a.glyphs",
+        tmp_path / "b.glyphs",
+        tmp_path / "sub" / "c.glyphs",
+    ]
+    for path in paths:
+        path.write_text(DOCUMENT, encoding="utf-8")
+    return paths
+
+
+def test_expand_paths(tmp_path, files):
+    pattern = str(tmp_path / "**" / "*.glyphs")
+    assert expand_paths([pattern]) == sorted(str(p) for p in files)
+    missing = str(tmp_path / "missing.glyphs")
+    assert expand_paths([str(files[1]), missing, str(files[1])]) == [
+        str(files[1]),
+        missing,
+    ]
+    unmatched = []
+    assert expand_paths([str(tmp_path / "*.plist"), pattern], unmatched) == sorted(
+        str(p) for p in files
+    )
+    assert unmatched == [str(tmp_path / "*.plist")]
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_in_place(tmp_path, files, jobs):
+    expected = openstep_plist.reformat(DOCUMENT, indent=2)
+    assert main(["--in-place", "-J", jobs, str(tmp_path / "**" / "*.glyphs")]) == 0
+    for path in files:
+        assert path.read_text(encoding="utf-8") == expected
+        # nothing is lost, with or without use_numbers
+        for use_numbers in (False, True):
+            assert openstep_plist.loads(
+                expected, use_numbers=use_numbers
+            ) == openstep_plist.loads(DOCUMENT, use_numbers=use_numbers)
+
+
+def test_in_place_lossless(tmp_path):
+    path = tmp_path / "test.plist"
+    path.write_text(
+        '{v = 1.10; a = 0.1234567; u = 0041; q = "-1"; n = 007; s = "x y";}',
+        encoding="utf-8",
+    )
+    assert main(["--in-place", "-i", "0", str(path)]) == 0
+    assert path.read_text(encoding="utf-8") == (
+        '{\na = 0.1234567;\nn = 007;\nq = "-1";\ns = "x y";\nu = 0041;\nv = 1.10;\n}'
+    )
+
+
+def test_in_place_unchanged(files):
+    result = process_file(str(files[0]), "in-place")
+    assert result.changed and result.error is None
+    mtime = os.stat(files[0]).st_mtime_ns
+    result = process_file(str(files[0]), "in-place")
+    assert not result.changed
+    assert os.stat(files[0]).st_mtime_ns == mtime
+
+
+def test_check(tmp_path, files, capsys):
+    assert main(["--check", str(tmp_path / "*.glyphs")]) == 0
+    files[1].write_text("{a = 1", encoding="utf-8")
+    assert main(["--check", "-J", "2"] + [str(p) for p in files]) == 1
+    assert capsys.readouterr().err == "%s: Missing ';' on line 1\n" % files[1]
+    # the files are left as they were
+    assert files[0].read_text(encoding="utf-8") == DOCUMENT
+
+
+def test_missing_files(tmp_path, capsys):
+    assert main(["--check", str(tmp_path / "*.glyphs")]) == 1
+    assert "No files match" in capsys.readouterr().err
+    # every pattern must match, or nothing is processed
+    (tmp_path / "a.glyphs").write_text("{a = 1", encoding="utf-8")
+    typo = str(tmp_path / "*.glyph")
+    assert main(["--check", typo, str(tmp_path / "*.glyphs")]) == 1
+    assert capsys.readouterr().err == "No files match %s\n" % typo
+    missing = tmp_path / "missing.glyphs"
+    assert main(["--check", str(missing)]) == 1
+    assert str(missing) in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_json_out(tmp_path, files, jobs):
+    (tmp_path / "a.json").write_text("[]", encoding="utf-8")
+    out_dir = tmp_path / "out"
+    pattern = str(tmp_path / "**" / "*.glyphs")
+    assert main(["--json-out", str(out_dir), "-J", jobs, pattern]) == 0
+    for name in ("a.json", "b.json", os.path.join("sub", "c.json")):
+        result = json.loads((out_dir / name).read_text(encoding="utf-8"))
+        assert result == openstep_plist.loads(DOCUMENT, use_numbers=True)
+    # the inputs and their directory are left alone
+    assert files[0].read_text(encoding="utf-8") == DOCUMENT
+    assert (tmp_path / "a.json").read_text(encoding="utf-8") == "[]"
+
+
+def test_stats(tmp_path, files, capsys):
+    assert main(["--check", "--stats"] + [str(p) for p in files]) == 0
+    lines = capsys.readouterr().err.splitlines()
+    assert len(lines) == 4
+    assert lines[0].startswith("%s: 0.00 MB in " % files[0])
+    assert "MB/s" in lines[0] and "objects/s" in lines[0]
+    assert lines[-1].startswith("total (3 files): ")
+    result = process_file(str(files[0]), "check")
+    scanned = openstep_plist.scan(DOCUMENT)
+    assert result.objects == scanned.dicts + scanned.arrays + scanned.strings
+    assert result.size == len(DOCUMENT)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--check", "--in-place"],
+        ["--check", "-j"],
+        ["--in-place", "-j"],
+        ["--in-place", "--json-out", "out"],
+        ["--jobs", "-1"],
+        ["-g", "--check"],
+        ["--stats"],
+        ["--jobs", "2"],
+    ],
+)
+def test_invalid_arguments(files, args, capsys):
+    with pytest.raises(SystemExit):
+        main(args + [str(files[0])])
+
+
+def test_positional_arguments(tmp_path, files, capsys):
+    # without --check or --in-place, the arguments are INFILE [OUTFILE]
+    with pytest.raises(SystemExit):
+        main([str(p) for p in files])
+    assert "several input files need" in capsys.readouterr().err
+    # the second argument is the output file, overwritten like before
+    existing = tmp_path / "out.plist"
+    existing.write_text(DOCUMENT, encoding="utf-8")
+    for out in (existing, tmp_path / "out.json"):
+        for _ in range(2):
+            assert main(["-j", str(files[0]), str(out)]) == 0
+        result = json.loads(out.read_text(encoding="utf-8"))
+        assert result["familyName"] == "Test Family"
+    # a glob pattern is only expanded for a batch
+    assert main(["--check", str(tmp_path / "*.glyphs")]) == 0
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
+import re
 import sys
+from array import array
 from io import StringIO, BytesIO
 from collections import OrderedDict
+from collections.abc import Mapping, Sequence
 from openstep_plist._test import (
     line_number_strings,
     is_valid_unquoted_string_char,
@@ -237,10 +240,21 @@ def test_parse_plist_dict_invalid():
         ("<AA BB>", b"\xaa\xbb"),
         ("<cdef>", b"\xcd\xef"),
         ("<4142\n4344>", b"ABCD"),
+        ("<>", b""),
+        ("< 01\t23 >", b"\x01\x23"),
     ],
 )
 def test_parse_plist_data(string, expected):
     assert openstep_plist.loads(string) == expected
+    assert openstep_plist.loads(string.encode()) == expected
+    assert openstep_plist.loads(string + "/*\u0410*/") == expected
+
+
+def test_parse_plist_data_large():
+    data = bytes(range(256)) * 64
+    string = openstep_plist.dumps(data)
+    assert openstep_plist.loads(string) == data
+    assert openstep_plist.loads(string.replace(" ", "")) == data
 
 
 def test_parse_plist_data_invalid():
@@ -252,6 +266,10 @@ def test_parse_plist_data_invalid():
         openstep_plist.loads("<Z")
     with pytest.raises(openstep_plist.ParseError, match=msg):
         openstep_plist.loads("<AZ")
+    # not ASCII digits, even though their low byte is
+    msg = "Malformed data byte group at line 1: invalid hex digit: u?'\u0131'"
+    with pytest.raises(openstep_plist.ParseError, match=msg):
+        openstep_plist.loads("<\u0131\u0131>")
 
     msg = "Malformed data byte group at line 1: uneven length"
     with pytest.raises(openstep_plist.ParseError, match=msg):
@@ -284,12 +302,121 @@ def test_load():
     assert openstep_plist.load(fp) == {"a": "1"}
 
 
-def test_load_from_bytes():
-    if sys.version_info.major < 3:
-        assert openstep_plist.loads(b"{a=1;}") == {"a": "1"}
-    else:
-        with pytest.raises(TypeError, match="Could not convert to unicode"):
-            openstep_plist.loads(b"{a=1;}")
+def test_load_binary_file():
+    fp = BytesIO("{a=1; b = \"\u00e8\";}".encode("utf-8"))
+    assert openstep_plist.load(fp) == {"a": "1", "b": "\u00e8"}
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_load_path(tmp_path, encoding):
+    path = tmp_path / "test.plist"
+    path.write_bytes("{a = (1, 2); \"\u00e8\" = <AABB>;}".encode(encoding))
+    expected = {"a": [1, 2], "\u00e8": b"\xaa\xbb"}
+    assert openstep_plist.load_path(path, use_numbers=True, encoding=encoding) == expected
+    assert openstep_plist.load_path(str(path), use_numbers=True, encoding=encoding) == expected
+
+
+def test_load_path_empty(tmp_path):
+    path = tmp_path / "empty.plist"
+    path.write_bytes(b"")
+    assert openstep_plist.load_path(path) == {}
+
+
+def test_load_path_error(tmp_path):
+    path = tmp_path / "invalid.plist"
+    path.write_bytes(b"{a = 1;\nb = ")
+    with pytest.raises(openstep_plist.ParseError, match="Unexpected EOF"):
+        openstep_plist.load_path(path)
+
+
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_loads_from_bytes(buffer_type):
+    assert openstep_plist.loads(buffer_type(b"{a=1;}")) == {"a": "1"}
+
+
+@pytest.mark.parametrize(
+    "string",
+    [
+        "{a = (1, 2.5, <AABB>); b = c;}",
+        "{\"\u00e8\" = \"\u00e0 la carte\"; b = '\u0410\\n\u0411';}",
+        "{emoji = \"\U0001F4A9 \\UD83D\\UDCA9\";}",
+        "(\"\\\u00e8\", \"x\\012\u20ac\")",
+        "{a\u2028=\u2029b; // comment\u2028c = <AA\u2028BB>;}",
+        "a=1;\n'b' = \"\u00fc\";",
+    ],
+)
+def test_loads_utf8(string):
+    expected = openstep_plist.loads(string)
+    assert openstep_plist.loads(string.encode("utf-8")) == expected
+
+
+def test_loads_string_kinds():
+    # each string has the narrowest kind for its characters, whichever the
+    # kind of the input and whether it has escapes: the strings of another
+    # kind wouldn't compare equal
+    expected = [
+        "abc", "a\n", "\u00e9", "\u00e9\n", "\u0410", "\u0410\n",
+        "\U0001F600", "\U0001F600\n", "\n\u00e9", "\n\u0410",
+    ]
+    string = "(abc, \"a\\n\", \"\u00e9\", \"\\U00e9\\n\", \"\u0410\", " \
+        "\"\\U0410\\n\", \"\U0001F600\", \"\\UD83D\\UDE00\\n\", " \
+        "\"\\n\u00e9\", \"\\n\u0410\")"
+    for padding in ("", "\u00ff", "\uffff", "\U0010FFFF"):
+        document = string + "/*%s*/" % padding
+        assert openstep_plist.loads(document) == expected
+        assert openstep_plist.loads(document.encode("utf-8")) == expected
+
+
+def test_loads_utf8_bom():
+    assert openstep_plist.loads(b"\xef\xbb\xbf{a=1;}") == {"a": "1"}
+
+
+def test_loads_latin1():
+    data = "{\"\u00e8\" = \"\u00ff\\n\";}".encode("latin-1")
+    assert openstep_plist.loads(data, encoding="latin-1") == {"\u00e8": "\u00ff\n"}
+    assert openstep_plist.loads(data, encoding="iso-8859-1") == {"\u00e8": "\u00ff\n"}
+
+
+def test_loads_invalid_utf8():
+    msg = "Invalid UTF-8 byte sequence in string at line 2"
+    with pytest.raises(openstep_plist.ParseError, match=msg):
+        openstep_plist.loads(b"{a=1;\nb=\"\xe8\";}")
+    with pytest.raises(openstep_plist.ParseError, match=msg):
+        openstep_plist.loads(b"{a=1;\nb=\"\\n\xe8\";}")
+
+
+def test_loads_utf8_error_char():
+    msg = "Unexpected character at line 1: '\u00e8'"
+    with pytest.raises(openstep_plist.ParseError, match=msg):
+        openstep_plist.loads("{a = \u00e8;}".encode("utf-8"))
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        # 1-byte kind (Latin-1)
+        ("{a = \"\u00e8\\n\"; b = (1, <AA>);}", {"a": "\u00e8\n", "b": ["1", b"\xaa"]}),
+        # 2-byte kind
+        ("{\"\u0410\" = \"\u0411\\U0412\"; b = c;}", {"\u0410": "\u0411\u0412", "b": "c"}),
+        ("{a\u2028=\u2029b; c = <AA\u2028BB>;}", {"a": "b", "c": b"\xaa\xbb"}),
+        # 4-byte kind
+        ("{a = \"\U0001F4A9\\UD83D\\UDCA9\"; b = (x, y);}", {"a": "\U0001F4A9" * 2, "b": ["x", "y"]}),
+    ],
+)
+def test_loads_unicode_kinds(string, expected):
+    assert openstep_plist.loads(string) == expected
+
+
+def test_loads_unsupported_encoding():
+    with pytest.raises(ValueError, match="Unsupported encoding"):
+        openstep_plist.loads(b"{a=1;}", encoding="utf-16")
+    with pytest.raises(LookupError):
+        openstep_plist.loads(b"{a=1;}", encoding="foobar")
+
+
+def test_loads_type_error():
+    with pytest.raises(TypeError, match="Expected str or bytes-like object"):
+        openstep_plist.loads(123)
 
 
 @pytest.mark.parametrize(
@@ -299,10 +426,24 @@ def test_load_from_bytes():
         ("{a = {b = -2;};}", {"a": {"b": -2}}),
         ("{a = (1.5, -23.9999);}", {"a": [1.5, -23.9999]}),
         ("{a = x123; b = -c; minus = -;}", {"a": "x123", "b": "-c", "minus": "-"}),
+        ("(007, -0, 1., 0.1, -0.0)", [7, 0, 1.0, 0.1, -0.0]),
+        (
+            "(123456789012345678, 12345678901234567890, -98765432109876543210)",
+            [123456789012345678, 12345678901234567890, -98765432109876543210],
+        ),
+        (
+            "(0.1234567890123456789, 1234567890.12345678, %s.5)" % ("9" * 400),
+            [0.1234567890123456789, 1234567890.12345678, float("inf")],
+        ),
     ],
 )
-def test_loads_use_numbers(string, expected):
-    assert openstep_plist.loads(string, use_numbers=True) == expected
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_use_numbers(string, expected, encode):
+    if encode:
+        string = string.encode("utf-8")
+    result = openstep_plist.loads(string, use_numbers=True)
+    assert result == expected
+    assert [type(x) for x in result] == [type(x) for x in expected]
 
 
 def test_loads_dict_type():
@@ -313,10 +454,37 @@ def test_loads_dict_type():
 
 @pytest.mark.parametrize(
     "string, expected",
-    [("2", 2), ("-2", -2), ("1.5", 1.5), ("-1.5", -1.5), ("23.99999", 23.99999)],
+    [
+        ("2", 2),
+        ("-2", -2),
+        ("1.5", 1.5),
+        ("-1.5", -1.5),
+        ("23.99999", 23.99999),
+        ("-9223372036854775809", -9223372036854775809),
+        ("2.675", 2.675),
+        ("0.30000000000000004441", 0.30000000000000004441),
+    ],
 )
 def test_string_to_number(string, expected):
-    assert string_to_number(string) == expected
+    result = string_to_number(string)
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize("string", ["\u0410", "\U0001F4A9"])
+def test_string_to_number_wide_kinds(string):
+    # the number is converted straight from the str's 2- or 4-byte storage
+    assert string_to_number((string + "-12.5")[1:]) == -12.5
+    assert string_to_number((string + "12345678901234567890")[1:]) == (
+        12345678901234567890
+    )
+
+
+@pytest.mark.parametrize("string", ["1\u00e8", "-1.\u0410", "12\U0001F4A9"])
+def test_string_to_number_unicode_kinds(string):
+    with pytest.raises(ValueError):
+        string_to_number(string)
+    assert string_to_number(string, required=False) == string
 
 
 @pytest.mark.parametrize("string", ["", "10000s", " 1.5", "-", ".5", "1e-4", "1.2.3"])
@@ -327,3 +495,750 @@ def test_string_to_number_invalid(string, required):
             string_to_number(string)
     else:
         string_to_number(string, required=False) == string
+
+
+def feed_in_chunks(data, size, **kwargs):
+    parser = openstep_plist.IncrementalParser(**kwargs)
+    for i in range(0, len(data), size):
+        parser.feed(data[i : i + size])
+    return parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize(
+    "string",
+    [
+        "",
+        "{a = (1, 2.5, <AABB CCDD>); b = c;}",
+        "// comment\n{a /* block\n comment */ = b; // x\r\n c = \"d\\\"e\\\\\";}",
+        "{\"\u00e8\" = \"\u00e0 la carte\"; b = '\u0410\\n\\U0411';}",
+        "{emoji = \"\U0001F4A9 \\UD83D\\UDCA9\"; x = \"\\012\";}",
+        "{a\u2028=\u2029b; // comment\u2028c = <AA\u2028BB>;}",
+        "a=1;\n'b' = \"\u00fc\";\nc;",
+        "(a/b, /c, a//b, {x = ((), {});})",
+        "abc",
+    ],
+)
+def test_incremental_parser(string, size):
+    data = string.encode("utf-8")
+    expected = openstep_plist.loads(data, use_numbers=True)
+    assert feed_in_chunks(data, size, use_numbers=True) == expected
+    assert feed_in_chunks(string, size, use_numbers=True) == expected
+
+
+def test_incremental_parser_utf8_bom():
+    assert feed_in_chunks(b"\xef\xbb\xbf{a=1;}", 1) == {"a": "1"}
+
+
+def test_incremental_parser_latin1():
+    data = "{\"\u00e8\" = \"\u00ff\";}".encode("latin-1")
+    assert feed_in_chunks(data, 1, encoding="latin-1") == {"\u00e8": "\u00ff"}
+
+
+def test_incremental_parser_dict_type():
+    result = feed_in_chunks(b"{z = 1; y = {b = 2; a = 3;};}", 4, dict_type=OrderedDict)
+    assert result == OrderedDict([("z", "1"), ("y", OrderedDict([("b", "2"), ("a", "3")]))])
+    assert type(result["y"]) is OrderedDict
+
+
+@pytest.mark.parametrize(
+    "string, msg",
+    [
+        ("(a,\nb,\r\nc", "Missing ',' for array at line 3"),
+        ("{b = zzz;\nc = xxx}", "Missing ';' on line 2"),
+        ("{b = zzz;\nc = xxx;\nd = jjj;", "Expected terminating '}' for dictionary at line 3"),
+        ("{a = 1;\n\nb = \"unterminated;}", "Unterminated quoted string starting on line 3"),
+        ("{a = 1;\n\nb = <AAZZ>;}", "Malformed data byte group at line 3"),
+        ("{a=1;\nb=2;\n}...", "Junk after plist at line 3"),
+        ("{a=", "Unexpected EOF while parsing plist"),
+    ],
+)
+def test_incremental_parser_errors(string, msg):
+    with pytest.raises(openstep_plist.ParseError, match=msg):
+        openstep_plist.loads(string)
+    with pytest.raises(openstep_plist.ParseError, match=msg):
+        feed_in_chunks(string.encode("utf-8"), 2)
+
+
+def test_incremental_parser_closed():
+    parser = openstep_plist.IncrementalParser()
+    parser.feed(b"(a, b")
+    parser.feed(")")
+    assert parser.close() == ["a", "b"]
+    with pytest.raises(ValueError):
+        parser.feed(b"(c)")
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+@pytest.mark.parametrize(
+    "source",
+    [
+        lambda s: s,
+        lambda s: s.encode("utf-8"),
+        lambda s: StringIO(s),
+        lambda s: BytesIO(s.encode("utf-8")),
+    ],
+    ids=["str", "bytes", "text-file", "binary-file"],
+)
+def test_iterparse(source, chunk_size):
+    string = "{a = (1, <AA>, 'x'); b = {}; \"è\" = ({c = d;}, ());}"
+    assert list(
+        openstep_plist.iterparse(source(string), use_numbers=True, chunk_size=chunk_size)
+    ) == [
+        ("start_dict", None),
+        ("key", "a"),
+        ("start_array", None),
+        ("value", 1),
+        ("value", b"\xaa"),
+        ("value", "x"),
+        ("end_array", None),
+        ("key", "b"),
+        ("start_dict", None),
+        ("end_dict", None),
+        ("key", "è"),
+        ("start_array", None),
+        ("start_dict", None),
+        ("key", "c"),
+        ("value", "d"),
+        ("end_dict", None),
+        ("start_array", None),
+        ("end_array", None),
+        ("end_array", None),
+        ("end_dict", None),
+    ]
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("", [("start_dict", None), ("end_dict", None)]),
+        ("abc", [("value", "abc")]),
+        (
+            "a = 1; b;",
+            [
+                ("start_dict", None),
+                ("key", "a"),
+                ("value", "1"),
+                ("key", "b"),
+                ("value", "b"),
+                ("end_dict", None),
+            ],
+        ),
+    ],
+)
+def test_iterparse_top_level(string, expected):
+    assert list(openstep_plist.iterparse(string)) == expected
+
+
+def test_iterparse_error():
+    events = openstep_plist.iterparse("{a = (1, 2);\nb = (3 4);}")
+    assert next(events) == ("start_dict", None)
+    with pytest.raises(openstep_plist.ParseError, match="Expected terminating '\\)' for array at line 2"):
+        list(events)
+
+
+def test_iterparse_read_value():
+    events = openstep_plist.iterparse(
+        "{a = 1; master = ({id = x; m = (1, 2);}, {id = y;}); glyphs = (a, {b = c;}); d;}",
+        chunk_size=4,
+    )
+    assert next(events) == ("start_dict", None)
+    assert next(events) == ("key", "a")
+    assert events.read_value() == "1"
+    assert next(events) == ("key", "master")
+    assert events.read_value() == [{"id": "x", "m": ["1", "2"]}, {"id": "y"}]
+    assert next(events) == ("key", "glyphs")
+    assert next(events) == ("start_array", None)
+    assert next(events) == ("value", "a")
+    assert events.read_value() == {"b": "c"}
+    with pytest.raises(ValueError, match="not a value"):
+        events.read_value()
+    assert next(events) == ("end_array", None)
+    assert next(events) == ("key", "d")
+    assert events.read_value() == "d"
+    assert list(events) == [("end_dict", None)]
+
+
+def test_iterparse_read_value_whole_document():
+    events = openstep_plist.iterparse("a = 1; b = (2);", dict_type=OrderedDict)
+    assert events.read_value() == OrderedDict([("a", "1"), ("b", ["2"])])
+    assert list(events) == []
+
+
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_lazy_dict(encode):
+    string = (
+        "{a = (1, 2, {b = \"c}\";}); // (comment\n"
+        "'è' = <AABB>; c; d = e/f; f = {g = (h, 'i)');};}"
+    )
+    if encode:
+        string = string.encode("utf-8")
+    result = openstep_plist.loads(string, use_numbers=True, lazy=True)
+    assert isinstance(result, Mapping)
+    assert list(result) == ["a", "è", "c", "d", "f"]
+    assert len(result) == 5
+    assert "c" in result and "z" not in result
+    assert result["a"] == [1, 2, {"b": "c}"}]
+    assert result["a"] is result["a"]
+    assert result == openstep_plist.loads(string, use_numbers=True)
+    with pytest.raises(KeyError):
+        result["z"]
+
+
+def test_loads_lazy_dict_parses_on_access():
+    result = openstep_plist.loads("{a = 1;\nb = {c = (d e);};}", lazy=True)
+    assert result["a"] == "1"
+    with pytest.raises(
+        openstep_plist.ParseError,
+        match=re.escape("Expected terminating ')' for array at line 2"),
+    ):
+        result["b"]
+
+
+def test_loads_lazy_list():
+    result = openstep_plist.loads(b"(1, {a = b;}, \"x,\", (y),)", lazy=True)
+    assert isinstance(result, Sequence)
+    assert len(result) == 4
+    assert result[1] == {"a": "b"}
+    assert result[-1] == ["y"]
+    assert result[1:3] == [{"a": "b"}, "x,"]
+    assert result == ["1", {"a": "b"}, "x,", ["y"]]
+    with pytest.raises(IndexError):
+        result[4]
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("", {}),
+        ("{}", {}),
+        ("() junk", []),
+        ("abc", "abc"),
+        ("<AA>", b"\xaa"),
+        ("a = (1); b;", {"a": ["1"], "b": "b"}),
+    ],
+)
+def test_loads_lazy_top_level(string, expected):
+    assert openstep_plist.loads(string, lazy=True) == expected
+
+
+@pytest.mark.parametrize(
+    "string, msg",
+    [
+        ("{a = (1, 2;", "Unexpected EOF"),
+        ("{a = \"b;}", "Unterminated quoted string starting on line 1"),
+        ("{a = <AA;}", "Expected terminating '>' for data at line 1"),
+        ("{a = ;}", "Unexpected character at line 1"),
+        ("{a = b}", "Missing ';' on line 1"),
+        ("(a b)", "Expected terminating ')' for array at line 1"),
+        ("{a = b;}\njunk", "Junk after plist at line 2"),
+    ],
+)
+def test_loads_lazy_errors(string, msg):
+    with pytest.raises(openstep_plist.ParseError, match=re.escape(msg)):
+        openstep_plist.loads(string, lazy=True)
+
+
+def test_load_path_lazy(tmp_path):
+    path = tmp_path / "test.plist"
+    path.write_bytes(b"{a = (1, 2); b = <AABB>;}")
+    result = openstep_plist.load_path(path, use_numbers=True, lazy=True)
+    assert result["b"] == b"\xaa\xbb"
+    assert dict(result) == {"a": [1, 2], "b": b"\xaa\xbb"}
+
+
+@pytest.mark.parametrize(
+    "string",
+    [
+        "({name = x; 'pos' = y;}, {\"name\" = x; pos = y;})",
+        "({'è' = x;}, {\"è\" = x;})",
+        "({\"А\" = x;}, {\"А\" = x;})",
+        "({\"\U0001F4A9\" = x;}, {\"\U0001F4A9\" = x;})",
+    ],
+)
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_interned_strings(string, encode):
+    if encode:
+        string = string.encode("utf-8")
+    first, second = openstep_plist.loads(string)
+    assert first == second
+    for (k1, v1), (k2, v2) in zip(first.items(), second.items()):
+        assert k1 is k2
+        assert v1 is v2
+
+
+@pytest.mark.parametrize("count", [1, 100, 10000])
+def test_loads_interned_strings_cache_sizes(count):
+    # the cache of the interned strings is sized according to the input
+    keys = ["k%d" % i for i in range(count)]
+    item = "{%s}" % " ".join("%s = v;" % k for k in keys)
+    first, second = openstep_plist.loads("(%s, %s)" % (item, item))
+    assert list(first) == keys
+    for k1, k2 in zip(first, second):
+        assert k1 is k2
+    assert len({id(v) for v in first.values()} | {id(v) for v in second.values()}) == 1
+
+
+def test_loads_shared_string_table():
+    table = {}
+    first = openstep_plist.loads("{name = x; \"pos\" = \"y\";}", string_table=table)
+    assert table == {"name": "name", "x": "x", "pos": "pos"}
+    second = openstep_plist.loads(b"{name = x;}", string_table=table)
+    assert list(second)[0] is list(first)[0]
+    assert second["name"] is first["name"]
+    result = feed_in_chunks(b"{pos = 1;}", 1, string_table=table)
+    assert list(result)[0] is list(first)[1]
+
+
+@pytest.fixture
+def free_threading(monkeypatch):
+    # loads(..., workers=N) only uses threads when the GIL is disabled
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: False, raising=False)
+
+
+@pytest.mark.parametrize(
+    "string",
+    [
+        "(" + ", ".join("{a = %d; b = (x, \"y\");}" % i for i in range(50)) + ")",
+        "{" + "".join("k%d = (%d, <AA>);\n" % (i, i) for i in range(50)) + "}",
+        "{a = 1; glyphs = ("
+        + ",\n".join("{name = \"g%d\"; c = %d;}" % (i, i) for i in range(50))
+        + ",); b;}",
+        "{a = (); glyphs = {"
+        + "".join("g%d = {c = %d;};" % (i, i) for i in range(50))
+        + "};}",
+        "(1, 2)",
+        "()",
+        "{}",
+        "abc",
+        "a = b; c = d;",
+    ],
+)
+@pytest.mark.parametrize("workers", [2, 3, 8])
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_workers(free_threading, string, workers, encode):
+    if encode:
+        string = string.encode("utf-8")
+    expected = openstep_plist.loads(string, use_numbers=True, dict_type=OrderedDict)
+    result = openstep_plist.loads(
+        string, use_numbers=True, dict_type=OrderedDict, workers=workers
+    )
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize(
+    "string, msg",
+    [
+        ("{a = 1; glyphs = ({c = 1;}, {c = 2}, {c = 3;});}", "Missing ';'"),
+        ("(\n{a = 1;},\n{a = (b c);},\n{a = 3;}\n)", "for array at line 3"),
+        ("(a, b, c) junk", "Junk after plist"),
+        # found by the workers, in a later item than the first one
+        (
+            "(" + ",\n".join("{a = %d;}" % i for i in range(30)) + ",\n{a = <AZ>;})",
+            "Malformed data byte group at line 31",
+        ),
+        # the scan stops at the ';' on line 3, after the mismatched brackets
+        # of line 2 where the parser stops
+        (
+            "{a = 1; glyphs = (\n{c = (1};\nd);\n}, {c = 2; d = (3, 4, 5);});}",
+            "for array at line 2",
+        ),
+        # the first of the repeated keys' values is parsed too
+        ("{g = (<AZ>); g = (" + ", ".join(["a"] * 30) + ");}", "invalid hex digit"),
+    ],
+)
+def test_loads_workers_errors(free_threading, string, msg):
+    with pytest.raises(openstep_plist.ParseError) as expected:
+        openstep_plist.loads(string)
+    with pytest.raises(openstep_plist.ParseError, match=msg) as result:
+        openstep_plist.loads(string, workers=2)
+    assert str(result.value) == str(expected.value)
+
+
+def test_loads_workers_invalid():
+    with pytest.raises(ValueError, match="workers must be positive"):
+        openstep_plist.loads("()", workers=0)
+    with pytest.raises(ValueError, match="can't be used together"):
+        openstep_plist.loads("()", lazy=True, workers=2)
+
+
+def test_loads_workers_gil(monkeypatch):
+    # the threads can't parse in parallel: the document is parsed in one go
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: True, raising=False)
+    with pytest.warns(RuntimeWarning, match="no effect when the GIL is enabled"):
+        assert openstep_plist.loads("(a, b)", workers=2) == ["a", "b"]
+
+
+def test_load_path_workers(free_threading, tmp_path):
+    path = tmp_path / "test.plist"
+    path.write_bytes(b"{a = (1, 2, 3, 4); b = <AABB>;}")
+    expected = {"a": ["1", "2", "3", "4"], "b": b"\xaa\xbb"}
+    assert openstep_plist.load_path(path, workers=2) == expected
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("(1, 2, -3)", array("q", [1, 2, -3])),
+        ("(1, 2.5,)", array("d", [1.0, 2.5])),
+        ("( /* x */ 0.5 // y\n )", array("d", [0.5])),
+        (
+            "(9223372036854775807, -9223372036854775808)",
+            array("q", [9223372036854775807, -9223372036854775808]),
+        ),
+        (
+            "{a = (1, 2); b = ((354, -12, LINE), (0, 0.5));}",
+            {"a": array("q", [1, 2]), "b": [[354, -12, "LINE"], array("d", [0, 0.5])]},
+        ),
+        ("()", []),
+        ('(1, "2")', [1, "2"]),
+        ("(1, (2))", [1, array("q", [2])]),
+        ("(9223372036854775808)", [9223372036854775808]),
+        ("(9007199254740993, 0.5)", [9007199254740993, 0.5]),
+    ],
+)
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_typed_arrays(string, expected, encode):
+    if encode:
+        string = string.encode("utf-8")
+    result = openstep_plist.loads(string, use_numbers=True, typed_arrays=True)
+    assert result == expected
+    assert type(result) is type(expected)
+    if isinstance(expected, array):
+        assert result.typecode == expected.typecode
+
+
+@pytest.mark.parametrize("string", ["(1, 2,, 3)", "(1, 2", "(1 2)", "(1, 2) 3"])
+def test_loads_typed_arrays_errors(string):
+    with pytest.raises(openstep_plist.ParseError) as expected:
+        openstep_plist.loads(string, use_numbers=True)
+    with pytest.raises(openstep_plist.ParseError) as result:
+        openstep_plist.loads(string, use_numbers=True, typed_arrays=True)
+    assert str(result.value) == str(expected.value)
+
+
+def test_loads_typed_arrays_invalid():
+    with pytest.raises(ValueError, match="requires use_numbers"):
+        openstep_plist.loads("(1)", typed_arrays=True)
+    with pytest.raises(ValueError, match="Unsupported typed_arrays"):
+        openstep_plist.loads("(1)", use_numbers=True, typed_arrays="list")
+
+
+def test_loads_typed_arrays_numpy():
+    numpy = pytest.importorskip("numpy")
+    result = openstep_plist.loads(
+        "{a = (1, 2); b = (0.5, 1);}", use_numbers=True, typed_arrays="numpy"
+    )
+    assert isinstance(result["a"], numpy.ndarray)
+    assert result["a"].dtype == numpy.int64
+    assert result["b"].tolist() == [0.5, 1.0]
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_load_path_typed_arrays(free_threading, tmp_path, lazy):
+    path = tmp_path / "test.plist"
+    path.write_bytes(b"{a = (1, 2, 3, 4); b = (c, (0.5));}")
+    result = openstep_plist.load_path(
+        path, use_numbers=True, typed_arrays=True, lazy=lazy
+    )
+    assert result["a"] == array("q", [1, 2, 3, 4])
+    assert result["b"] == ["c", array("d", [0.5])]
+    # the top-level array is parsed whole, rather than by the workers
+    path.write_bytes(b"(1, 2, 3, 4)")
+    result = openstep_plist.load_path(
+        path, use_numbers=True, typed_arrays=True, workers=2
+    )
+    assert result == array("q", [1, 2, 3, 4])
+
+
+
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_hooks(encode):
+    string = "{z = (a, <AA>); y; a = {b = c;};}"
+    if encode:
+        string = string.encode("utf-8")
+    result = openstep_plist.loads(
+        string,
+        object_pairs_hook=lambda pairs: ("dict", pairs),
+        array_hook=tuple,
+        data_hook=bytearray,
+    )
+    assert result == (
+        "dict",
+        [
+            ("z", ("a", bytearray(b"\xaa"))),
+            ("y", "y"),
+            ("a", ("dict", [("b", "c")])),
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("", []),
+        ("a = b; c = d;", [("a", "b"), ("c", "d")]),
+        ("{a = 1; a = 2;}", [("a", "1"), ("a", "2")]),
+    ],
+)
+def test_loads_object_pairs_hook(string, expected):
+    assert openstep_plist.loads(string, object_pairs_hook=list) == expected
+
+
+def test_loads_hooks_with_dict_type():
+    # the object_pairs_hook takes precedence over the dict_type
+    result = openstep_plist.loads(
+        "{a = {b = c;};}", dict_type=OrderedDict, object_pairs_hook=dict
+    )
+    assert type(result) is dict and type(result["a"]) is dict
+    result = openstep_plist.loads(
+        "{a = (1, 2);}",
+        dict_type=OrderedDict,
+        use_numbers=True,
+        typed_arrays=True,
+        array_hook=list,
+    )
+    assert result == OrderedDict(a=[1, 2])
+    assert type(result["a"]) is list
+
+
+def test_loads_array_hook_typed_arrays():
+    # the arrays of numbers reach the hook as typed arrays, the others as lists
+    received = []
+    result = openstep_plist.loads(
+        "((1, 2), (1.5, 2), (a, 1), ())",
+        use_numbers=True,
+        typed_arrays=True,
+        array_hook=lambda values: received.append(values) or len(received),
+    )
+    assert result == 5
+    assert received[:4] == [array("q", [1, 2]), array("d", [1.5, 2]), ["a", 1], []]
+    assert [type(values) for values in received] == [array, array, list, list, list]
+
+
+def test_loads_hooks_invalid():
+    with pytest.raises(ValueError, match="can't be used with lazy"):
+        openstep_plist.loads("{}", lazy=True, array_hook=list)
+    with pytest.raises(ValueError, match="can't be used with lazy or workers"):
+        openstep_plist.loads("{}", workers=2, data_hook=bytes)
+
+
+def test_load_path_hooks(tmp_path):
+    path = tmp_path / "test.plist"
+    path.write_bytes(b"{a = (1, <0102>);}")
+    result = openstep_plist.load_path(
+        path, object_pairs_hook=OrderedDict, array_hook=tuple, data_hook=list
+    )
+    assert result == OrderedDict(a=("1", [1, 2]))
+
+
+SELECT_DOCUMENT = """{
+fontMaster = ({id = m01; weight = Bold;});
+glyphs = (
+{glyphname = A; layers = ({width = 600;}); unicode = 0041;},
+{glyphname = B; unicode = 0042; note = "(}";},
+".notdef",
+(C),
+{unicode = 0043;}
+);
+other = <00AA>;
+}"""
+
+
+@pytest.mark.parametrize(
+    "select, expected",
+    [
+        ("fontMaster", {"fontMaster": [{"id": "m01", "weight": "Bold"}]}),
+        (
+            ["fontMaster[*].id", "glyphs[*].glyphname"],
+            {
+                "fontMaster": [{"id": "m01"}],
+                "glyphs": [{"glyphname": "A"}, {"glyphname": "B"}, {}],
+            },
+        ),
+        (
+            ["glyphs[0].layers[*].width", "glyphs[1]"],
+            {
+                "glyphs": [
+                    {"layers": [{"width": "600"}]},
+                    {"glyphname": "B", "unicode": "0042", "note": "(}"},
+                ]
+            },
+        ),
+        (
+            ["glyphs[3][0]", "glyphs[*].unicode"],
+            {
+                "glyphs": [
+                    {"unicode": "0041"},
+                    {"unicode": "0042"},
+                    ["C"],
+                    {"unicode": "0043"},
+                ]
+            },
+        ),
+        (
+            ["glyphs[1]", "glyphs[1].note"],
+            {"glyphs": [{"glyphname": "B", "unicode": "0042", "note": "(}"}]},
+        ),
+        (["other", "missing", "glyphs.glyphname"], {"other": b"\x00\xaa"}),
+        ("[0]", None),
+    ],
+)
+@pytest.mark.parametrize("encode", [False, True])
+def test_loads_select(select, expected, encode):
+    string = SELECT_DOCUMENT
+    if encode:
+        string = string.encode("utf-8")
+    assert openstep_plist.loads(string, select=select) == expected
+
+
+@pytest.mark.parametrize(
+    "string, select, expected",
+    [
+        ("", "a", {}),
+        ("abc", "a", None),
+        ("a = b; c = d; e;", ["c", "e"], {"c": "d", "e": "e"}),
+        ("(a, {b = c;}, (b))", "[*].b", [{"b": "c"}]),
+        ("{a = {b = c;}; a = d;}", "a.b", {}),
+        ("{a = (a, b); b = c;}", "a[1]", {"a": ["b"]}),
+        (
+            '{userData = {"com.example.foo" = 1; com = {example = 2;};};}',
+            'userData["com.example.foo"]',
+            {"userData": {"com.example.foo": "1"}},
+        ),
+        (
+            '{userData = {"com.example.foo" = {a = 1; b = 2;};};}',
+            ['["userData"]["com.example.foo"].b'],
+            {"userData": {"com.example.foo": {"b": "2"}}},
+        ),
+        (
+            '{"a]\\"" = (b, c); "" = d;}',
+            ['["a]\\""][1]', '[""]'],
+            {'a]"': ["c"], "": "d"},
+        ),
+    ],
+)
+def test_loads_select_documents(string, select, expected):
+    assert openstep_plist.loads(string, select=select) == expected
+
+
+def test_loads_select_hooks():
+    result = openstep_plist.loads(
+        SELECT_DOCUMENT,
+        select=["glyphs[*].glyphname", "other"],
+        dict_type=OrderedDict,
+        array_hook=tuple,
+        data_hook=len,
+    )
+    assert result == OrderedDict(
+        glyphs=(
+            OrderedDict(glyphname="A"),
+            OrderedDict(glyphname="B"),
+            OrderedDict(),
+        ),
+        other=2,
+    )
+    result = openstep_plist.loads(
+        SELECT_DOCUMENT, select="fontMaster", object_pairs_hook=list
+    )
+    assert result == [("fontMaster", [[("id", "m01"), ("weight", "Bold")]])]
+
+
+@pytest.mark.parametrize(
+    "string, select, message",
+    [
+        ("{a = (1, 2;}", "a", "Expected terminating ')' for array at line 1"),
+        ("{a = {b = c}; }", "a.b", "Missing ';' on line 1"),
+        ("{a = b}", "c", "Missing ';' on line 1"),
+        ("{a b;}", "a", "Unexpected character after key at line 1: 'b'"),
+        ("{a = <AA}", "c", "Expected terminating '>' for data at line 1"),
+        ("(a, b\n", "[0]", "Missing ',' for array at line 2"),
+        ("{a = b;} c", "a", "Junk after plist at line 1"),
+    ],
+)
+def test_loads_select_errors(string, select, message):
+    with pytest.raises(openstep_plist.ParseError, match=re.escape(message)):
+        openstep_plist.loads(string, select=select)
+
+
+@pytest.mark.parametrize(
+    "select", ["", "a..b", "a.", "[x]", "a[*", "[-1]", '["a"', '["a"]b', '["a\\"]']
+)
+def test_loads_select_invalid(select):
+    with pytest.raises(ValueError, match="Invalid select path"):
+        openstep_plist.loads("{}", select=select)
+    with pytest.raises(ValueError, match="can't be used with lazy"):
+        openstep_plist.loads("{}", select="a", lazy=True)
+
+
+def test_load_path_select(tmp_path):
+    path = tmp_path / "test.glyphs"
+    path.write_text(SELECT_DOCUMENT)
+    result = openstep_plist.load_path(path, select=["glyphs[*].unicode"])
+    assert result == {
+        "glyphs": [{"unicode": "0041"}, {"unicode": "0042"}, {"unicode": "0043"}]
+    }
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("", (1, 0, 0, 0, 1)),
+        ("abc", (0, 0, 1, 0, 0)),
+        ("<AA BB\nCC>", (0, 0, 0, 3, 0)),
+        ("{a = (1, <AABB>, {b = \"c\";}); d;}", (2, 1, 5, 2, 3)),
+        ("(/* ( */ 'a)', (b, ()), {})", (1, 3, 2, 0, 3)),
+        ("a = 1;\n'b' = (\"\u00fc\");", (1, 1, 4, 0, 2)),
+        ("() junk", (0, 1, 0, 0, 1)),
+    ],
+)
+@pytest.mark.parametrize("encode", [False, True])
+def test_scan(string, expected, encode):
+    if encode:
+        string = string.encode("utf-8")
+    result = openstep_plist.scan(string)
+    assert result == expected
+    assert result.max_depth == expected[4]
+
+
+@pytest.mark.parametrize(
+    "string",
+    [
+        "{a = (1, 2;",
+        "{a = \"b;}",
+        "{a = <AA;}",
+        "{a = <AA B>;}",
+        "{a = <AAZ>;}",
+        "(a,\n b,\n c}",
+        "(a,\n b",
+        "{a = b}",
+        "{a = b;\n",
+        "{a : b;}",
+        "{a = ;}",
+        "{a = b;}\n junk",
+        "abc def",
+        b"{a = \"\n\xff\";}",
+        b"{\"\n\xff\" = b;}",
+        b"(\"\\n\xc3\n\")",
+    ],
+)
+def test_scan_errors(string):
+    with pytest.raises(openstep_plist.ParseError) as expected:
+        openstep_plist.loads(string)
+    with pytest.raises(openstep_plist.ParseError) as result:
+        openstep_plist.validate(string)
+    assert str(result.value) == str(expected.value)
+
+
+def test_scan_latin1():
+    assert openstep_plist.scan(b"{a = \"\xe8\";}", encoding="latin-1").strings == 2
+    with pytest.raises(openstep_plist.ParseError, match="Invalid UTF-8"):
+        openstep_plist.validate(b"{a = \"\xe8\";}")
+
+
+def test_validate():
+    assert openstep_plist.validate("{a = (1, 2);}") is None
+    with pytest.raises(TypeError, match="Expected str or bytes-like object"):
+        openstep_plist.validate(None)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+import json
+import openstep_plist
+from openstep_plist import to_json
+from openstep_plist.__main__ import main
+from io import StringIO
+import pytest
+
+
+DOCUMENT = """{
+familyName = "Test Family";
+versionMajor = 1;
+versionMinor = 0;
+date = "2024-01-01 00:00:00 +0000";
+glyphs = (
+{
+glyphname = A;
+unicode = 0041;
+layers = ({width = 600; anchors = ({name = top; position = "{300, 700}";});});
+},
+{
+glyphname = "\\U00E9";
+unicode = 00E9;
+note = "line 1\\012line \\"2\\"\\U0001F600";
+userData = {data = <00FF 0102>; float = -1.50; big = 123456789012345678901234;};
+}
+);
+empty = ();
+}"""
+
+
+def hexlify(obj):
+    return "<%s>" % obj.hex()
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"use_numbers": True},
+        {"indent": 0},
+        {"indent": 2, "use_numbers": True},
+        {"ensure_ascii": False},
+        {"sort_keys": True},
+        {"sort_keys": True, "indent": 1, "ensure_ascii": False},
+    ],
+)
+def test_to_json(kwargs):
+    use_numbers = kwargs.pop("use_numbers", False)
+    expected = json.dumps(
+        openstep_plist.loads(DOCUMENT, use_numbers=use_numbers),
+        default=hexlify,
+        **kwargs
+    )
+    assert to_json(DOCUMENT, use_numbers=use_numbers, **kwargs) == expected
+    assert (
+        to_json(DOCUMENT.encode("utf-8"), use_numbers=use_numbers, **kwargs)
+        == expected
+    )
+    # the same with any kind of str storage
+    assert (
+        to_json(DOCUMENT + "/* \U0001F600 */", use_numbers=use_numbers, **kwargs)
+        == expected
+    )
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("", "{}"),
+        ("abc", '"abc"'),
+        ("a = b; c;", '{"a": "b", "c": "c"}'),
+        ('"a" = "b";\n"c" = "d";', '{"a": "b", "c": "d"}'),
+        ("(1, 2,)", '["1", "2"]'),
+        ("{} junk", "{}"),
+        ("<>", '"<>"'),
+        ('"\\U00e9\\U20ac\x01"', '"\\u00e9\\u20ac\\u0001"'),
+        ("{a = 1; a = 2;}", '{"a": "1", "a": "2"}'),
+    ],
+)
+def test_to_json_documents(string, expected):
+    assert to_json(string) == expected
+
+
+def test_to_json_numbers():
+    string = "(1, -007, 1., 0.25, 123456789012345678901)"
+    expected = "[1, -7, 1.0, 0.25, 123456789012345678901]"
+    assert to_json(string, use_numbers=True) == expected
+    # JSON has no infinity
+    big = "1" * 400 + ".0"
+    assert to_json(big, use_numbers=True) == '"%s"' % big
+
+
+@pytest.mark.parametrize(
+    "data_format, expected",
+    [
+        ("plist", '["<>", "<00ff>", "<00010203ff>"]'),
+        ("hex", '["", "00ff", "00010203ff"]'),
+        ("base64", '["", "AP8=", "AAECA/8="]'),
+    ],
+)
+def test_to_json_data_format(data_format, expected):
+    string = "(<>, <00FF>, <00010203 FF>)"
+    assert to_json(string, data_format=data_format) == expected
+
+
+@pytest.mark.parametrize("sort_keys", [False, True])
+def test_to_json_fp(sort_keys):
+    expected = to_json(DOCUMENT, indent=1, sort_keys=sort_keys)
+    fp = StringIO()
+    assert to_json(DOCUMENT, fp, indent=1, sort_keys=sort_keys, chunk_size=16) is None
+    assert fp.getvalue() == expected
+
+
+def test_to_json_sort_keys():
+    string = "{b = 1; \"\\U00e9\" = 2; a = {d = 3; c;}; \"\\\"\" = 4; b = 5;}"
+    assert to_json(string, sort_keys=True) == (
+        '{"\\"": "4", "a": {"c": "c", "d": "3"}, "b": "1", "b": "5", "\\u00e9": "2"}'
+    )
+    assert to_json("a = b; c = d;", sort_keys=True) == '{"a": "b", "c": "d"}'
+
+
+@pytest.mark.parametrize(
+    "string, message",
+    [
+        ("{a = 1;", "Expected terminating '}' for dictionary at line 1"),
+        ("{a = 1}", "Missing ';' on line 1"),
+        ("(1 2)", "Expected terminating '\\)' for array at line 1"),
+        ("<0>", "Malformed data byte group at line 1: uneven length"),
+        ('"abc', "Unterminated quoted string starting on line 1"),
+        ("(1)\n(2)", "Junk after plist at line 2"),
+        (b'"\xe8"', "Invalid UTF-8 byte sequence in string at line 1"),
+    ],
+)
+def test_to_json_invalid(string, message):
+    with pytest.raises(openstep_plist.ParseError, match=message):
+        openstep_plist.loads(string)
+    with pytest.raises(openstep_plist.ParseError, match=message):
+        to_json(string)
+
+
+def test_to_json_arguments():
+    with pytest.raises(ValueError, match="Invalid data_format"):
+        to_json("<00>", data_format="binary")
+    with pytest.raises(ValueError, match="indent"):
+        to_json("()", indent=-1)
+    with pytest.raises(TypeError):
+        to_json(1)
+
+
+def test_main_json(tmp_path):
+    path = tmp_path / "test.plist"
+    path.write_text(DOCUMENT, encoding="utf-8")
+    out = tmp_path / "test.json"
+    main([str(path), str(out), "-j", "--data-format", "hex"])
+    assert json.loads(out.read_text(encoding="utf-8")) == json.loads(
+        to_json(DOCUMENT, use_numbers=True, data_format="hex")
+    )
+    # the keys are sorted, like json.dump(..., sort_keys=True) did
+    main([str(path), str(out), "-j"])
+    assert out.read_text(encoding="utf-8") == json.dumps(
+        openstep_plist.loads(DOCUMENT, use_numbers=True),
+        default=hexlify,
+        sort_keys=True,
+        indent=2,
+    )
+    main([str(path), str(out), "-j", "--no-sort-keys"])
+    assert out.read_text(encoding="utf-8").startswith('{\n  "familyName"')
@@ -4,7 +4,10 @@ import openstep_plist
 from openstep_plist.writer import Writer, string_needs_quotes
 from io import StringIO, BytesIO
 from collections import OrderedDict
+from collections.abc import Mapping, Sequence
 from textwrap import dedent
+from types import MappingProxyType
+from array import array
 import string
 import random
 import pytest
@@ -58,6 +61,32 @@ class TestWriter(object):
         w.write(string)
         assert w.getvalue() == expected
 
+    @pytest.mark.parametrize(
+        "string, expected",
+        [
+            ("a b\tc\\d", '"a b\tc\\\\d"'),
+            ("\u00e9 run \u00e9", '"\\U00E9 run \\U00E9"'),
+            ("\u0410 run \"q\"", '"\\U0410 run \\"q\\""'),
+            ("\U0001F4A9 run\n", '"\\UD83D\\UDCA9 run\\n"'),
+        ],
+    )
+    def test_quoted_string_kinds(self, string, expected):
+        w = Writer()
+        assert w.write(string) == len(expected)
+        assert w.getvalue() == expected
+
+    def test_repeated_keys(self):
+        plist = [{"a b": 1, "\u0410": 2, "c": 3}] * 3
+        expected = '{"a b" = 1; "\\U0410" = 2; c = 3;}'
+        w = Writer(sort_keys=False)
+        w.write(plist)
+        assert w.getvalue() == "(%s)" % ", ".join([expected] * 3)
+
+        expected = '{"a b" = 1; "\u0410" = 2; c = 3;}'
+        w = Writer(sort_keys=False, unicode_escape=False)
+        assert w.write(plist) == len(expected) * 3 + 6
+        assert w.getvalue() == "(%s)" % ", ".join([expected] * 3)
+
     def test_quoted_string_dont_escape_newlines(self):
         w = Writer(escape_newlines=False)
         w.write("a\n\n\nbc")
@@ -115,6 +144,45 @@ class TestWriter(object):
         w.write(0.999)
         assert w.getvalue() == "1"
 
+        w = Writer(float_precision=0)
+        w.write(100.0)
+        assert w.getvalue() == "100"
+
+    @pytest.mark.parametrize(
+        "flt, expected",
+        [(100.0, "100"), (-10.0, "-10"), (1000.4, "1000"), (0.0, "0"), (2.5, "2")],
+    )
+    def test_float_precision_zero(self, flt, expected):
+        # without a '.', none of the trailing zeros are fractional digits:
+        # 100.0 used to be written as "1"
+        assert openstep_plist.dumps(flt, float_precision=0) == expected
+
+    @pytest.mark.parametrize(
+        "flt, precision, expected",
+        [
+            (0.1, 17, "0.1"),
+            (0.1, 30, "0.1"),
+            (0.30000000000000004, 17, "0.30000000000000004"),
+            (0.30000000000000004, 6, "0.3"),
+            (1 / 3, 6, "0.333333"),
+            (123.5, 0, "124"),
+            (1e-7, 6, "0"),
+            (1e-7, 7, "0.0000001"),
+            (1.5e-5, 10, "0.000015"),
+            (1e22, 6, "10000000000000000000000"),
+            (1.5e16, 6, "15000000000000000"),
+            (-2.25, 6, "-2.25"),
+            (-0.0, 6, "-0"),
+            (0.0, 6, "0"),
+            (float("inf"), 6, "inf"),
+            (float("nan"), 6, "nan"),
+        ],
+    )
+    def test_shortest_float_repr(self, flt, precision, expected):
+        w = Writer(float_precision=precision, shortest_float_repr=True)
+        assert w.write(flt) == len(expected)
+        assert w.getvalue() == expected
+
     @pytest.mark.parametrize(
         "data, expected, expected_no_spaces",
         [
@@ -145,6 +213,20 @@ class TestWriter(object):
         w.write(data)
         assert w.getvalue() == expected_no_spaces
 
+    def test_data_buffers(self):
+        data = bytes(range(256))
+        expected = "<" + " ".join(
+            data[i:i + 4].hex().upper() for i in range(0, len(data), 4)
+        ) + ">"
+        for obj in (data, bytearray(data), memoryview(data)):
+            w = Writer()
+            assert w.write(obj) == len(expected)
+            assert w.getvalue() == expected
+        # a memoryview that isn't contiguous is written as its bytes
+        w = Writer(binary_spaces=False)
+        w.write(memoryview(data)[::51])
+        assert w.getvalue() == "<00336699CCFF>"
+
     def test_bool(self):
         w = Writer()
         assert w.write(True) == 1
@@ -261,6 +343,211 @@ def test_dump():
         openstep_plist.dump(plist, object())
 
 
+@pytest.mark.parametrize(
+    "obj, kwargs, expected",
+    [
+        ("abc", {}, b"abc"),
+        ({"\u00e8": "\u0410"}, {}, b'{"\\U00E8" = "\\U0410";}'),
+        (
+            {"\u00e8": ["\u0410", "\U0001F4A9"]},
+            {"unicode_escape": False},
+            '{"\u00e8" = ("\u0410", "\U0001F4A9");}'.encode("utf-8"),
+        ),
+        ([1, b"2"], {"indent": "\u00a0"}, b"(\n\xc2\xa01,\n\xc2\xa0<32>\n)"),
+    ],
+)
+def test_dumps_bytes(obj, kwargs, expected):
+    result = openstep_plist.dumps_bytes(obj, **kwargs)
+    assert type(result) is bytes
+    assert result == expected
+    assert openstep_plist.dumps(obj, **kwargs).encode("utf-8") == expected
+
+    w = Writer(**kwargs)
+    w.write(obj)
+    assert w.getvalue_bytes() == expected
+
+
+def test_lone_surrogate_no_unicode_escape():
+    w = Writer(unicode_escape=False)
+    assert w.write("a\ud800") == 4
+    assert w.getvalue() == '"a\ud800"'
+    # the bytes output is always valid UTF-8, like the str output encoded
+    with pytest.raises(UnicodeEncodeError):
+        w.getvalue_bytes()
+    with pytest.raises(UnicodeEncodeError):
+        openstep_plist.dumps_bytes(["\ud83d"], unicode_escape=False)
+    with pytest.raises(UnicodeEncodeError):
+        openstep_plist.dump("\udc00", BytesIO(), unicode_escape=False)
+
+
+@pytest.mark.parametrize("string", ["a", "\ud55c\u00e8", "\U0001F4A9", "\ud800"])
+@pytest.mark.parametrize("unicode_escape", [False, True])
+def test_dumps_bytes_round_trip(string, unicode_escape):
+    obj = {"k": [string, "x" + string]}
+    try:
+        data = openstep_plist.dumps_bytes(obj, unicode_escape=unicode_escape)
+    except UnicodeEncodeError:
+        # only lone surrogates can't be written as UTF-8
+        assert not unicode_escape and string == "\ud800"
+        return
+    assert openstep_plist.loads(data) == obj
+
+
+class ChunkRecorder(object):
+    def __init__(self, binary):
+        self.binary = binary
+        self.chunks = []
+
+    def write(self, data):
+        if isinstance(data, bytes) != self.binary:
+            raise TypeError("wrong type")
+        if data:
+            self.chunks.append(data)
+
+
+@pytest.mark.parametrize("binary", [False, True])
+@pytest.mark.parametrize("buffer_size", [0, 10, 1 << 20])
+def test_dump_streaming(binary, buffer_size):
+    plist = {
+        "glyphs": [
+            {"name": "g%d" % i, "unicode": "\u0410" * i, "data": b"\x01" * i}
+            for i in range(50)
+        ]
+    }
+    expected = openstep_plist.dumps(plist, indent=1, unicode_escape=False)
+    fp = ChunkRecorder(binary)
+    openstep_plist.dump(
+        plist, fp, indent=1, unicode_escape=False, buffer_size=buffer_size
+    )
+    if binary:
+        assert b"".join(fp.chunks).decode("utf-8") == expected
+    else:
+        assert "".join(fp.chunks) == expected
+    if buffer_size < 1 << 20:
+        assert len(fp.chunks) > 50
+        # each chunk ends after a complete value
+        assert all(len(chunk) < 300 for chunk in fp.chunks)
+    else:
+        assert len(fp.chunks) == 1
+
+
+def test_writer_flush():
+    fp = StringIO()
+    w = Writer(file=fp, buffer_size=4)
+    assert w.write("abc") == 3
+    assert fp.getvalue() == ""
+    assert w.write(["defgh"]) == 7
+    assert fp.getvalue() == "abc(defgh"
+    assert w.getvalue() == ")"
+    w.write(1)
+    w.flush()
+    assert fp.getvalue() == "abc(defgh)1"
+    assert w.getvalue() == ""
+
+    with pytest.raises(ValueError, match="no file"):
+        Writer().flush()
+
+
+def build(writer, obj):
+    if isinstance(obj, list):
+        writer.begin_array()
+        for item in obj:
+            build(writer, item)
+        writer.end()
+    elif isinstance(obj, tuple):
+        writer.begin_tuple()
+        for item in obj:
+            build(writer, item)
+        writer.end()
+    elif isinstance(obj, dict):
+        writer.begin_dict()
+        for key, value in obj.items():
+            writer.key(key)
+            build(writer, value)
+        writer.end()
+    else:
+        writer.value(obj)
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        [],
+        {},
+        [1, "a b", (2.5, b"\x01"), [[], {}]],
+        {"z": {"b": 1, "a": (1, 2)}, "a": [{"d": ()}], "m": "\u0410"},
+        {1: "c"},
+        {"hello world": [34, 56.8], "abc": {}},
+    ],
+)
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"indent": 2},
+        {"indent": "\t", "single_line_tuples": True},
+        {"indent": 0, "single_line_empty_objects": False},
+        {"sort_keys": False},
+        {"single_line_tuples": True, "unicode_escape": False},
+    ],
+)
+def test_builder(obj, kwargs):
+    w = Writer(**kwargs)
+    build(w, obj)
+    assert w.getvalue() == openstep_plist.dumps(obj, **kwargs)
+
+
+def test_builder_values():
+    w = Writer(indent=1)
+    w.begin_dict()
+    w.key("b")
+    w.value({"d": 1, "c": [2]})
+    w.key("a")
+    w.value(None)
+    w.end()
+    assert w.getvalue() == '{\n a = "(nil)";\n b = {\n  c = (\n   2\n  );\n  d = 1;\n };\n}'
+
+
+def test_builder_streaming():
+    fp = StringIO()
+    w = Writer(file=fp, buffer_size=1)
+    w.begin_array()
+    w.value(1)
+    assert fp.getvalue() == "(1"
+    w.begin_dict()
+    w.key("b")
+    w.value(2)
+    w.key("a")
+    w.value([3, 4])
+    # the sorted dict's entries stay buffered until its end
+    assert fp.getvalue() == "(1"
+    w.end()
+    assert fp.getvalue() == "(1, {a = (3, 4); b = 2;}"
+    w.end()
+    assert fp.getvalue() == "(1, {a = (3, 4); b = 2;})"
+
+
+def test_builder_errors():
+    w = Writer()
+    with pytest.raises(ValueError, match="No container to end"):
+        w.end()
+    with pytest.raises(ValueError, match="only be called inside a dict"):
+        w.key("a")
+    w.begin_array()
+    with pytest.raises(ValueError, match="only be called inside a dict"):
+        w.key("a")
+    with pytest.raises(ValueError, match="use value"):
+        w.write(1)
+    w.begin_dict()
+    with pytest.raises(ValueError, match="Missing key"):
+        w.value(1)
+    w.key("a")
+    with pytest.raises(ValueError, match="Missing value for the previous key"):
+        w.key("b")
+    with pytest.raises(ValueError, match="Missing value for the last key"):
+        w.end()
+
+
 valid_unquoted_chars = (
     string.ascii_uppercase + string.ascii_lowercase + string.digits + "._$"
 )
@@ -304,6 +591,87 @@ def test_string_needs_quotes(string, expected):
     assert string_needs_quotes(string) is expected
 
 
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Layer(Mapping):
+    def __init__(self, **kwargs):
+        self._data = kwargs
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class Nodes(Sequence):
+    def __init__(self, *items):
+        self._items = items
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+@pytest.mark.parametrize(
+    "obj, kwargs, expected",
+    [
+        (Layer(width=600, name="Regular"), {}, "{name = Regular; width = 600;}"),
+        (
+            Layer(width=600, name="Regular"),
+            {"sort_keys": False},
+            "{width = 600; name = Regular;}",
+        ),
+        (MappingProxyType({"b": 1, "a": 2}), {}, "{a = 2; b = 1;}"),
+        (Layer(), {"indent": 0, "single_line_empty_objects": False}, "{\n}"),
+        (Nodes(1, "a", Nodes()), {}, "(1, a, ())"),
+        (range(3), {}, "(0, 1, 2)"),
+        (bytearray(b"\x01\x02"), {}, "<0102>"),
+        (memoryview(b"\x01\x02\x03\x04\x05"), {}, "<01020304 05>"),
+        (
+            [Point(1, 2), {"p": Point(3.5, 0)}],
+            {"default": lambda p: (p.x, p.y)},
+            "((1, 2), {p = (3.5, 0);})",
+        ),
+        (
+            {"layer": Layer(anchors=Nodes(Point(0, 1)))},
+            {"default": vars},
+            "{layer = {anchors = ({x = 0; y = 1;});};}",
+        ),
+    ],
+)
+def test_generic_objects(obj, kwargs, expected):
+    assert openstep_plist.dumps(obj, **kwargs) == expected
+
+
+def test_default_errors():
+    with pytest.raises(TypeError, match="Point is not PLIST serializable"):
+        openstep_plist.dumps(Point(1, 2))
+
+    def default(obj):
+        raise TypeError("no way")
+
+    with pytest.raises(TypeError, match="no way"):
+        openstep_plist.dumps([Point(1, 2)], default=default)
+
+
+def test_lazy_document():
+    text = "{a = (1, 2); b = {c = <0102>;};}"
+    lazy = openstep_plist.loads(text, lazy=True)
+    assert openstep_plist.dumps(lazy) == openstep_plist.dumps(
+        openstep_plist.loads(text)
+    )
+
+
 def test_single_line_tuples():
     assert openstep_plist.dumps({"a": 1, "b": (2, 3), "c": "Hello"}, indent=0) == (
         """{
@@ -326,6 +694,58 @@ c = Hello;
     )
 
 
+def test_typed_arrays():
+    plist = {"a": array("q", [1, -2]), "b": array("d", [0.5, 3.0]), "c": array("q")}
+    assert openstep_plist.dumps(plist) == "{a = (1, -2); b = (0.5, 3); c = ();}"
+    assert openstep_plist.dumps(plist["a"], indent=0, single_line_tuples=True) == (
+        "(1,-2)"
+    )
+    del plist["c"]  # empty arrays are parsed as lists
+    text = openstep_plist.dumps(plist)
+    assert openstep_plist.loads(text, use_numbers=True, typed_arrays=True) == plist
+
+
+@pytest.mark.parametrize("typecode", "bBhHiIlLqQfd")
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"indent": 1}, {"indent": 0, "single_line_tuples": True}, {"float_precision": 2}],
+)
+def test_typed_arrays_formats(typecode, kwargs):
+    # the numbers are written straight from the array's buffer
+    values = [0, 1, 127] if typecode.isupper() else [0, -1, 127]
+    if typecode in "fd":
+        values = [0.5, -1.25, 1e-07, 3.0, 123.456]
+    items = array(typecode, values)
+    expected = openstep_plist.dumps(tuple(items.tolist()), **kwargs)
+    assert openstep_plist.dumps(items, **kwargs) == expected
+    assert openstep_plist.dumps([items], **kwargs) == openstep_plist.dumps(
+        [tuple(items.tolist())], **kwargs
+    )
+
+
+def test_typed_arrays_limits():
+    assert openstep_plist.dumps(array("q", [2**63 - 1, -(2**63)])) == (
+        "(9223372036854775807, -9223372036854775808)"
+    )
+    assert openstep_plist.dumps(array("Q", [2**64 - 1])) == "(18446744073709551615)"
+    # not numbers: written like their items
+    assert openstep_plist.dumps(array("u", "ab")) == "(a, b)"
+
+
+def test_numpy_arrays():
+    numpy = pytest.importorskip("numpy")
+    plist = {"a": numpy.array([1, 2]), "b": numpy.array([[0.5], [1.5]])}
+    assert openstep_plist.dumps(plist) == "{a = (1, 2); b = ((0.5), (1.5));}"
+    for dtype in ("int8", "uint16", "int32", "uint64", "float32", "float64", "bool"):
+        items = numpy.array([0, 1, 3], dtype=dtype)
+        assert openstep_plist.dumps(items) == openstep_plist.dumps(
+            tuple(items.tolist())
+        )
+    # not contiguous
+    items = numpy.arange(10)[::3]
+    assert openstep_plist.dumps(items) == "(0, 3, 6, 9)"
+
+
 def test_sort_keys():
     plist = {"c": 1, "b": {"z": 9, "y": 8, "x": 7}, "a": "Hello"}
     sorted_result = "{a = Hello; b = {x = 7; y = 8; z = 9;}; c = 1;}"
@@ -374,3 +794,128 @@ g = (
     assert openstep_plist.dumps(plist, indent=0) == single_line_result
     assert openstep_plist.dumps(plist, indent=0, single_line_empty_objects=True) == single_line_result
     assert openstep_plist.dumps(plist, indent=0, single_line_empty_objects=False) == multi_line_result
+
+
+REFORMAT_DOCUMENT = """{
+familyName = "Test Family";
+versionMajor = 1;
+glyphs = (
+{
+unicode = 0041;
+glyphname = A;
+layers = ({width = 600.50; anchors = ({position = "{300, 700}"; name = top;});});
+},
+{
+glyphname = '\\U00E9';
+note = "line 1\\012line \\"2\\"";
+userData = {data = <00FF 01020304 05>; empty = (); e = {};};
+}
+);
+}"""
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"indent": 2},
+        {"indent": "\t", "single_line_empty_objects": False},
+        {"sort_keys": False, "binary_spaces": False},
+        {"unicode_escape": False, "escape_newlines": False},
+    ],
+)
+def test_reformat(kwargs):
+    expected = openstep_plist.dumps(
+        openstep_plist.loads(REFORMAT_DOCUMENT, use_numbers=True), **kwargs
+    )
+    for data in (REFORMAT_DOCUMENT, REFORMAT_DOCUMENT.encode("utf-8")):
+        result = openstep_plist.reformat(data, use_numbers=True, **kwargs)
+        assert result == expected
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"indent": 2}, {"sort_keys": False, "unicode_escape": False}]
+)
+def test_reformat_lossless(kwargs):
+    # without use_numbers, the document reads back the same either way
+    for data in (REFORMAT_DOCUMENT, REFORMAT_DOCUMENT.encode("utf-8")):
+        result = openstep_plist.reformat(data, **kwargs)
+        assert "unicode = 0041;" in result and "width = 600.50;" in result
+        for use_numbers in (False, True):
+            assert openstep_plist.loads(
+                result, use_numbers=use_numbers
+            ) == openstep_plist.loads(data, use_numbers=use_numbers)
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    [
+        ("", "{}"),
+        ("abc", "abc"),
+        ('"a b"', '"a b"'),
+        ("b = 1; a;", "{a = a; b = 1;}"),
+        ("{} junk", "{}"),
+        ("(1, 2,)", "(1, 2)"),
+        ('(01, "-1", "1.50", "1.5.0", -1.0)', '(01, "-1", "1.50", 1.5.0, -1.0)'),
+        ("0041", "0041"),
+        ("{b = x; a = y; b = z;}", "{a = y; b = x; b = z;}"),
+    ],
+)
+def test_reformat_documents(string, expected):
+    assert openstep_plist.reformat(string) == expected
+
+
+@pytest.mark.parametrize(
+    "string, verbatim",
+    [
+        ('{a = "x y"; b = "1"; c = "-1"; d = "a-b"; e = "abc"; f = <0A>;}', False),
+        ("(abc, A_b.c, $x)", False),
+        ("(1, 2.5, 0041, a-b, a/b, 1.5.0)", True),
+    ],
+)
+def test_reformat_like_dumps(string, verbatim):
+    # the quoted strings are written like dumps(loads()) writes them, and so
+    # are the unquoted ones that dumps wouldn't quote; the others are copied
+    # verbatim, which is how (1, 2.5) stays unquoted
+    expected = openstep_plist.dumps(openstep_plist.loads(string))
+    result = openstep_plist.reformat(string)
+    if verbatim:
+        assert result == string
+        assert result != expected
+    else:
+        assert result == expected
+
+
+def test_reformat_fp():
+    expected = openstep_plist.reformat(REFORMAT_DOCUMENT, indent=0)
+    for fp in (StringIO(), BytesIO()):
+        result = openstep_plist.reformat(
+            REFORMAT_DOCUMENT, fp, indent=0, buffer_size=1
+        )
+        assert result is None
+        value = fp.getvalue()
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        assert value == expected
+
+
+@pytest.mark.parametrize(
+    "string, message",
+    [
+        ("{a = 1;", "Expected terminating '}' for dictionary at line 1"),
+        ("{a = 1}", "Missing ';' on line 1"),
+        ("(1 2)", "Expected terminating '\\)' for array at line 1"),
+        ("(1)\n(2)", "Junk after plist at line 2"),
+        ("<00> a", "Junk after plist at line 1"),
+    ],
+)
+def test_reformat_invalid(string, message):
+    with pytest.raises(openstep_plist.ParseError, match=message):
+        openstep_plist.loads(string)
+    with pytest.raises(openstep_plist.ParseError, match=message):
+        openstep_plist.reformat(string)
+
+
+def test_reformat_type_error():
+    with pytest.raises(TypeError):
+        openstep_plist.reformat(1)